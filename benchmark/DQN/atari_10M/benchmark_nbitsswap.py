@@ -1,22 +1,42 @@
 import logging
 import yaml
 import os
+import re
 import sys
 from typing import Dict
 from tensorboardX import SummaryWriter
 from tqdm import tqdm
 from functools import partial
 
+import gym
 import torch
 import numpy as np
 
 import regym
-from regym.environments import generate_task
+from regym.environments import generate_task, EnvType
+from regym.environments.gym_parser import parse_gym_environment
+from regym.environments.envs.gym_envs import BatchedNBitsSwapEnv
 from regym.rl_loops.singleagent_loops import rl_loop
 from regym.util.experiment_parsing import initialize_agents
 from regym.util.wrappers import baseline_atari_pixelwrap
 
 
+def generate_batched_task(task_config, seed):
+    '''
+    :returns: Task whose environments are natively batched `BatchedNBitsSwapEnv`s,
+              rather than the VecEnvs of `generate_task`. The wrapping functions are not applied to them.
+    '''
+    env = gym.make(task_config['env-id'])
+    task = parse_gym_environment(env, EnvType.SINGLE_AGENT)
+    env.close()
+
+    n = int(re.match(r'(\d+)BitsSwap', task_config['env-id']).group(1))
+    fixed_goal = 'FixedGoal' in task_config['env-id']
+    task.env = BatchedNBitsSwapEnv(n=n, nbr_parallel_env=task_config['nbr_actor'], fixed_goal=fixed_goal, seed=seed, gathering=True)
+    task.test_env = BatchedNBitsSwapEnv(n=n, nbr_parallel_env=task_config['nbr_actor'], fixed_goal=fixed_goal, seed=100+seed, gathering=False)
+    return task
+
+
 def check_path_for_agent(filepath):
     #filepath = os.path.join(path,filename)
     agent = None
@@ -88,13 +108,16 @@ def training_process(agent_config: Dict,
                                     nbr_max_random_steps=task_config['nbr_max_random_steps'],
                                     clip_reward=False)
     
-    task = generate_task(task_config['env-id'],
-                         nbr_parallel_env=task_config['nbr_actor'],
-                         wrapping_fn=pixel_wrapping_fn,
-                         test_wrapping_fn=test_pixel_wrapping_fn,
-                         seed=seed,
-                         test_seed=100+seed,
-                         gathering=True)
+    if task_config.get('batched_env', False) and 'MNIST' not in task_config['env-id']:
+        task = generate_batched_task(task_config, seed)
+    else:
+        task = generate_task(task_config['env-id'],
+                             nbr_parallel_env=task_config['nbr_actor'],
+                             wrapping_fn=pixel_wrapping_fn,
+                             test_wrapping_fn=test_pixel_wrapping_fn,
+                             seed=seed,
+                             test_seed=100+seed,
+                             gathering=True)
 
     agent_config['nbr_actor'] = task_config['nbr_actor']
 
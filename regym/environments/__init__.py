@@ -1,3 +1,4 @@
 from .parse_environment import generate_task
 from .task import Task, EnvType
+from .env_config_schedule import EnvConfigSchedule
 from .envs import *
\ No newline at end of file
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+class EnvConfigSchedule():
+    '''
+    Vectorized schedule of environment configurations, e.g. for curriculum learning or seed sweeps.
+    Each sampling provides the configurations of a whole batch of environments at once:
+    a parameter whose range is a list is drawn independently for each environment,
+    unless it is listed in :param shared_params:, in which case a single value is drawn
+    and shared by the whole batch. Other parameters are constant.
+
+    >>> schedule = EnvConfigSchedule({'tower-seed': list(range(100)), 'lighting-type': [0, 1, 2], 'total-floors': 10},
+    ...                              shared_params=['tower-seed'])
+    >>> observations = env.reset(env_configs=schedule)
+    '''
+    def __init__(self, param2range, shared_params=[], seed=0):
+        '''
+        :param param2range: Dictionnary of parameter names to either a list of values to sample from, or a constant value.
+        :param shared_params: list of the names of the parameters whose value is shared by the whole batch.
+        :param seed: int to seed the sampling with...
+        '''
+        self.param2range = dict(param2range)
+        self.shared_params = shared_params
+        self.rng = np.random.RandomState(seed)
+
+    def update(self, param2range):
+        '''
+        Updates the ranges of some parameters, e.g. to move along a curriculum.
+        :param param2range: Dictionnary of parameter names to their new range.
+        '''
+        self.param2range.update(param2range)
+
+    def sample(self, nbr_envs):
+        '''
+        :param nbr_envs: number of environments to sample configurations for.
+        :returns: list of :param nbr_envs: configuration dictionnaries.
+        '''
+        param2values = dict()
+        for param, prange in self.param2range.items():
+            if isinstance(prange, list):
+                size = 1 if param in self.shared_params else nbr_envs
+                # Sampling indices, in order to preserve the type of the values:
+                values = [prange[idx] for idx in self.rng.randint(len(prange), size=size)]
+                if size == 1: values = values*nbr_envs
+            else:
+                values = [prange]*nbr_envs
+            param2values[param] = values
+        return [ {param: values[idx] for param, values in param2values.items()} for idx in range(nbr_envs)]
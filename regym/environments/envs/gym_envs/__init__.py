@@ -1,4 +1,5 @@
 from .n_bits_swap_env import NBitsSwapEnv
+from .batched_n_bits_swap_env import BatchedNBitsSwapEnv
 from .n_bits_swap_mnist_env import NBitsSwapMNISTEnv
 
 from gym.envs.registration import register
@@ -0,0 +1,152 @@
+from gym.spaces import Discrete, MultiBinary, Dict
+from gym.utils import seeding
+import numpy as np
+
+
+class BatchedNBitsSwapEnv():
+    '''
+    Natively batched version of `NBitsSwapEnv`, that can be used in place of
+    a `VecEnv` of `NBitsSwapEnv`s: the states and goals of all the environments
+    are held in [nbr_parallel_env, n] arrays, and all the environments are
+    stepped at once with a handful of NumPy operations.
+
+    The observations are dictionnaries of batched arrays ('observation', 'achieved_goal', 'desired_goal'),
+    and each environment's info contains its 'latents', as expected by HER/THER.
+    The arrays handed over (observations, latents) are never modified afterwards:
+    the state and goal arrays are replaced, rather than updated in place.
+
+    Unlike VecEnvs, it has no `env_creator`: the processes that need their own environments
+    (e.g. `AsyncEvaluator` or the actors of `gather_experience_actor_learner`) get copies of it,
+    reseeded, through `batched_env_creator`.
+    '''
+    def __init__(self, n=10, nbr_parallel_env=1, fixed_goal=False, seed=0, gathering=True):
+        '''
+        :param n: number of bits.
+        :param nbr_parallel_env: number of environments.
+        :param fixed_goal: Bool specifying whether each environment keeps the same goal across episodes.
+        :param seed: int to seed the environments with...
+        :param gathering: Bool specifying whether we are gathering experience or running evaluation episodes.
+                          When gathering, environments whose episode ends are reset automatically,
+                          and the terminal observation is provided in `info['terminal_observation']`.
+                          Otherwise, environments whose episode ended are not stepped anymore,
+                          until they are reset.
+        '''
+        self.n = n
+        self.fixed_goal = fixed_goal
+        self.gathering = gathering
+        self.nbr_parallel_env = nbr_parallel_env
+
+        self.action_space = Discrete(self.n)
+        self.observation_space = Dict({"observation": MultiBinary(self.n),
+                                       "achieved_goal": MultiBinary(self.n),
+                                       "desired_goal": MultiBinary(self.n)})
+
+        self.max_episode_steps = n
+
+        self.seed(seed)
+        self.nbr_steps = np.zeros(self.nbr_parallel_env, dtype=np.int64)
+        self.state = np.zeros((self.nbr_parallel_env, self.n), dtype=np.int64)
+        self.goal = self.np_random.randint(2, size=(self.nbr_parallel_env, self.n))
+
+        self.dones = [False]*self.nbr_parallel_env
+        self.previous_dones = list(self.dones)
+
+    def seed(self, seed=None):
+        self.np_random, seed = seeding.np_random(seed)
+        return seed
+
+    def get_nbr_envs(self):
+        return self.nbr_parallel_env
+
+    def set_nbr_envs(self, nbr_parallel_env):
+        if self.nbr_parallel_env == nbr_parallel_env: return
+        nbr_new_envs = max(0, nbr_parallel_env-self.nbr_parallel_env)
+        self.nbr_steps = np.concatenate([self.nbr_steps[:nbr_parallel_env], np.zeros(nbr_new_envs, dtype=np.int64)], axis=0)
+        self.state = np.concatenate([self.state[:nbr_parallel_env], np.zeros((nbr_new_envs, self.n), dtype=np.int64)], axis=0)
+        self.goal = np.concatenate([self.goal[:nbr_parallel_env], self.np_random.randint(2, size=(nbr_new_envs, self.n))], axis=0)
+        self.nbr_parallel_env = nbr_parallel_env
+        self.dones = [False]*self.nbr_parallel_env
+        self.previous_dones = list(self.dones)
+
+    def _get_obs(self, indices):
+        # Fancy indexing provides fresh arrays, owned by the caller:
+        return {"observation": self.state[indices],
+                "achieved_goal": self.state[indices],
+                "desired_goal": self.goal[indices]}
+
+    def _reset_envs(self, indices):
+        state = self.state.copy()
+        state[indices] = self.np_random.randint(2, size=(len(indices), self.n))
+        self.state = state
+        if not self.fixed_goal:
+            goal = self.goal.copy()
+            goal[indices] = self.np_random.randint(2, size=(len(indices), self.n))
+            self.goal = goal
+        self.nbr_steps[indices] = 0
+
+    def reset(self, env_configs=None, env_indices=None):
+        '''
+        :param env_configs: unused, for compatibility with `VecEnv`.
+        :param env_indices: indices of the environments to reset (default: all).
+        :returns: dictionnary of the batched observations of the environments :param env_indices:.
+        '''
+        if env_indices is None: env_indices = range(self.nbr_parallel_env)
+        env_indices = np.asarray(env_indices, dtype=np.int64)
+        self._reset_envs(env_indices)
+        for idx in env_indices:
+            self.dones[idx] = False
+        self.previous_dones = list(self.dones)
+        return self._get_obs(env_indices)
+
+    def step(self, action_vector):
+        '''
+        :param action_vector: actions of the environments that are stepped, i.e. all of them
+                              when gathering, otherwise only those whose episode is not done.
+        :returns: observations, rewards, dones and infos, like `VecEnv.step`.
+        '''
+        if self.gathering:
+            indices = np.arange(self.nbr_parallel_env)
+        else:
+            indices = np.asarray([idx for idx in range(self.nbr_parallel_env) if not self.dones[idx]], dtype=np.int64)
+        actions = np.asarray(action_vector).reshape(-1).astype(np.int64)
+        assert((actions < self.n).all())
+
+        init_state = self.state
+        state = init_state.copy()
+        state[indices, actions] = 1-state[indices, actions]
+        self.state = state
+        self.nbr_steps[indices] += 1
+
+        obs = self._get_obs(indices)
+        solved = (obs["achieved_goal"] == obs["desired_goal"]).all(axis=-1)
+        reward = np.where(solved, 0, -1)
+        terminal = np.logical_or(solved, self.nbr_steps[indices] >= self.max_episode_steps)
+
+        infos = [None]*self.nbr_parallel_env
+        for batch_idx, idx in enumerate(indices):
+            self.dones[idx] = bool(terminal[batch_idx])
+            infos[idx] = {'latents':
+                            {   's': init_state[idx],
+                                'succ_s': state[idx],
+                                'achieved_goal': state[idx],
+                                'desired_goal': self.goal[idx]
+                            }
+                         }
+        self.previous_dones = list(self.dones)
+
+        if self.gathering and terminal.any():
+            terminal_batch_indices = np.nonzero(terminal)[0]
+            terminal_obs = {k: v[terminal_batch_indices] for k, v in obs.items()}
+            for terminal_idx, batch_idx in enumerate(terminal_batch_indices):
+                infos[indices[batch_idx]]['terminal_observation'] = {k: v[terminal_idx] for k, v in terminal_obs.items()}
+
+            ended_indices = indices[terminal_batch_indices]
+            self._reset_envs(ended_indices)
+            reset_obs = self._get_obs(ended_indices)
+            for k in obs:
+                obs[k][terminal_batch_indices] = reset_obs[k]
+
+        return obs, reward, self.dones, infos
+
+    def close(self):
+        pass
@@ -12,6 +12,49 @@ import numpy as np
 import logging
 logger = logging.getLogger(__name__)
 
+
+# Resized digits, shared by all the environments of a process:
+_MNIST_DIGITS = dict()
+
+def load_mnist_digits(root, train=True, obs_shape=[32,32]):
+    '''
+    Returns the MNIST images of zeros and ones, resized to :param obs_shape:.
+    The digits are resized once and saved next to the dataset. They are then 
+    memory-mapped, so that all the environments, and processes, share them.
+
+    :param root: path to the MNIST dataset.
+    :param train: Boolean stating from which split of MNIST to take the images.
+    :param obs_shape: shape of the resized images.
+    :returns: uint8 numpy.ndarray of shape (nbr_digits, *obs_shape), and int numpy.ndarray of shape (nbr_digits,) of their targets.
+    '''
+    key = (root, train, tuple(obs_shape))
+    if key in _MNIST_DIGITS: return _MNIST_DIGITS[key]
+
+    split = 'train' if train else 'test'
+    prefix = os.path.join(root, f'zeros_ones_{split}_{obs_shape[0]}x{obs_shape[1]}')
+    digits_path = f'{prefix}_digits.npy'
+    targets_path = f'{prefix}_targets.npy'
+    if not(os.path.exists(digits_path) and os.path.exists(targets_path)):
+        transform = transforms.Compose([
+            transforms.Resize(size=obs_shape),
+            ])
+        mnist =  MNIST(root=root, 
+                       train=train,
+                       transform=transform,
+                       download=True)
+        indices = [idx for idx, target in enumerate(mnist.targets) if target==0 or target==1]
+        digits = np.stack([np.array(mnist[idx][0], dtype=np.uint8) for idx in indices], axis=0)
+        targets = np.array([int(mnist.targets[idx]) for idx in indices], dtype=np.int64)
+        # Saving atomically, in case of concurrent environments:
+        for path, array in [(digits_path, digits), (targets_path, targets)]:
+            tmp_path = f'{path[:-len(".npy")]}.{os.getpid()}.tmp.npy'
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)
+
+    _MNIST_DIGITS[key] = (np.load(digits_path, mmap_mode='r'), np.load(targets_path))
+    return _MNIST_DIGITS[key]
+
+
 class NBitsSwapMNISTEnv(NBitsSwapEnv):
     def __init__(self, n=10, simple=True, fixed_goal=False, train=True):
         '''
@@ -28,22 +71,17 @@ class NBitsSwapMNISTEnv(NBitsSwapEnv):
         self.simple = simple
         self.train = train
         self.obs_shape = [32,32]
-        self.transform = transforms.Compose([
-            transforms.Resize(size=self.obs_shape),
-            ])
         dir_path = os.path.dirname(os.path.realpath(__file__))
         root = os.path.join(dir_path,'mnist')
-        self.mnist =  MNIST(root=root, 
-                            train=self.train,
-                            transform=self.transform,
-                            download=True)
+        self.digits, targets = load_mnist_digits(root=root, train=self.train, obs_shape=self.obs_shape)
 
         self.observation_space = Dict({"observation": Box(low=0, high=255, shape=(*self.obs_shape, self.n), dtype=np.float32), 
                                        "achieved_goal": Box(low=0, high=255, shape=(*self.obs_shape, self.n), dtype=np.float32), 
                                        "desired_goal": Box(low=0, high=255, shape=(*self.obs_shape, self.n), dtype=np.float32)})
 
-        self.zeros_indices = [idx for idx, target in enumerate(self.mnist.targets) if target==0]
-        self.ones_indices = [idx for idx, target in enumerate(self.mnist.targets) if target==1]
+        # Indices of the digits in self.digits:
+        self.zeros_indices = np.nonzero(targets==0)[0]
+        self.ones_indices = np.nonzero(targets==1)[0]
         
         if self.simple:
             self.zeros_indices = self.zeros_indices[:1]
@@ -56,17 +94,16 @@ class NBitsSwapMNISTEnv(NBitsSwapEnv):
         return int(all(self.state == self.goal))
 
     def _indices2mnist(self, indices):
-        mnist = []
-        for idx in indices:
-            img, target = self.mnist[idx]
-            mnist.append(255*np.array(img).astype(np.float32).reshape((*self.obs_shape, 1)))
-        mnist = np.concatenate(mnist, axis=-1)
-        return mnist 
+        # Gathering the digits, as channels:
+        mnist = self.digits[indices].transpose(1, 2, 0)
+        return np.multiply(mnist, 255, dtype=np.float32)
 
     def _get_obs(self):
         ret = {}
         ret["observation"] = self._indices2mnist(self.obs_as_indices)
-        ret["achieved_goal"] = ret["observation"].copy()
+        # The achieved goal is the observation itself, 
+        # which is not modified afterwards (nor is it in VecEnv, which copies it into its batch):
+        ret["achieved_goal"] = ret["observation"]
         ret["desired_goal"] = self._indices2mnist(self.goal_as_indices)
         return ret 
 
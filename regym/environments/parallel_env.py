@@ -2,13 +2,15 @@ import gym
 import numpy as np 
 import copy
 import time 
-from .utils import EnvironmentCreator
+from .utils import EnvironmentCreator, batch_observations, is_episode_end
+from .env_config_schedule import EnvConfigSchedule
 
 import torch
 # https://github.com/pytorch/pytorch/issues/11201:
 torch.multiprocessing.set_sharing_strategy('file_system')
-from torch.multiprocessing import Process, Queue
-from threading import Thread
+from torch.multiprocessing import Process, Queue, Value
+from threading import Thread, Event
+import queue
 
 import gc 
 
@@ -33,16 +35,44 @@ forkedPdb = ForkedPdb()
 USE_PROC =True
 
 
-def env_worker(envCreator, queue_in, queue_out, worker_id=None, seed=0):
+def heartbeat_worker(heartbeat, heartbeat_interval, stop_event):
+    '''
+    Stamps :param heartbeat: with the current time every :param heartbeat_interval: seconds, until :param stop_event: is set.
+    It runs in a side thread of the environment worker, thus the heartbeat means that the worker is alive,
+    whatever its environment is busy with, whereas the deadlines of the steps and resets mean that the work is done.
+    '''
+    while not stop_event.is_set():
+        heartbeat.value = time.time()
+        stop_event.wait(heartbeat_interval)
+
+
+def env_worker(envCreator, queue_in, queue_out, worker_id=None, seed=0, auto_reset=False, heartbeat=None, heartbeat_interval=1.0, reset_start=None):
+    '''
+    :param heartbeat: shared Value stamped with the time at which the worker was last seen alive (cf. `heartbeat_worker`).
+    :param heartbeat_interval: Float, period (in seconds) of the heartbeat.
+    :param auto_reset: Bool specifying whether to reset the environment as soon as its episode ends,
+                       using the last environment configuration received, rather than waiting
+                       for a reset instruction. The terminal observation is then provided in
+                       `info['terminal_observation']`, next to the reset observation.
+    :param reset_start: shared Value holding the time at which the worker started an automatic reset,
+                        while it performs it, and 0.0 otherwise, so that the step that triggered the reset
+                        is bounded by the reset deadline rather than by the step deadline.
+    '''
+    stop_beating = Event()
+    if heartbeat is not None:
+        Thread(target=heartbeat_worker, args=(heartbeat, heartbeat_interval, stop_beating), daemon=True).start()
+
     continuer = True
-    env = envCreator(worker_id=worker_id, seed=seed)
+    env = None
 
     obs = None
     r = None
     done = None
     info = None
+    env_config = None
 
     try:
+        env = envCreator(worker_id=worker_id, seed=seed)
         while continuer:
             instruction = queue_in.get()
 
@@ -59,21 +89,58 @@ def env_worker(envCreator, queue_in, queue_out, worker_id=None, seed=0):
                 pa_a = instruction
                 obs, r, done, info = env.step( pa_a)
                 #env.render()
+                if auto_reset and is_episode_end(done, info):
+                    # Copied, since environments may update their observation in place upon reset:
+                    info['terminal_observation'] = copy.deepcopy(obs)
+                    if reset_start is not None: reset_start.value = time.time()
+                    if env_config is None: obs = env.reset()
+                    else:  obs = env.reset(env_config)
                 queue_out.put( [obs,r,done,info] )
+                # Only once the output is sent, so that the supervisor never sees a late step meanwhile:
+                if reset_start is not None: reset_start.value = 0.0
     except Exception as e:
         print(e)
         #forkedPdb.set_trace()
     finally:
-        env.close()
+        stop_beating.set()
+        if env is not None: env.close()
 
 
 class ParallelEnv():
-    def __init__(self, env_creator, nbr_parallel_env, single_agent=True, seed=0, gathering=True):
+    def __init__(self, env_creator, nbr_parallel_env, single_agent=True, seed=0, gathering=True, 
+                 step_timeout=60.0, reset_timeout=600.0, heartbeat_interval=1.0, heartbeat_timeout=30.0, max_restarts=10):
+        '''
+        Each environment runs in its own worker, which is supervised:
+        a worker is restarted (alone) as soon as it dies, it stops beating,
+        or it misses the deadline of the step/reset it was instructed to perform.
+        The pending action of a restarted worker is replayed after its environment is reset.
+        A RuntimeError is raised when a worker fails :param max_restarts: times in a row.
+
+        :param gathering: Bool specifying whether we are gathering experience or running evaluation episodes.
+                          When gathering single-agent experience, environments whose episode ends are reset automatically
+                          within their worker, and the terminal observation is provided in 
+                          `info['terminal_observation']`.
+        :param step_timeout: Float, deadline (in seconds) for an environment to perform a step.
+        :param reset_timeout: Float, deadline (in seconds) for an environment to be launched and reset.
+                              It also bounds the steps that trigger an automatic reset, from the start of the reset.
+        :param heartbeat_interval: Float, period (in seconds) of the workers' heartbeat.
+        :param heartbeat_timeout: Float, duration (in seconds) without heartbeat after which a worker is deemed dead or frozen.
+                                  Workers beat from a side thread, thus long steps and resets do not stop the heartbeat:
+                                  they are only bounded by their deadlines.
+        :param max_restarts: Integer, number of consecutive restarts of a worker, without any output in between,
+                             after which its environment is deemed broken.
+        '''
+        self.step_timeout = step_timeout
+        self.reset_timeout = reset_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_restarts = max_restarts
         self.gathering = gathering
         self.seed = seed
         self.env_creator = env_creator
         self.nbr_parallel_env = nbr_parallel_env
         self.single_agent = single_agent
+        self.auto_reset = self.gathering and self.single_agent
 
         self.env_queues = [None]*self.nbr_parallel_env
         self.env_configs = [None]*self.nbr_parallel_env
@@ -81,20 +148,49 @@ class ParallelEnv():
         self.worker_ids = [None]*self.nbr_parallel_env
         self.count_failures = [0]*self.nbr_parallel_env
         self.env_actions = [None]*self.nbr_parallel_env
+        self.env_heartbeats = [None]*self.nbr_parallel_env
+        self.env_reset_starts = [None]*self.nbr_parallel_env
+        self.restart_counts = [0]*self.nbr_parallel_env
+        self.consecutive_restart_counts = [0]*self.nbr_parallel_env
 
         self.dones = [False]*self.nbr_parallel_env
-        self.previous_dones = copy.deepcopy(self.dones)
+        self.previous_dones = list(self.dones)
 
     def seed(self, seed):
         self.seed = seed 
 
+    def get_restart_counts(self):
+        '''
+        :returns: list of the number of times each environment's worker has been restarted.
+        '''
+        return list(self.restart_counts)
+
     def get_nbr_envs(self):
         return self.nbr_parallel_env
 
     def set_nbr_envs(self, nbr_parallel_env):
-        if self.nbr_parallel_env != nbr_parallel_env:
-            self.nbr_parallel_env = nbr_parallel_env
-            self.close()
+        '''
+        Grows or shrinks the pool of environments, without closing it.
+        Environments beyond :param nbr_parallel_env: are parked: they stay alive,
+        idle, until the pool grows again (e.g. test environments between evaluations).
+        Only the missing environments are launched, upon the next reset.
+        '''
+        if self.nbr_parallel_env == nbr_parallel_env: return
+        nbr_new_envs = nbr_parallel_env-len(self.env_processes)
+        if nbr_new_envs > 0:
+            self.env_queues += [None]*nbr_new_envs
+            self.env_configs += [None]*nbr_new_envs
+            self.env_processes += [None]*nbr_new_envs
+            self.worker_ids += [None]*nbr_new_envs
+            self.count_failures += [0]*nbr_new_envs
+            self.env_actions += [None]*nbr_new_envs
+            self.env_heartbeats += [None]*nbr_new_envs
+            self.env_reset_starts += [None]*nbr_new_envs
+            self.restart_counts += [0]*nbr_new_envs
+            self.consecutive_restart_counts += [0]*nbr_new_envs
+        self.nbr_parallel_env = nbr_parallel_env
+        self.dones = [False]*self.nbr_parallel_env
+        self.previous_dones = list(self.dones)
 
     def launch_env_process(self, idx, worker_id_offset=0):
         global USE_PROC
@@ -103,41 +199,83 @@ class ParallelEnv():
         wid = self.worker_ids[idx]
         if wid is not None: wid += worker_id_offset
         seed = self.seed+idx+1
+        # The heartbeat is only checked once the worker started beating, 
+        # since launching the worker's process may take a while:
+        self.env_heartbeats[idx] = Value('d', 0.0)
+        self.env_reset_starts[idx] = Value('d', 0.0)
         
+        args = (self.env_creator, *(self.env_queues[idx].values()), wid, seed, self.auto_reset, 
+                self.env_heartbeats[idx], self.heartbeat_interval, self.env_reset_starts[idx])
         if USE_PROC:
-            p = Process(target=env_worker, args=(self.env_creator, *(self.env_queues[idx].values()), wid, seed) )
+            p = Process(target=env_worker, args=args)
         else:
-            p = Thread(target=env_worker, args=(self.env_creator, *(self.env_queues[idx].values()), wid, seed) )
+            p = Thread(target=env_worker, args=args)
         p.start()
         
         self.env_processes[idx] = p
 
     def clean(self, idx):
-        self.env_processes[idx].terminate()
+        p = self.env_processes[idx]
+        # Workers that are stuck stop upon completing their current instruction, if they cannot be terminated (threads):
+        self.env_queues[idx]['in'].put(False)
+        if hasattr(p, 'terminate'): p.terminate()
+        # Waiting for the process, and thus its sockets, to detach:
+        p.join(timeout=self.heartbeat_timeout)
         self.env_processes[idx] = None
         self.env_queues[idx] = None
+        self.env_heartbeats[idx] = None
+        self.env_reset_starts[idx] = None
         gc.collect()
 
+    def is_healthy(self, idx):
+        '''
+        :returns: Bool stating whether the worker of environment :param idx: is alive and beating, 
+                  unless it has not started beating yet.
+        '''
+        p = self.env_processes[idx]
+        if p is None or not(p.is_alive()): return False
+        last_beat = self.env_heartbeats[idx].value
+        return last_beat == 0.0 or (time.time()-last_beat) < self.heartbeat_timeout
+
+    def get_deadline(self, idx, deadline):
+        '''
+        :param deadline: time by which the output of environment :param idx: is expected.
+        :returns: :param deadline:, postponed to `reset_timeout` after the start of the automatic reset
+                  that the worker may be performing after its step.
+        '''
+        reset_start = self.env_reset_starts[idx].value
+        if reset_start > 0.0: deadline = max(deadline, reset_start+self.reset_timeout)
+        return deadline
+
+    def restart_env_process(self, idx):
+        '''
+        Relaunches the worker of environment :param idx: alone.
+        :raises: RuntimeError if the worker has already been restarted `max_restarts` times in a row.
+        '''
+        if self.consecutive_restart_counts[idx] >= self.max_restarts:
+            raise RuntimeError(f'Environment {idx} failed {self.consecutive_restart_counts[idx]} times in a row.')
+        self.consecutive_restart_counts[idx] += 1
+        self.clean(idx)
+        # Unity environments need a fresh worker_id while the previous one's port is released:
+        if self.count_failures[idx] == 0:
+            self.count_failures[idx] = 1
+        elif self.count_failures[idx] == 1:
+            self.count_failures[idx] = -1
+        elif self.count_failures[idx] == -1:
+            self.count_failures[idx] = 0
+        worker_id_offset = self.count_failures[idx]*self.nbr_parallel_env
+        self.launch_env_process(idx, worker_id_offset=worker_id_offset)
+        self.restart_counts[idx] += 1
+        print('Relaunching environment {}... (restart counts: {})'.format(idx, self.restart_counts))
+
     def check_update_reset_env_process(self, idx, env_configs=None, reset=False):
         p = self.env_processes[idx]
         
         if p is None:
             self.launch_env_process(idx)
             print('Launching environment {}...'.format(idx))
-        elif not(p.is_alive()):
-            self.clean(idx)
-            # Waiting for the sockets to detach:
-            time.sleep(2)
-            # Relaunching again...
-            if self.count_failures[idx] == 0:
-                self.count_failures[idx] = 1
-            elif self.count_failures[idx] == 1:
-                self.count_failures[idx] = -1
-            elif self.count_failures[idx] == -1:
-                self.count_failures[idx] = 0
-            worker_id_offset = self.count_failures[idx]*self.nbr_parallel_env
-            self.launch_env_process(idx, worker_id_offset=worker_id_offset)
-            print('Relaunching environment {}...'.format(idx))
+        elif not(self.is_healthy(idx)):
+            self.restart_env_process(idx)
             
         if reset:
             self.reset_env(idx, env_configs)
@@ -145,27 +283,73 @@ class ParallelEnv():
     def reset_env(self, idx, env_configs=None):
         if env_configs is not None: 
             self.env_configs[idx] = env_configs[idx]
-        env_config = copy.deepcopy(self.env_configs[idx]) 
-        if env_config is not None and 'worker_id' in env_config: env_config.pop('worker_id')
+        env_config = self.env_configs[idx]
+        if env_config is not None: 
+            env_config = {k: v for k, v in env_config.items() if k != 'worker_id'}
         self.env_queues[idx]['in'].put( ('reset', env_config))
 
 
+    def recover_env_process(self, idx, exhaust_first_when_failure=False):
+        '''
+        Restarts the worker of environment :param idx: and resets its environment.
+        :param exhaust_first_when_failure: Bool stating whether a step output is awaited,
+                                           in which case the pending action is replayed.
+        '''
+        print('Environment {} encountered an issue.'.format(idx))
+        self.restart_env_process(idx)
+        self.reset_env(idx)
+        if exhaust_first_when_failure:
+            # Discarding the reset observation before replaying the pending action:
+            self.get_from_queue(idx)
+            self.put_action_in_queue(action=self.env_actions[idx], idx=idx)
+
+    def get_from_queues(self, env_indices, exhaust_first_when_failure=False):
+        '''
+        Collects the outputs of environments :param env_indices: as they arrive,
+        rather than waiting for each environment in turn, while supervising their workers.
+        :param exhaust_first_when_failure: Bool stating whether step outputs are awaited (cf. get_from_queue).
+        :returns: list of the outputs, ordered as :param env_indices:.
+        '''
+        timeout = self.step_timeout if exhaust_first_when_failure else self.reset_timeout
+        deadlines = {idx: time.time()+timeout for idx in env_indices}
+        outs = dict()
+        pending = list(env_indices)
+        while len(pending):
+            # Each round blocks on the pending queues in turn for at most one heartbeat interval overall,
+            # so that outputs are collected as soon as they arrive without busy polling:
+            wait = self.heartbeat_interval/len(pending)
+            for idx in list(pending):
+                try:
+                    outs[idx] = self.env_queues[idx]['out'].get(block=True, timeout=max(0.0, min(wait, self.get_deadline(idx, deadlines[idx])-time.time())))
+                    pending.remove(idx)
+                except queue.Empty:
+                    if self.is_healthy(idx) and time.time() < self.get_deadline(idx, deadlines[idx]):
+                        continue
+                    self.recover_env_process(idx, exhaust_first_when_failure=exhaust_first_when_failure)
+                    deadlines[idx] = time.time()+timeout
+        return [outs[idx] for idx in env_indices]
+
     def get_from_queue(self, idx, exhaust_first_when_failure=False):
+        '''
+        Waits for the output of environment :param idx:, while supervising its worker.
+        :param exhaust_first_when_failure: Bool stating whether a step output is awaited,
+                                           in which case the pending action is replayed
+                                           after restarting a failed worker. 
+                                           Otherwise, a reset output is awaited.
+        '''
+        timeout = self.step_timeout if exhaust_first_when_failure else self.reset_timeout
+        deadline = time.time()+timeout
         out = None
         while out is None:
             try:
-                # Block/wait for at most 60 seconds:
-                out = self.env_queues[idx]['out'].get(block=True)#,timeout=60)
-            except Exception as e:
-                print('Exception: {}'.format(e))
+                out = self.env_queues[idx]['out'].get(block=True, timeout=self.heartbeat_interval)
+            except queue.Empty:
+                if self.is_healthy(idx) and time.time() < self.get_deadline(idx, deadline):
+                    continue
                 # Otherwise, we assume that there is an issue with the environment
-                # And thus we relaunch it, after waiting sufficiently to be able to do so:
-                print('Environment {} encountered an issue.'.format(idx))
-                self.check_update_reset_env_process(idx=idx, env_configs=None, reset=True)
-                if exhaust_first_when_failure:
-                    out = None 
-                    exhaust = self.env_queues[idx]['out'].get(block=True,timeout=None)
-                    self.put_action_in_queue(action=self.env_actions[idx], idx=idx)
+                # And thus we relaunch it:
+                self.recover_env_process(idx, exhaust_first_when_failure=exhaust_first_when_failure)
+                deadline = time.time()+timeout
                     
         return out
 
@@ -174,24 +358,36 @@ class ParallelEnv():
         self.env_queues[idx]['in'].put(action)
 
     def reset(self, env_configs=None, env_indices=None) :
+        '''
+        Resets the environments :param env_indices: in a batch: each worker is sent
+        its configuration in one message, and the replies are collected as they arrive.
+        :param env_configs: list of configuration dictionnaries, one per environment,
+                            or EnvConfigSchedule to sample them from.
+        :param env_indices: indices of the environments to reset (default: all).
+        '''
         if env_indices is None: env_indices = range(self.nbr_parallel_env)
         
+        if isinstance(env_configs, EnvConfigSchedule):
+            env_configs = env_configs.sample(nbr_envs=self.nbr_parallel_env)
         if env_configs is not None: 
-            self.worker_ids = [ env_config.pop('worker_id', None) for env_config in env_configs]
+            for idx, env_config in enumerate(env_configs):
+                self.worker_ids[idx] = env_config.pop('worker_id', None)
          
         for idx in env_indices:
             self.check_update_reset_env_process(idx, env_configs=env_configs, reset=True)
 
-        observations = [ self.get_from_queue(idx) for idx in env_indices] 
+        observations = self.get_from_queues(env_indices)
+        for idx in env_indices:
+            self.consecutive_restart_counts[idx] = 0
 
         if self.single_agent:
-            per_env_obs = np.concatenate( [ np.expand_dims(np.array(obs), axis=0) for obs in observations], axis=0)
+            per_env_obs = batch_observations(observations)
         else:
-            per_env_obs = [ np.concatenate( [ np.array(obs[idx_agent]).reshape(1, *(obs[idx_agent].shape)) for obs in observations], axis=0) for idx_agent in range(len(observations[0]) ) ]
+            per_env_obs = [ batch_observations([obs[idx_agent] for obs in observations]) for idx_agent in range(len(observations[0]) ) ]
         
         for idx in env_indices:
             self.dones[idx] = False
-        self.previous_dones = copy.deepcopy(self.dones)
+        self.previous_dones = list(self.dones)
 
         return per_env_obs
 
@@ -201,7 +397,7 @@ class ParallelEnv():
         infos = []
     	
         batch_env_index = -1
-        for env_index in range(len(self.env_queues) ):
+        for env_index in range(self.nbr_parallel_env):
             if not(self.gathering) and self.dones[env_index]:
                 continue
             batch_env_index += 1
@@ -213,12 +409,18 @@ class ParallelEnv():
             
             self.put_action_in_queue(action=pa_a, idx=env_index)
 
-        for env_index in range(len(self.env_queues) ):
+        stepped_env_indices = [env_index for env_index in range(self.nbr_parallel_env) if self.gathering or not(self.dones[env_index])]
+        experiences = dict(zip(stepped_env_indices, self.get_from_queues(stepped_env_indices, exhaust_first_when_failure=True)))
+        # The restarts of a worker are only counted in a row until it steps successfully 
+        # (the reset observations awaited while recovering do not count as a success):
+        for env_index in stepped_env_indices:
+            self.consecutive_restart_counts[env_index] = 0
+        for env_index in range(self.nbr_parallel_env):
             if not(self.gathering) and self.dones[env_index]:
                 infos.append(None)
                 continue
             
-            experience = self.get_from_queue(idx=env_index, exhaust_first_when_failure=True)
+            experience = experiences[env_index]
             obs, r, done, info = experience
             
             observations.append( obs )
@@ -226,13 +428,13 @@ class ParallelEnv():
             self.dones[env_index] = done
             infos.append(info)
             
-        self.previous_dones = copy.deepcopy(self.dones[env_index]) 
+        self.previous_dones = list(self.dones)
             
         if self.single_agent:
-            per_env_obs = np.concatenate( [ np.expand_dims(np.array(obs), axis=0) for obs in observations], axis=0)
+            per_env_obs = batch_observations(observations)
             per_env_reward = np.concatenate( [ np.array(r).reshape(-1) for r in rewards], axis=0)
         else:
-            per_env_obs = [ np.concatenate( [ np.array(obs[idx_agent]).reshape(1,-1) for obs in observations], axis=0) for idx_agent in range(len(observations[0]) ) ]
+            per_env_obs = [ batch_observations([obs[idx_agent] for obs in observations], flatten=True) for idx_agent in range(len(observations[0]) ) ]
             per_env_reward = [ np.concatenate( [ np.array(r[idx_agent]).reshape((-1)) for r in rewards], axis=0) for idx_agent in range(len(rewards[0]) ) ]
 
         return per_env_obs, per_env_reward, self.dones, infos
@@ -244,8 +446,9 @@ class ParallelEnv():
                 if self.env_processes[env_index] is None: continue
 
                 self.env_queues[env_index]['in'].put(False)
-                self.env_processes[env_index].join()
-                self.env_processes[env_index].terminate()
+                # Unresponsive workers are not waited for:
+                self.env_processes[env_index].join(timeout=self.heartbeat_timeout)
+                if hasattr(self.env_processes[env_index], 'terminate'): self.env_processes[env_index].terminate()
                 self.env_processes[env_index] = None
                 
                 self.env_queues[env_index]['in'].close()
@@ -260,9 +463,13 @@ class ParallelEnv():
         self.worker_ids = [None]*self.nbr_parallel_env
         self.count_failures = [0]*self.nbr_parallel_env
         self.env_actions = [None]*self.nbr_parallel_env
+        self.env_heartbeats = [None]*self.nbr_parallel_env
+        self.env_reset_starts = [None]*self.nbr_parallel_env
+        self.restart_counts = [0]*self.nbr_parallel_env
+        self.consecutive_restart_counts = [0]*self.nbr_parallel_env
 
         self.dones = [False]*self.nbr_parallel_env
-        self.previous_dones = copy.deepcopy(self.dones)
+        self.previous_dones = list(self.dones)
 
 class ParallelEnvironmentCreationFunction():
 
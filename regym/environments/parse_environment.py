@@ -35,6 +35,7 @@ def generate_task(env_name: str,
     :param seed: int to seed the environment with...
     :param test_seed: int to seed the test environment with...
     :param gathering: Bool specifying whether we are gathering experience or running evaluation episodes.
+                      When gathering, the environments are reset automatically on episode end.
     :returns: Task created from :param: env_name
     '''
     if env_name is None: raise ValueError('Parameter \'env_name\' was None')
@@ -1,4 +1,5 @@
 import gym
+import numpy as np
 
 class EnvironmentCreator():
     def __init__(self, environment_name_cli, is_unity_environment, is_gym_environment, wrapping_fn=None):
@@ -18,3 +19,84 @@ class EnvironmentCreator():
             from obstacle_tower_env import ObstacleTowerEnv
             if worker_id is None: worker_id=0
             return ObstacleTowerEnv(self.environment_name, retro=True, realtime_mode=False, timeout_wait=60, worker_id=worker_id) #timeout_wait=6000,  # retro=True mode creates an observation space of a 64x64 (Box) image
+
+
+def is_episode_end(done, info):
+    '''
+    Episodes end when the environment says so, through :param info:'s `real_done`
+    entry when available (e.g. life-loss wrappers), or through :param done: otherwise.
+    '''
+    if info is not None and 'real_done' in info: return info['real_done']
+    return done
+
+
+def _observation_spec(observation):
+    '''
+    Returns the shape and dtype of a single environment observation.
+    Non-numerical observations (e.g. textual missions) are batched as objects.
+    '''
+    if not(hasattr(observation, 'shape') and hasattr(observation, 'dtype')):
+        observation = np.asarray(observation)
+    dtype = observation.dtype
+    if dtype.kind in 'OUSV':    dtype = np.dtype(object)
+    return tuple(observation.shape), dtype
+
+
+def batch_observations(observations, flatten=False):
+    '''
+    Assembles the observations of several environments into a batch.
+    The batch is allocated once, from the shape and dtype of the first observation,
+    and each observation is written directly into its row. Thus, `LazyFrames` are
+    never concatenated in an intermediate array.
+    Dictionnary observations (e.g. goal-conditioned environments) are batched
+    key-wise into a dictionnary of batches.
+    The returned batch is a fresh array that is owned by the caller.
+
+    :param observations: list of observations, one per environment.
+    :param flatten: Boolean stating whether to flatten each observation.
+    :returns: numpy.ndarray of shape (len(observations), *observation_shape),
+              or dictionnary of such arrays.
+    '''
+    first_observation = observations[0]
+    if isinstance(first_observation, dict):
+        return {key: batch_observations([obs[key] for obs in observations], flatten=flatten)
+                for key in first_observation}
+
+    shape, dtype = _observation_spec(first_observation)
+    if flatten: shape = (int(np.prod(shape)),)
+    batch = np.empty((len(observations), *shape), dtype=dtype)
+    for idx, obs in enumerate(observations):
+        if flatten:
+            batch[idx] = np.asarray(obs).reshape(shape)
+        elif hasattr(obs, 'copy_into'):
+            obs.copy_into(batch[idx])
+        else:
+            batch[idx] = obs
+    return batch
+
+
+def index_batch(batch, idx):
+    '''
+    :returns: element :param idx: of :param batch:, which may be a dictionnary of batches.
+    '''
+    if isinstance(batch, dict):
+        return {key: index_batch(value, idx) for key, value in batch.items()}
+    return batch[idx]
+
+
+def remove_from_batch(batch, idx):
+    '''
+    :returns: :param batch:, which may be a dictionnary of batches, without its element :param idx:.
+    '''
+    if isinstance(batch, dict):
+        return {key: remove_from_batch(value, idx) for key, value in batch.items()}
+    return np.concatenate([batch[:idx,...], batch[idx+1:,...]], axis=0)
+
+
+def concatenate_batches(batches):
+    '''
+    :returns: concatenation of :param batches:, which may be dictionnaries of batches, along the batch dimension.
+    '''
+    if isinstance(batches[0], dict):
+        return {key: concatenate_batches([batch[key] for batch in batches]) for key in batches[0]}
+    return np.concatenate(batches, axis=0)
@@ -2,11 +2,18 @@ import gym
 import numpy as np 
 import copy
 import time 
-from .utils import EnvironmentCreator
+from functools import partial
+from .utils import EnvironmentCreator, batch_observations, is_episode_end
+from .env_config_schedule import EnvConfigSchedule
 
 
 class VecEnv():
     def __init__(self, env_creator, nbr_parallel_env, single_agent=True, worker_id=None, seed=0, gathering=True):
+        '''
+        :param gathering: Bool specifying whether we are gathering experience or running evaluation episodes.
+                          When gathering single-agent experience, environments whose episode ends are reset automatically,
+                          and the terminal observation is provided in `info['terminal_observation']`.
+        '''
         self.gathering = gathering
         self.seed = seed
         self.env_creator = env_creator
@@ -16,6 +23,7 @@ class VecEnv():
         self.env_queues = [None]*self.nbr_parallel_env
         self.env_configs = [None]*self.nbr_parallel_env
         self.env_processes = [None]*self.nbr_parallel_env
+        self.default_worker_id = worker_id if isinstance(worker_id, int) else None
         if worker_id is None:
             self.worker_ids = [None]*self.nbr_parallel_env
         elif isinstance(worker_id, int):
@@ -26,7 +34,7 @@ class VecEnv():
             raise NotImplementedError
 
         self.dones = [False]*self.nbr_parallel_env
-        self.previous_dones = copy.deepcopy(self.dones)
+        self.previous_dones = list(self.dones)
 
     @property
     def observation_space(self):
@@ -47,9 +55,22 @@ class VecEnv():
         return self.nbr_parallel_env
 
     def set_nbr_envs(self, nbr_parallel_env):
-        if self.nbr_parallel_env != nbr_parallel_env:
-            self.nbr_parallel_env = nbr_parallel_env
-            self.close()
+        '''
+        Grows or shrinks the pool of environments, without closing it.
+        Environments beyond :param nbr_parallel_env: are parked: they stay alive,
+        idle, until the pool grows again (e.g. test environments between evaluations).
+        Only the missing environments are launched, upon the next reset.
+        '''
+        if self.nbr_parallel_env == nbr_parallel_env: return
+        nbr_new_envs = nbr_parallel_env-len(self.env_processes)
+        if nbr_new_envs > 0:
+            self.env_queues += [None]*nbr_new_envs
+            self.env_configs += [None]*nbr_new_envs
+            self.env_processes += [None]*nbr_new_envs
+            self.worker_ids += [self.default_worker_id]*nbr_new_envs
+        self.nbr_parallel_env = nbr_parallel_env
+        self.dones = [False]*self.nbr_parallel_env
+        self.previous_dones = list(self.dones)
 
     def launch_env_process(self, idx, worker_id_offset=0):
         self.env_queues[idx] = {'in':list(), 'out':list()}
@@ -70,9 +91,9 @@ class VecEnv():
         if reset:
             if env_configs is not None: 
                 self.env_configs[idx] = env_configs[idx]
-            env_config = copy.deepcopy(self.env_configs[idx]) 
-            if env_config is not None and 'worker_id' in env_config: 
-                env_config.pop('worker_id')
+            env_config = self.env_configs[idx]
+            if env_config is not None: 
+                env_config = {k: v for k, v in env_config.items() if k != 'worker_id'}
             if env_config is None:
                 out = self.env_processes[idx].reset()
             else:
@@ -87,10 +108,18 @@ class VecEnv():
         self.env_queues[idx]['out'] = self.env_processes[idx].step(action)
 
     def reset(self, env_configs=None, env_indices=None) :
+        '''
+        :param env_configs: list of configuration dictionnaries, one per environment,
+                            or EnvConfigSchedule to sample them from.
+        :param env_indices: indices of the environments to reset (default: all).
+        '''
         if env_indices is None: env_indices = range(self.nbr_parallel_env)
         
+        if isinstance(env_configs, EnvConfigSchedule):
+            env_configs = env_configs.sample(nbr_envs=self.nbr_parallel_env)
         if env_configs is not None: 
-            self.worker_ids = [ env_config.pop('worker_id', None) for env_config in env_configs]
+            for idx, env_config in enumerate(env_configs):
+                self.worker_ids[idx] = env_config.pop('worker_id', None)
          
         for idx in env_indices:
             self.check_update_reset_env_process(idx, env_configs=env_configs, reset=True)
@@ -98,13 +127,13 @@ class VecEnv():
         observations = [self.get_from_queue(idx) for idx in env_indices] 
         
         if self.single_agent:
-            per_env_obs = np.concatenate( [ np.expand_dims(np.array(obs), axis=0) for obs in observations], axis=0)
+            per_env_obs = batch_observations(observations)
         else:
-            per_env_obs = [ np.concatenate( [ np.array(obs[idx_agent]).reshape(1, *(obs[idx_agent].shape)) for obs in observations], axis=0) for idx_agent in range(len(observations[0]) ) ]
+            per_env_obs = [ batch_observations([obs[idx_agent] for obs in observations]) for idx_agent in range(len(observations[0]) ) ]
         
         for idx in env_indices:
             self.dones[idx] = False
-        self.previous_dones = copy.deepcopy(self.dones)
+        self.previous_dones = list(self.dones)
 
         return per_env_obs
 
@@ -114,7 +143,7 @@ class VecEnv():
         infos = []
         
         batch_env_index = -1
-        for env_index in range(len(self.env_queues) ):
+        for env_index in range(self.nbr_parallel_env):
             if not(self.gathering) and self.dones[env_index]:
                 continue
             batch_env_index += 1
@@ -126,7 +155,7 @@ class VecEnv():
             
             self.put_action_in_queue(action=pa_a, idx=env_index)
 
-        for env_index in range(len(self.env_queues) ):
+        for env_index in range(self.nbr_parallel_env):
             if not(self.gathering) and self.dones[env_index]:
                 infos.append(None)
                 continue
@@ -134,18 +163,24 @@ class VecEnv():
             experience = self.get_from_queue(idx=env_index, exhaust_first_when_failure=True)
             obs, r, done, info = experience
             
+            if self.gathering and self.single_agent and is_episode_end(done, info):
+                # Copied, since environments may update their observation in place upon reset:
+                info['terminal_observation'] = copy.deepcopy(obs)
+                self.check_update_reset_env_process(idx=env_index, env_configs=None, reset=True)
+                obs = self.get_from_queue(idx=env_index)
+
             observations.append( obs )
             rewards.append( r )
             self.dones[env_index] = done
             infos.append(info)
         
-        self.previous_dones = copy.deepcopy(self.dones[env_index]) 
+        self.previous_dones = list(self.dones)
             
         if self.single_agent:
-            per_env_obs = np.concatenate( [ np.expand_dims(np.array(obs), axis=0) for obs in observations], axis=0)
+            per_env_obs = batch_observations(observations)
             per_env_reward = np.concatenate( [ np.array(r).reshape(-1) for r in rewards], axis=0)
         else:
-            per_env_obs = [ np.concatenate( [ np.array(obs[idx_agent]).reshape(1,-1) for obs in observations], axis=0) for idx_agent in range(len(observations[0]) ) ]
+            per_env_obs = [ batch_observations([obs[idx_agent] for obs in observations], flatten=True) for idx_agent in range(len(observations[0]) ) ]
             per_env_reward = [ np.concatenate( [ np.array(r[idx_agent]).reshape((-1)) for r in rewards], axis=0) for idx_agent in range(len(rewards[0]) ) ]
 
         return per_env_obs, per_env_reward, self.dones, infos
@@ -162,4 +197,25 @@ class VecEnv():
         self.worker_ids = [None]*self.nbr_parallel_env
         
         self.dones = [False]*self.nbr_parallel_env
-        self.previous_dones = copy.deepcopy(self.dones)
\ No newline at end of file
+        self.previous_dones = list(self.dones)
+
+
+def _copy_batched_env(env, seed, gathering):
+    env = copy.deepcopy(env)
+    env.seed(seed)
+    env.gathering = gathering
+    return env
+
+
+def batched_env_creator(env, seed, gathering=True):
+    '''
+    :param env: batched environments, i.e. a VecEnv or ParallelEnv, or natively batched environments (e.g. BatchedNBitsSwapEnv).
+    :param seed: int to seed the new environments with.
+    :param gathering: Bool specifying whether the new environments gather experience or run evaluation episodes (cf. `VecEnv`).
+    :returns: picklable callable creating as many new environments as :param env: holds, e.g. within another process.
+              The environments of VecEnvs and ParallelEnvs are created anew, in a VecEnv, with their environment creator,
+              whereas natively batched environments, which have none, are copied.
+    '''
+    if hasattr(env, 'env_creator'):
+        return partial(VecEnv, env.env_creator, env.get_nbr_envs(), single_agent=env.single_agent, seed=seed, gathering=gathering)
+    return partial(_copy_batched_env, env, seed, gathering)
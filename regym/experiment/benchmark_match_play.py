@@ -11,20 +11,24 @@ from collections import namedtuple
 
 from concurrent.futures import as_completed
 from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 
 from rl_algorithms import AgentHook
 from rl_loops.multiagent_loops.simultaneous_action_rl_loop import run_episode
+from rl_loops.inference_server import InferenceServer
 
 BenchMarkStatistics = namedtuple('BenchMarkStatistics', 'iteration recorded_agent_vector winrates')
 
 
-def benchmark_match_play_process(expected_benchmarking_matches, benchmarking_episodes, createNewEnvironment, benchmark_queue, matrix_queue, seed):
+def benchmark_match_play_process(expected_benchmarking_matches, benchmarking_episodes, createNewEnvironment, benchmark_queue, matrix_queue, seed, use_inference_servers=False):
     """
     :param expected_benchmarking_matches: Number of agents that the process will wait for before shuting itself down
     :param benchmarking_episodes: Number of episodes that each benchmarking process will run for to collect statistics
     :param createNewEnvironment OpenAI gym environment creation function
     :param benchmark_queue: Queue from where BenchmarkingJob(s) will be recieved
     :param matrix_queue: Queue to which submit stats
+    :param use_inference_servers: Boolean specifying whether the agents are served by `InferenceServer`s
+                                  (cf. `served_benchmark_empirical_winrates`)
     """
     logger = logging.getLogger('Benchmarking')
     logger.setLevel(logging.DEBUG)
@@ -43,7 +47,10 @@ def benchmark_match_play_process(expected_benchmarking_matches, benchmarking_epi
 
         agent_vector = [recorded_agent.agent for recorded_agent in benchmark_job.recorded_agent_vector]
 
-        winrates = benchmark_empirical_winrates(benchmarking_episodes, createNewEnvironment, agent_vector, logger)
+        if use_inference_servers:
+            winrates = served_benchmark_empirical_winrates(benchmarking_episodes, createNewEnvironment, agent_vector, logger)
+        else:
+            winrates = benchmark_empirical_winrates(benchmarking_episodes, createNewEnvironment, agent_vector, logger)
 
         matrix_queue.put(BenchMarkStatistics(benchmark_job.iteration,
                                              benchmark_job.recorded_agent_vector,
@@ -68,14 +75,49 @@ def benchmark_empirical_winrates(benchmarking_episodes, createNewEnvironment, ag
     return winrates
 
 
+def served_benchmark_empirical_winrates(benchmarking_episodes, createNewEnvironment, agent_vector, logger, max_workers=3):
+    '''
+    Same as `benchmark_empirical_winrates`, but each agent is held once, by an `InferenceServer`,
+    rather than by each episode. The episodes are played by the servers' clients, in threads,
+    so that the forward passes of the concurrent episodes are batched by the servers.
+    '''
+    inference_servers = [InferenceServer(AgentHook.unhook(agent, use_cuda=False), nbr_clients=benchmarking_episodes) 
+                         for agent in agent_vector]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        benchmark_start = time.time()
+        futures = [executor.submit(served_match, createNewEnvironment(), [inference_server.clients[episode] for inference_server in inference_servers])
+                   for episode in range(benchmarking_episodes)]
+
+        wins_vector = np.zeros(len(agent_vector))
+
+        for future in as_completed(futures):
+            episode_winner = future.result()
+            wins_vector[episode_winner] += 1
+        benchmark_duration = time.time() - benchmark_start
+    for inference_server in inference_servers: inference_server.close()
+    logger.info('Benchmarking finished. Duration: {} seconds'.format(benchmark_duration))
+    winrates = wins_vector / benchmarking_episodes
+    return winrates
+
+
 def single_match(createNewEnvironment, agent_vector):
     # trajectory: [(s,a,r,s')]
     unhooked_agents = [AgentHook.unhook(agent, use_cuda=False) for agent in agent_vector]
     trajectory = run_episode(env, unhooked_agents, training=False)
     #trajectory = run_episode(createNewEnvironment(), unhooked_agents, training=False)
+    return trajectory_winner(trajectory, len(agent_vector))
+
+
+def served_match(env, client_vector):
+    # The clients stand in for the agents, held by the inference servers:
+    trajectory = run_episode(env, client_vector, training=False)
+    return trajectory_winner(trajectory, len(client_vector))
+
+
+def trajectory_winner(trajectory, nbr_agents):
     reward_vector = lambda t: t[2]
     individal_agent_trajectory_reward = lambda t, agent_index: sum(map(lambda experience: reward_vector(experience)[agent_index], t))
-    cumulative_reward_vector = [individal_agent_trajectory_reward(trajectory, i) for i in range(len(agent_vector))]
+    cumulative_reward_vector = [individal_agent_trajectory_reward(trajectory, i) for i in range(nbr_agents)]
     episode_winner = choose_winner(cumulative_reward_vector)
     return episode_winner
 
@@ -2,3 +2,4 @@ from .agents import *
 from .algorithms import *
 from .agent_hook import AgentHook
 from .agent_hook import load_population_from_path
+from .checkpoint_store import CheckpointStore
@@ -2,11 +2,14 @@ import os
 from os import listdir
 from os.path import isfile, join
 from typing import List, Callable, Tuple, Any
+from collections import OrderedDict
 import torch
-from .agents import TabularQLearningAgent, DQNAgent, THERAgent, PPOAgent, A2CAgent, MixedStrategyAgent
+from .agents import TabularQLearningAgent, DQNAgent, THERAgent, PPOAgent, A2CAgent, MixedStrategyAgent, PolicySnapshot
+from .algorithms.algorithm import get_named_models
+from .checkpoint_store import CheckpointStore
 from enum import Enum
 
-AgentType = Enum("AgentType", "DQN THER TQL PPO A2C MixedStrategyAgent")
+AgentType = Enum("AgentType", "DQN THER TQL PPO A2C MixedStrategyAgent PolicySnapshot")
 
 
 # TODO: move elsewhere. Maybe utils?
@@ -18,19 +21,90 @@ def load_population_from_path(path: str, file_extension='pt',
     Agent files are recognized by the :param: file_extension.
     If :param: sort_fn is passed, all appropiate files in :param: path
     are sorted according to :param: sort_fn.
+    If :param: path holds a `CheckpointStore`, its checkpoints are loaded instead.
 
     :param path: Relative path from which
     :param file_extension: 
     :param sort_fn: Function to be used as part of list.sort(key={})
     '''
+    if CheckpointStore.exists(path):
+        store = CheckpointStore(path)
+        files = [os.path.abspath(f'{path}/{key}') for key in store.keys() if key.endswith(file_extension)]
+        if sort_fn is not None: files.sort(key=sort_fn)
+        return [store.load(os.path.basename(f)) for f in files]
+
     files = [os.path.abspath(f'{path}/{f}') for f in listdir(path)
              if isfile(join(path, f)) and f.endswith(file_extension)]
     if sort_fn is not None: files.sort(key=sort_fn)
     return [torch.load(open(f, 'rb')) for f in files]
 
 
+def agent_nbytes(agent):
+    '''
+    :returns: number of bytes held by the tensors of the models of :param agent:.
+    '''
+    algorithm = getattr(agent, 'algorithm', None)
+    if algorithm is None: return 0
+    return sum(tensor.numel()*tensor.element_size() for model in get_named_models(algorithm).values() for tensor in model.state_dict().values())
+
+
+class UnhookedAgentCache():
+    def __init__(self, byte_budget=2**30):
+        '''
+        Least-recently-used cache of the inference-only agents (`PolicySnapshot`s) unhooked from disk,
+        keyed by their path, so that the opponents that are sampled often are only loaded once.
+        Cached agents are never handed over as they are: each unhook call gets its own clone
+        (cf. `AgentHook._load_agent`), whose device and actors can be set without affecting the others.
+
+        :param byte_budget: maximum number of bytes of the models of the cached agents (cf. `agent_nbytes`).
+                            Agents bigger than the budget are not cached.
+        '''
+        self.byte_budget = byte_budget
+        self.entries = OrderedDict()
+        self.nbytes = 0
+
+    def set_byte_budget(self, byte_budget):
+        '''
+        Sets the maximum number of bytes of the models of the cached agents,
+        evicting the least recently used agents, if need be.
+        '''
+        self.byte_budget = byte_budget
+        self._evict(nbytes=0)
+
+    def _evict(self, nbytes):
+        # Evicting the least recently used agents, until :param nbytes: more bytes fit in the budget:
+        while len(self.entries) and self.nbytes + nbytes > self.byte_budget:
+            _, (_, evicted_nbytes) = self.entries.popitem(last=False)
+            self.nbytes -= evicted_nbytes
+
+    def get(self, path):
+        if path not in self.entries: return None
+        self.entries.move_to_end(path)
+        return self.entries[path][0]
+
+    def put(self, path, agent):
+        self.discard(path)
+        nbytes = agent_nbytes(agent)
+        if nbytes > self.byte_budget: return
+        self._evict(nbytes)
+        self.entries[path] = (agent, nbytes)
+        self.nbytes += nbytes
+
+    def discard(self, path):
+        if path in self.entries:
+            self.nbytes -= self.entries.pop(path)[1]
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.nbytes = 0
+
+
 class AgentHook():
-    def __init__(self, agent, save_path=None):
+    # Cache of the snapshots unhooked from disk, whose budget can be set with `AgentHook.unhooked_agent_cache.set_byte_budget`,
+    # or with the 'unhooked_agent_cache_byte_budget' entry of the self-play training schemes' configuration:
+    unhooked_agent_cache = UnhookedAgentCache()
+
+    def __init__(self, agent, save_path=None, checkpoint_store=None):
         """
         Creates an agent hook which allows to transport :param: agent:
         - Between processes if by making all Torch.Tensors be in CPU IF :param: save_path is None
@@ -38,13 +112,18 @@ class AgentHook():
 
         :param agent: Agent to be hooked to be transported between processes
         :param save_path: path where to save the current agent.
+        :param checkpoint_store: CheckpointStore in which to save the current agent, deduplicated,
+                                 under the file name of :param: save_path, rather than pickling it whole.
         :returns: AgentHook agent whose type is that of :param: agent
         """
 
         self.name = agent.name
         self.save_path = save_path
+        self.checkpoint_store = checkpoint_store
 
-        if isinstance(agent, MixedStrategyAgent):
+        if isinstance(agent, PolicySnapshot):
+            agent_type, model_list = AgentType.PolicySnapshot, list(get_named_models(agent.algorithm).items())
+        elif isinstance(agent, MixedStrategyAgent):
             agent_type, model_list = AgentType.MixedStrategyAgent, []
         elif isinstance(agent, TabularQLearningAgent):
             agent_type, model_list = AgentType.TQL, []
@@ -62,26 +141,68 @@ class AgentHook():
         self.type, self.model_list = agent_type, model_list
         for _, model in model_list: model.cpu()
         if not self.save_path: self.agent = agent
-        else: torch.save(agent, self.save_path)
+        else:
+            if self.checkpoint_store is not None: self.checkpoint_store.save(agent, key=os.path.basename(self.save_path))
+            else: torch.save(agent, self.save_path)
+            # The saved agent is loaded from disk when unhooked, thus its models need not be kept alive:
+            self.model_list = [(name, None) for name, _ in model_list]
+            AgentHook.unhooked_agent_cache.discard(self.save_path)
 
     @staticmethod
     def unhook(agent_hook, use_cuda=None, nbr_actor=None):
-        if hasattr(agent_hook, 'save_path') and agent_hook.save_path is not None: agent_hook.agent = torch.load(agent_hook.save_path)
-        if agent_hook.type == AgentType.TQL or agent_hook.type == AgentType.MixedStrategyAgent: return agent_hook.agent
-        if 'use_cuda' in agent_hook.agent.algorithm.kwargs:
+        '''
+        :returns: the hooked agent. Agents saved to disk are loaded anew, or cloned from
+                  `AgentHook.unhooked_agent_cache`, and are not attached to :param agent_hook:,
+                  so that the cache's budget bounds their memory.
+        '''
+        if hasattr(agent_hook, 'save_path') and agent_hook.save_path is not None: agent = AgentHook._load_agent(agent_hook)
+        else: agent = agent_hook.agent
+        if agent_hook.type == AgentType.TQL or agent_hook.type == AgentType.MixedStrategyAgent: return agent
+        if 'use_cuda' in agent.algorithm.kwargs:
             if use_cuda is not None:
-               agent_hook.agent.algorithm.kwargs['use_cuda'] = use_cuda
-               if hasattr(agent_hook.agent, 'state_preprocessing'): agent_hook.agent.state_preprocessing.use_cuda = use_cuda
-            if agent_hook.agent.algorithm.kwargs['use_cuda']:
-                for name, model in agent_hook.model_list: setattr(agent_hook.agent.algorithm, name, model.cuda())
+               agent.algorithm.kwargs['use_cuda'] = use_cuda
+               if hasattr(agent, 'state_preprocessing'): agent.state_preprocessing.use_cuda = use_cuda
+            if agent.algorithm.kwargs['use_cuda']:
+                for name, _ in agent_hook.model_list: AgentHook._set_model(agent.algorithm, name, AgentHook._get_model(agent.algorithm, name).cuda())
+            elif use_cuda is not None:
+                for name, _ in agent_hook.model_list: AgentHook._set_model(agent.algorithm, name, AgentHook._get_model(agent.algorithm, name).cpu())
         if nbr_actor is not None :
-            agent_hook.agent.set_nbr_actor(nbr_actor)
-        return agent_hook.agent
+            agent.set_nbr_actor(nbr_actor)
+        return agent
+
+    @staticmethod
+    def _load_agent(agent_hook):
+        '''
+        :returns: the agent saved by :param agent_hook:. Snapshots are cached (cf. `AgentHook.unhooked_agent_cache`),
+                  and each call gets its own clone of the cached snapshot, which is cheaper than loading it from disk.
+                  Other agents (e.g. training agents) are loaded from disk at each call.
+        '''
+        agent = AgentHook.unhooked_agent_cache.get(agent_hook.save_path)
+        if agent is not None: return agent.clone()
+
+        checkpoint_store = getattr(agent_hook, 'checkpoint_store', None)
+        if checkpoint_store is not None: agent = checkpoint_store.load(os.path.basename(agent_hook.save_path))
+        else: agent = torch.load(agent_hook.save_path)
+        if not isinstance(agent, PolicySnapshot): return agent
+        AgentHook.unhooked_agent_cache.put(agent_hook.save_path, agent)
+        return agent.clone()
 
     @staticmethod
     def load(load_path):
         agent = torch.load(load_path)
         hook = AgentHook(agent)
         if 'use_cuda' in agent.algorithm.kwargs and agent.algorithm.kwargs['use_cuda']:
-            for name, model in hook.model_list: setattr(agent.algorithm, name, model.cuda())
+            for name, model in hook.model_list: AgentHook._set_model(agent.algorithm, name, model.cuda())
         return agent
+
+    @staticmethod
+    def _get_model(algorithm, name):
+        for attr in name.split('.'): algorithm = getattr(algorithm, attr)
+        return algorithm
+
+    @staticmethod
+    def _set_model(algorithm, name, model):
+        # Models of wrapped algorithms are named after their path, e.g. 'algorithm.model':
+        *path, name = name.split('.')
+        for attr in path: algorithm = getattr(algorithm, attr)
+        setattr(algorithm, name, model)
@@ -6,6 +6,8 @@ from .ppo_agent import build_PPO_Agent, PPOAgent
 from .reinforce_agent import build_Reinforce_Agent, ReinforceAgent
 from .a2c_agent import build_A2C_Agent, A2CAgent
 from .i2a_agent import build_I2A_Agent, I2AAgent
+from .policy_snapshot import PolicySnapshot, snapshot_policy
+from .batched_inference import batched_take_action
 
 rockAgent     = MixedStrategyAgent(support_vector=[1, 0, 0], name='RockAgent')
 paperAgent    = MixedStrategyAgent(support_vector=[0, 1, 0], name='PaperAgent')
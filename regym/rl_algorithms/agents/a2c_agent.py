@@ -2,6 +2,7 @@ import torch
 import numpy as np
 import copy
 
+from .agent import PreprocessedStateCache, acting_mode, single_precision
 from ..networks import CategoricalActorCriticNet, CategoricalActorCriticVAENet, GaussianActorCriticNet
 from ..networks import FCBody, LSTMBody, GRUBody, ConvolutionalBody, BetaVAEBody, resnet18Input64, ConvolutionalGruBody
 from ..networks import PreprocessFunction, ResizeCNNPreprocessFunction, ResizeCNNInterpolationFunction
@@ -18,6 +19,7 @@ class A2CAgent(object):
         self.training = True
         self.algorithm = algorithm
         self.state_preprocessing = self.algorithm.kwargs['state_preprocess']
+        self.preprocessed_state_cache = PreprocessedStateCache(self.state_preprocessing)
         self.handled_experiences = 0
         self.name = name
         self.save_path = None
@@ -25,6 +27,8 @@ class A2CAgent(object):
 
         self.nbr_actor = self.algorithm.nbr_actor
         self.previously_done_actors = [False]*self.nbr_actor
+        # Batches shrink as the actors' episodes end, unless the rl loop states otherwise (cf. `set_fixed_size_batches`):
+        self.fixed_size_batches = False
 
         self.use_rnd = self.algorithm.use_rnd
 
@@ -35,6 +39,9 @@ class A2CAgent(object):
             self.recurrent = True
             self._reset_rnn_states()
 
+    def get_update_count(self):
+        return self.algorithm.param_update_counter
+
     def get_intrinsic_reward(self, actor_idx):
         if len(self.algorithm.storages[actor_idx].int_r):
             #return self.algorithm.storages[actor_idx].int_r[-1] / (self.algorithm.int_reward_std+1e-8)
@@ -145,9 +152,9 @@ class A2CAgent(object):
                             cs[idx] = cs[idx].detach().cpu()
                         prediction[k][vk] = {'hidden': hs, 'cell': cs}
                 else:
-                    prediction[k] = v.detach().cpu()
+                    prediction[k] = single_precision(v.detach().cpu())
         else:
-            prediction = {k: v.detach().cpu() for k, v in prediction.items()}
+            prediction = {k: single_precision(v.detach().cpu()) for k, v in prediction.items()}
 
         return prediction
 
@@ -178,6 +185,10 @@ class A2CAgent(object):
         # We assume that this function has been called directly after take_action:
         # therefore the current prediction correspond to this experience.
 
+        # Batches either shrink as the actors' episodes end, or keep all the actors (fixed-size batches),
+        # in which case the actors that are already done are masked out of the storages:
+        fixed_size_batch = self.fixed_size_batches
+
         batch_index = -1
         done_actors_among_notdone = []
         for actor_index in range(self.nbr_actor):
@@ -185,7 +196,7 @@ class A2CAgent(object):
             if self.previously_done_actors[actor_index]:
                 continue
             # Otherwise, there is bookkeeping to do:
-            batch_index +=1
+            batch_index = actor_index if fixed_size_batch else batch_index+1
             
             # Bookkeeping of the actors whose episode just ended:
             if done[actor_index] and not(self.previously_done_actors[actor_index]):
@@ -215,7 +226,7 @@ class A2CAgent(object):
             self.previously_done_actors[actor_index] = done[actor_index]
             self.handled_experiences +=1
 
-        if len(done_actors_among_notdone):
+        if len(done_actors_among_notdone) and not fixed_size_batch:
             # Regularization of the agents' actors:
             done_actors_among_notdone.sort(reverse=True)
             for batch_idx in done_actors_among_notdone:
@@ -228,20 +239,20 @@ class A2CAgent(object):
 
     def preprocess_environment_signals(self, state, reward, succ_state, done):
         non_terminal = torch.from_numpy(1 - np.array(done)).type(torch.FloatTensor)
-        state = self.state_preprocessing(state, use_cuda=False)
-        succ_state = self.state_preprocessing(succ_state, use_cuda=False)
+        state, succ_state = self.preprocessed_state_cache.preprocess_experience(state, succ_state, use_cuda=False)
         if isinstance(reward, np.ndarray): r = torch.from_numpy(reward).type(torch.FloatTensor)
         else: r = torch.ones(1).type(torch.FloatTensor)*reward
         return state, r, succ_state, non_terminal
 
     def take_action(self, state):
-        state = self.state_preprocessing(state, use_cuda=self.algorithm.kwargs['use_cuda'])
+        state = self.preprocessed_state_cache(state, use_cuda=self.algorithm.kwargs['use_cuda'])
 
-        if self.recurrent:
-            self._pre_process_rnn_states()
-            self.current_prediction = self.algorithm.model(state, rnn_states=self.rnn_states)
-        else:
-            self.current_prediction = self.algorithm.model(state)
+        with acting_mode(self.training, self.algorithm.kwargs):
+            if self.recurrent:
+                self._pre_process_rnn_states()
+                self.current_prediction = self.algorithm.model(state, rnn_states=self.rnn_states)
+            else:
+                self.current_prediction = self.algorithm.model(state)
         self.current_prediction = self._post_process(self.current_prediction)
 
         return self.current_prediction['a'].numpy()
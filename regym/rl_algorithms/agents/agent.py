@@ -1,6 +1,9 @@
+import contextlib
 import torch
 import numpy as np 
 
+from ..algorithms.algorithm import reduced_precision_dtype
+
 
 def named_children(cm):
     for name, m in cm._modules.items():
@@ -18,6 +21,128 @@ def look_for_keys_and_apply(cm, keys, prefix='', accum=dict(), apply_fn=None, kw
             del accum[name]    
 
 
+def acting_mode(training, kwargs=None):
+    '''
+    :param training: Boolean specifying whether the acting agent trains.
+    :param kwargs: Dictionnary of hyperparameters of the acting agent's algorithm, whose 'mixed_precision'
+                   entry specifies whether to act in reduced precision (cf. `reduced_precision_dtype`).
+    :returns: context manager under which the acting models run, so that no graph is built when acting.
+              Agents that do not train act under `torch.inference_mode`, where available, whereas agents
+              that train act under `torch.no_grad`: their predictions (e.g. actions and rnn states) are
+              added to their storages, and inference tensors cannot take part in the gradient computations.
+              In reduced precision, the models also run under autocast.
+    '''
+    stack = contextlib.ExitStack()
+    if not(training) and hasattr(torch, 'inference_mode'): stack.enter_context(torch.inference_mode())
+    else: stack.enter_context(torch.no_grad())
+    dtype = reduced_precision_dtype(kwargs) if isinstance(kwargs, dict) else None
+    if dtype is not None:
+        stack.enter_context(torch.autocast(device_type='cuda' if kwargs.get('use_cuda', False) else 'cpu', dtype=dtype))
+    return stack
+
+
+def unwrap_agent(agent):
+    '''
+    :returns: the agent held by :param agent:, if it is an agent wrapper (e.g. DictHandlingAgentWrapper)
+              or a `PolicySnapshot`, otherwise :param agent: itself.
+    '''
+    while hasattr(agent, 'agent'): agent = agent.agent
+    return agent
+
+
+def set_fixed_size_batches(agent, fixed_size_batches):
+    '''
+    Informs :param agent: of the batches that the rl loop provides it with,
+    since they cannot be told apart from their size alone: a shrinking batch is still
+    full-size on the step when the first actors' episodes end.
+    :param fixed_size_batches: Boolean specifying whether the batches keep all the actors,
+                               even those whose episode is over, or whether they shrink
+                               as the episodes end.
+    '''
+    unwrap_agent(agent).fixed_size_batches = fixed_size_batches
+
+
+def single_precision(tensor):
+    # Predictions computed in reduced precision (cf. `acting_mode`) are handed over in single precision:
+    return tensor.float() if tensor.dtype in [torch.float16, torch.bfloat16] else tensor
+
+
+class PreprocessedStateCache(object):
+    '''
+    Hands over the preprocessed tensors of the observations between the steps of an agent,
+    so that an observation is only preprocessed once over its life: as the successor state `succ_s`
+    of a transition (cf. `preprocess_experience`), it is the next `take_action` input (cf. `__call__`),
+    and, as the `take_action` input, it is the state `s` of the transition that is handled next.
+
+    Raw states are identified by their id, but the tensors are only reused across those two hand-overs,
+    which the rl loops never separate by an environment step. The successor states are always preprocessed,
+    as they are the observations that the environment just provided. Therefore, environments that update
+    their observations in place, such that `s` and `succ_s` are the same object, are handled correctly:
+    `s` is the tensor preprocessed when acting upon it, before the step that updated it.
+    '''
+    def __init__(self, preprocess_function):
+        '''
+        :param preprocess_function: Function which preprocesses the states, 
+                                    with signature (state, use_cuda=False).
+        '''
+        self.preprocess_function = preprocess_function
+        # (raw, preprocessed) pairs of the last successor state handled, and of the last state acted upon.
+        # Raw states are kept alive while they are cached, so that their id cannot be reused by another object:
+        self.successor_entry = None
+        self.acting_entry = None
+
+    @staticmethod
+    def _lookup(entry, state, use_cuda):
+        if entry is None or entry[0] is not state: return None
+        preprocessed = entry[1]
+        if preprocessed.is_cuda != use_cuda:
+            preprocessed = preprocessed.cuda() if use_cuda else preprocessed.cpu()
+        return preprocessed
+
+    def __call__(self, state, use_cuda=False):
+        '''
+        Preprocesses a state to act upon (e.g. in `take_action`).
+        :param state: raw state, e.g. numpy.ndarray of shape batch x state_shape.
+        :param use_cuda: Boolean specifying whether the preprocessed state is expected on the GPU.
+        :returns: the preprocessed state, reused from the successor state of the last experience handled,
+                  if :param state: is that successor state.
+        '''
+        preprocessed = PreprocessedStateCache._lookup(self.successor_entry, state, use_cuda)
+        if preprocessed is None: preprocessed = self.preprocess_function(state, use_cuda=use_cuda)
+        # Successor states are only handed over once:
+        self.successor_entry = None
+        self.acting_entry = (state, preprocessed)
+        return preprocessed
+
+    def preprocess_experience(self, state, succ_state, use_cuda=False):
+        '''
+        Preprocesses the states of an experience (e.g. in `handle_experience`).
+        :param state: raw state, e.g. numpy.ndarray of shape batch x state_shape.
+        :param succ_state: raw successor state, e.g. numpy.ndarray of shape batch x state_shape.
+        :param use_cuda: Boolean specifying whether the preprocessed states are expected on the GPU.
+        :returns: the preprocessed state, reused from the last state acted upon if :param state: is that state,
+                  and the preprocessed successor state.
+        '''
+        preprocessed = PreprocessedStateCache._lookup(self.acting_entry, state, use_cuda)
+        if preprocessed is None: preprocessed = self.preprocess_function(state, use_cuda=use_cuda)
+        preprocessed_succ = self.preprocess_function(succ_state, use_cuda=use_cuda)
+        # The experience ends the step:
+        self.acting_entry = None
+        self.successor_entry = (succ_state, preprocessed_succ)
+        return preprocessed, preprocessed_succ
+
+    def clear(self):
+        self.successor_entry = None
+        self.acting_entry = None
+
+    def __getstate__(self):
+        # Cached states are not worth saving along with the agent:
+        state = self.__dict__.copy()
+        state['successor_entry'] = None
+        state['acting_entry'] = None
+        return state
+
+
 class Agent(object):
     def __init__(self, name, algorithm):
         self.name = name
@@ -29,6 +154,7 @@ class Agent(object):
 
         self.training = True
         self.state_preprocessing = self.algorithm.kwargs['state_preprocess']
+        self.preprocessed_state_cache = PreprocessedStateCache(self.state_preprocessing)
         
         self.goal_oriented = self.algorithm.kwargs['goal_oriented'] if 'goal_oriented' in self.algorithm.kwargs else False
         self.goals = None 
@@ -39,6 +165,8 @@ class Agent(object):
 
         self.nbr_actor = self.algorithm.get_nbr_actor()
         self.previously_done_actors = [False]*self.nbr_actor
+        # Batches shrink as the actors' episodes end, unless the rl loop states otherwise (cf. `set_fixed_size_batches`):
+        self.fixed_size_batches = False
 
         self.recurrent = False
         self.rnn_states = None
@@ -62,7 +190,10 @@ class Agent(object):
         '''
         In case of a multi-actor process, this function is called to reset
         the actors' internal values.
+        :param indices: indices of the actors to reset (default: all of them).
+        :param init: Boolean specifying whether all the actors are (re)initialized.
         '''
+        reset_all = indices is None or init
         if indices is None: indices = range(self.nbr_actor)
         
         if init:
@@ -71,7 +202,17 @@ class Agent(object):
             for idx in indices: self.previously_done_actors[idx] = False
 
         if self.recurrent:
-            _, self.rnn_states = self._reset_rnn_states(self.algorithm, self.nbr_actor)
+            if reset_all or self.rnn_states is None or Agent._rnn_states_batch_size(self.rnn_states) != self.nbr_actor:
+                _, self.rnn_states = self._reset_rnn_states(self.algorithm, self.nbr_actor)
+            else:
+                # Only the given actors' states are reset, with a done-mask:
+                mask = torch.ones(self.nbr_actor, 1)
+                mask[list(indices)] = 0.0
+                masks = dict()
+                def reset_fn(t):
+                    if t.device not in masks: masks[t.device] = mask.to(t.device)
+                    return t*masks[t.device]
+                self.rnn_states = Agent._apply_to_rnn_states(self.rnn_states, reset_fn)
 
     def update_actors(self, batch_idx):
         '''
@@ -116,54 +257,52 @@ class Agent(object):
         return rnn_keys, rnn_states
         
 
-    def remove_from_rnn_states(self, batch_idx, rnn_states_dict=None):
+    @staticmethod
+    def _apply_to_rnn_states(rnn_states_dict: dict, fn):
+        '''
+        :returns: a new dictionnary of rnn states, whose tensors are those of :param rnn_states_dict: mapped through :param fn:.
+                  Rnn states are never modified in place, since the predictions refer to them.
+        '''
+        out_rnn_states = dict()
+        for recurrent_submodule_name, states in rnn_states_dict.items():
+            if 'hidden' in states:
+                out_rnn_states[recurrent_submodule_name] = {key: [fn(t) for t in tensors] for key, tensors in states.items()}
+            else:
+                out_rnn_states[recurrent_submodule_name] = Agent._apply_to_rnn_states(states, fn)
+        return out_rnn_states
+
+    @staticmethod
+    def _rnn_states_batch_size(rnn_states_dict: dict):
+        for states in rnn_states_dict.values():
+            if 'hidden' in states: return states['hidden'][0].size(0)
+            batch_size = Agent._rnn_states_batch_size(states)
+            if batch_size is not None: return batch_size
+        return None
+
+    def remove_from_rnn_states(self, batch_idx):
         '''
         Remove a row(=batch) of data from the rnn_states.
         :param batch_idx: index on the batch dimension that specifies which row to remove.
         '''
-        if rnn_states_dict is None: rnn_states_dict = self.rnn_states
-        for recurrent_submodule_name in rnn_states_dict:
-            if 'hidden' not in rnn_states_dict[recurrent_submodule_name]:
-                self.remove_from_rnn_states(batch_idx=batch_idx, rnn_states_dict=rnn_states_dict[recurrent_submodule_name])
-            else:
-                for idx in range(len(rnn_states_dict[recurrent_submodule_name]['hidden'])):
-                    rnn_states_dict[recurrent_submodule_name]['hidden'][idx] = torch.cat(
-                        [rnn_states_dict[recurrent_submodule_name]['hidden'][idx][:batch_idx,...], 
-                         rnn_states_dict[recurrent_submodule_name]['hidden'][idx][batch_idx+1:,...]],
-                         dim=0)
-                    rnn_states_dict[recurrent_submodule_name]['cell'][idx] = torch.cat(
-                        [rnn_states_dict[recurrent_submodule_name]['cell'][idx][:batch_idx,...], 
-                         rnn_states_dict[recurrent_submodule_name]['cell'][idx][batch_idx+1:,...]],
-                         dim=0)
+        self.rnn_states = Agent._apply_to_rnn_states(self.rnn_states, lambda t: torch.cat([t[:batch_idx,...], t[batch_idx+1:,...]], dim=0))
         
-    def _pre_process_rnn_states(self, rnn_states_dict=None):
-        if rnn_states_dict is None: 
-            if self.rnn_states is None: 
-                _, self.rnn_states = self._reset_rnn_states(self.algorithm, self.nbr_actor)
-            rnn_states_dict = self.rnn_states
+    def _pre_process_rnn_states(self):
+        if self.rnn_states is None: 
+            _, self.rnn_states = self._reset_rnn_states(self.algorithm, self.nbr_actor)
 
+        # The rnn states are kept on the model's device between steps, 
+        # thus this only moves the states that were just (re)set on the CPU, if any:
         if self.algorithm.kwargs['use_cuda']:
-            for recurrent_submodule_name in rnn_states_dict:
-                if 'hidden' not in rnn_states_dict[recurrent_submodule_name]:
-                    self._pre_process_rnn_states(rnn_states_dict=rnn_states_dict[recurrent_submodule_name])                
-                else:
-                    for idx in range(len(rnn_states_dict[recurrent_submodule_name]['hidden'])):
-                        rnn_states_dict[recurrent_submodule_name]['hidden'][idx] = rnn_states_dict[recurrent_submodule_name]['hidden'][idx].cuda()
-                        rnn_states_dict[recurrent_submodule_name]['cell'][idx]   = rnn_states_dict[recurrent_submodule_name]['cell'][idx].cuda()
-
-    @staticmethod
-    def _post_process_rnn_states(next_rnn_states_dict: dict, rnn_states_dict: dict):
-        for recurrent_submodule_name in rnn_states_dict:
-            if 'hidden' not in rnn_states_dict[recurrent_submodule_name]:
-                Agent._post_process_rnn_states(next_rnn_states_dict=next_rnn_states_dict[recurrent_submodule_name],
-                                              rnn_states_dict=rnn_states_dict[recurrent_submodule_name])                
-            else:
-                for idx in range(len(rnn_states_dict[recurrent_submodule_name]['hidden'])):
-                    rnn_states_dict[recurrent_submodule_name]['hidden'][idx] = next_rnn_states_dict[recurrent_submodule_name]['hidden'][idx].cpu()
-                    rnn_states_dict[recurrent_submodule_name]['cell'][idx]   = next_rnn_states_dict[recurrent_submodule_name]['cell'][idx].cpu()
+            self.rnn_states = Agent._apply_to_rnn_states(self.rnn_states, lambda t: t if t.is_cuda else t.cuda())
 
-                    next_rnn_states_dict[recurrent_submodule_name]['hidden'][idx] = next_rnn_states_dict[recurrent_submodule_name]['hidden'][idx].detach().cpu()
-                    next_rnn_states_dict[recurrent_submodule_name]['cell'][idx] = next_rnn_states_dict[recurrent_submodule_name]['cell'][idx].detach().cpu()
+    def _post_process_rnn_states(self, prediction: dict):
+        # The next rnn states become the current ones, on the model's device:
+        self.rnn_states = Agent._apply_to_rnn_states(prediction['next_rnn_states'], lambda t: t.detach())
+        
+        # Storages are only provided with CPU copies when training:
+        if self.training:
+            prediction['rnn_states'] = Agent._apply_to_rnn_states(prediction['rnn_states'], lambda t: t.detach().cpu())
+            prediction['next_rnn_states'] = Agent._apply_to_rnn_states(prediction['next_rnn_states'], lambda t: t.detach().cpu())
     
     @staticmethod
     def _extract_from_rnn_states(rnn_states_batched: dict, batch_idx: int):
@@ -180,14 +319,13 @@ class Agent(object):
 
     def _post_process(self, prediction):
         if self.recurrent:
-            Agent._post_process_rnn_states(next_rnn_states_dict=prediction['next_rnn_states'],
-                                           rnn_states_dict=self.rnn_states)
+            self._post_process_rnn_states(prediction)
 
             for k, v in prediction.items():
                 if isinstance(v, torch.Tensor):
-                    prediction[k] = v.detach().cpu()
+                    prediction[k] = single_precision(v.detach().cpu())
         else:
-            prediction = {k: v.detach().cpu() for k, v in prediction.items()}
+            prediction = {k: single_precision(v.detach().cpu()) for k, v in prediction.items()}
 
         return prediction
 
@@ -218,8 +356,7 @@ class Agent(object):
 
     def preprocess_environment_signals(self, state, reward, succ_state, done):
         non_terminal = torch.from_numpy(1 - np.array(done)).type(torch.FloatTensor)
-        state = self.state_preprocessing(state, use_cuda=False)
-        succ_state = self.state_preprocessing(succ_state, use_cuda=False)
+        state, succ_state = self.preprocessed_state_cache.preprocess_experience(state, succ_state, use_cuda=False)
         if isinstance(reward, np.ndarray): r = torch.from_numpy(reward).type(torch.FloatTensor)
         else: r = torch.ones(1).type(torch.FloatTensor)*reward
         return state, r, succ_state, non_terminal
@@ -242,6 +379,23 @@ class Agent(object):
     def take_action(self, state):
         raise NotImplementedError
 
+    def get_acting_model(self):
+        '''
+        :returns: the model that `take_action` runs on the preprocessed states.
+        '''
+        return self.algorithm.model
+
+    def act_from_prediction(self, prediction):
+        '''
+        Completes `take_action` from the raw prediction of the acting model,
+        whether it was computed by `take_action`, or elsewhere (e.g. batched with 
+        other policies' predictions, cf. `batched_take_action`).
+        :param prediction: Dictionnary of the outputs of the acting model.
+        :returns: numpy.ndarray of actions.
+        '''
+        self.current_prediction = self._post_process(prediction)
+        return self.current_prediction['a'].numpy()
+
     def clone(self, training=None):
         raise NotImplementedError
 
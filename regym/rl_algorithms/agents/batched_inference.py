@@ -0,0 +1,121 @@
+import copy
+import logging
+import torch
+
+try:
+    from torch.func import functional_call, stack_module_state, vmap
+except ImportError:
+    # Versions of torch without torch.func: the policies act one after the other.
+    vmap = None
+
+from .policy_snapshot import PolicySnapshot
+
+logger = logging.getLogger(__name__)
+
+
+# Stacked parameters of the groups of models, that are reused as long as the models are not updated:
+_STACKED_MODELS_CACHE = dict()
+_STACKED_MODELS_CACHE_CAPACITY = 16
+# Architectures of the models whose forward pass could not be vectorized, which then act one after the other:
+_UNBATCHABLE_ARCHITECTURES = set()
+
+
+def _batchable_agent(agent):
+    '''
+    :returns: the agent acting on behalf of :param agent: if its acting model can be batched
+              with other policies' models, otherwise None.
+              Only inference-only agents (`PolicySnapshot`s) whose policy is neither recurrent nor goal-oriented are batched.
+    '''
+    if not isinstance(agent, PolicySnapshot): return None
+    acting_agent = agent.agent
+    if hasattr(acting_agent, 'agent') or not hasattr(acting_agent, 'act_from_prediction'): return None
+    if getattr(acting_agent, 'recurrent', False) or getattr(acting_agent, 'goal_oriented', False): return None
+    return acting_agent
+
+
+def _architecture_key(model):
+    return (type(model), tuple((name, tuple(t.shape), t.dtype, t.device) for name, t in model.state_dict().items()))
+
+
+def _snapshot_architecture_key(snapshot):
+    # Computed once per snapshot, since the snapshots' models are only ever updated in place:
+    if snapshot.architecture_key is None:
+        snapshot.architecture_key = _architecture_key(snapshot.agent.get_acting_model())
+    return snapshot.architecture_key
+
+
+def _stack_models(models):
+    versions = [t._version for model in models for t in list(model.parameters())+list(model.buffers())]
+    key = tuple(id(model) for model in models)
+    entry = _STACKED_MODELS_CACHE.get(key, None)
+    # The cached models are kept alive, so that their ids cannot be reused by other models:
+    if entry is not None and all(m is model for m, model in zip(entry['models'], models)) and entry['versions'] == versions:
+        return entry['params'], entry['buffers'], entry['base_model']
+
+    params, buffers = stack_module_state(models)
+    base_model = copy.deepcopy(models[0]).to('meta')
+    if len(_STACKED_MODELS_CACHE) >= _STACKED_MODELS_CACHE_CAPACITY: _STACKED_MODELS_CACHE.clear()
+    _STACKED_MODELS_CACHE[key] = {'models': models, 'versions': versions, 'params': params, 'buffers': buffers, 'base_model': base_model}
+    return params, buffers, base_model
+
+
+def _batched_predictions(agents, states):
+    '''
+    :param agents: list of agents whose acting models share an architecture.
+    :param states: list of the agents' states, of the same shape.
+    :returns: list of the agents' predictions, computed in one vectorized forward pass,
+              or None if the states cannot be batched.
+    :raises: any exception raised while vectorizing the forward pass of the models.
+    '''
+    preprocessed_states = [agent.preprocessed_state_cache(state, use_cuda=agent.algorithm.kwargs['use_cuda'])
+                           for agent, state in zip(agents, states)]
+    if any(s.shape != preprocessed_states[0].shape for s in preprocessed_states): return None
+
+    params, buffers, base_model = _stack_models([agent.get_acting_model() for agent in agents])
+    def forward(params, buffers, state):
+        return functional_call(base_model, (params, buffers), (state,))
+    # No graph is built, as when the policies act one after the other (cf. `acting_mode`),
+    # but `torch.inference_mode` is not relied upon, since not all versions of `torch.func` support it:
+    with torch.no_grad():
+        predictions = vmap(forward, randomness='different')(params, buffers, torch.stack(preprocessed_states, dim=0))
+    return [{key: value[idx] for key, value in predictions.items()} for idx in range(len(agents))]
+
+
+def batched_take_action(agents, states):
+    '''
+    Equivalent of `[agent.take_action(state) for agent, state in zip(agents, states)]`, where
+    the inference-only agents (cf. `PolicySnapshot`) whose acting models share an architecture
+    are evaluated in one vectorized forward pass, with their parameters stacked (cf. `torch.func`).
+    The other agents act one after the other, as do all the agents if `torch.func` is not available,
+    and those whose models' forward pass cannot be vectorized (the failure is logged once per architecture).
+
+    :param agents: list of agents.
+    :param states: list of the agents' states.
+    :returns: list of the agents' actions.
+    '''
+    actions = [None]*len(agents)
+
+    groups = dict()
+    if vmap is not None:
+        for idx, agent in enumerate(agents):
+            acting_agent = _batchable_agent(agent)
+            if acting_agent is None: continue
+            agent.prepare_to_act()
+            groups.setdefault(_snapshot_architecture_key(agent), []).append(idx)
+
+    for key, indices in groups.items():
+        if len(indices) < 2 or key in _UNBATCHABLE_ARCHITECTURES: continue
+        try:
+            predictions = _batched_predictions([agents[idx].agent for idx in indices], [states[idx] for idx in indices])
+        except Exception as e:
+            # e.g. models that modify their buffers in place (noisy layers), or outputs that are not tensors:
+            _UNBATCHABLE_ARCHITECTURES.add(key)
+            logger.warning(f'Policies of architecture {key[0].__name__} act one after the other, since their forward pass cannot be vectorized: {e}')
+            continue
+        if predictions is None: continue
+        for idx, prediction in zip(indices, predictions):
+            actions[idx] = agents[idx].agent.act_from_prediction(prediction)
+
+    for idx, agent in enumerate(agents):
+        if actions[idx] is None: actions[idx] = agent.take_action(states[idx])
+    return actions
@@ -19,7 +19,7 @@ import torch.nn.functional as F
 import numpy as np
 from functools import partial
 
-from .agent import Agent
+from .agent import Agent, acting_mode
 from .wrappers import DictHandlingAgentWrapper
 from gym.spaces import Dict
 from ..algorithms.wrappers import HERAlgorithmWrapper
@@ -77,6 +77,10 @@ class DQNAgent(Agent):
         # We assume that this function has been called directly after take_action:
         # therefore the current prediction correspond to this experience.
 
+        # Batches either shrink as the actors' episodes end, or keep all the actors (fixed-size batches),
+        # in which case the actors that are already done are masked out of the storages:
+        fixed_size_batch = self.fixed_size_batches
+
         batch_index = -1
         done_actors_among_notdone = []
         for actor_index in range(self.nbr_actor):
@@ -84,7 +88,7 @@ class DQNAgent(Agent):
             if self.previously_done_actors[actor_index]:
                 continue
             # Otherwise, there is bookkeeping to do:
-            batch_index +=1
+            batch_index = actor_index if fixed_size_batch else batch_index+1
             
             # Bookkeeping of the actors whose episode just ended:
             if done[actor_index] and not(self.previously_done_actors[actor_index]):
@@ -119,19 +123,26 @@ class DQNAgent(Agent):
             self.previously_done_actors[actor_index] = done[actor_index]
             self.handled_experiences +=1
 
-        if len(done_actors_among_notdone):
+        if len(done_actors_among_notdone) and not fixed_size_batch:
             # Regularization of the agents' actors:
             done_actors_among_notdone.sort(reverse=True)
             for batch_idx in done_actors_among_notdone:
                 self.update_actors(batch_idx=batch_idx)
-        
 
+        self.train_on_replay_period(nbr_episode_ends=len(done_actors_among_notdone))
+
+    def train_on_replay_period(self, nbr_episode_ends=0):
+        '''
+        Counts a batch of experience of all the actors towards the replay period (or the episode cycle),
+        and trains the algorithm whenever the period is over.
+        :param nbr_episode_ends: number of episodes that ended within the batch.
+        '''
         self.replay_period_count += 1
         period_check = self.replay_period
         period_count_check = self.replay_period_count
         if self.nbr_episode_per_cycle is not None:
-            if len(done_actors_among_notdone):
-                self.nbr_episode_per_cycle_count += len(done_actors_among_notdone)
+            if nbr_episode_ends:
+                self.nbr_episode_per_cycle_count += nbr_episode_ends
             period_check = self.nbr_episode_per_cycle
             period_count_check = self.nbr_episode_per_cycle_count
 
@@ -146,33 +157,41 @@ class DQNAgent(Agent):
             if self.save_path is not None and self.handled_experiences % self.saving_interval == 0: 
                 self.save()
         
+    def get_acting_model(self):
+        model = self.algorithm.get_models()['model']
+        if 'use_target_to_gather_data' in self.kwargs and self.kwargs['use_target_to_gather_data']:  
+            model = self.algorithm.get_models()['target_model'] 
+        return model
+
     def take_action(self, state):
         if self.training:
             self.nbr_steps += state.shape[0]
-        self.eps = self.algorithm.get_epsilon(nbr_steps=self.nbr_steps, strategy=self.epsdecay_strategy)
 
-        state = self.state_preprocessing(state, use_cuda=self.algorithm.kwargs['use_cuda'])
+        state = self.preprocessed_state_cache(state, use_cuda=self.algorithm.kwargs['use_cuda'])
         goal = None
         if self.goal_oriented:
             goal = self.goal_preprocessing(self.goals, use_cuda=self.algorithm.kwargs['use_cuda'])
 
-        model = self.algorithm.get_models()['model']
-        if 'use_target_to_gather_data' in self.kwargs and self.kwargs['use_target_to_gather_data']:  
-            model = self.algorithm.get_models()['target_model'] 
+        model = self.get_acting_model()
+        with acting_mode(self.training, self.algorithm.kwargs):
+            if self.recurrent:
+                self._pre_process_rnn_states()
+                prediction = model(state, rnn_states=self.rnn_states, goal=goal)
+            else:
+                prediction = model(state, goal=goal)
+        return self.act_from_prediction(prediction)
 
-        if self.recurrent:
-            self._pre_process_rnn_states()
-            self.current_prediction = model(state, rnn_states=self.rnn_states, goal=goal)
-        else:
-            self.current_prediction = model(state, goal=goal)
-        self.current_prediction = self._post_process(self.current_prediction)
+    def act_from_prediction(self, prediction):
+        self.eps = self.algorithm.get_epsilon(nbr_steps=self.nbr_steps, strategy=self.epsdecay_strategy)
+        self.current_prediction = self._post_process(prediction)
 
         sample = np.random.random()
         if self.noisy or sample > self.eps:
             return self.current_prediction['a'].numpy()
         else:
-            random_actions = [random.randrange(model.action_dim) for _ in range(state.shape[0])]
-            random_actions = np.reshape(np.array(random_actions), (state.shape[0],1))
+            batch_size = self.current_prediction['a'].shape[0]
+            random_actions = [random.randrange(self.get_acting_model().action_dim) for _ in range(batch_size)]
+            random_actions = np.reshape(np.array(random_actions), (batch_size,1))
             return random_actions
 
     def clone(self, training=None):
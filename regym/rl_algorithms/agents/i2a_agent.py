@@ -6,6 +6,7 @@ import torch.nn.functional as F
 from functools import partial
 
 from regym.rl_algorithms.networks import ResizeCNNPreprocessFunction
+from regym.rl_algorithms.agents.agent import PreprocessedStateCache, acting_mode
 from regym.rl_algorithms.algorithms.I2A import I2AAlgorithm, ImaginationCore, EnvironmentModel, AutoEncoderEnvironmentModel, RolloutEncoder, I2AModel
 from regym.rl_algorithms.networks import CategoricalActorCriticNet, FCBody, LSTMBody, ConvolutionalBody, choose_architecture
 
@@ -33,6 +34,7 @@ class I2AAgent():
         self.training = True
         self.use_cuda = use_cuda
         self.preprocess_function = preprocess_function
+        self.preprocessed_state_cache = PreprocessedStateCache(self.preprocess_function)
 
         self.handled_experiences = 0
         self.save_path = None 
@@ -233,8 +235,7 @@ class I2AAgent():
         :returns: preprocessed state, reward, successor_state and done input paramters
         '''
         non_terminal = torch.from_numpy(1 - np.array(done)).type(torch.FloatTensor)
-        s = self.preprocess_function(state, use_cuda=False)
-        succ_s = self.preprocess_function(succ_state, use_cuda=False)
+        s, succ_s = self.preprocessed_state_cache.preprocess_experience(state, succ_state, use_cuda=False)
         if succ_s.dtype != torch.float32 or s.dtype != torch.float32: raise 
         if isinstance(reward, np.ndarray): r = torch.from_numpy(reward).type(torch.FloatTensor)
         else: r = torch.ones(1).type(torch.FloatTensor)*reward
@@ -286,14 +287,15 @@ class I2AAgent():
         '''
 
     def take_action(self, state: np.ndarray) -> np.ndarray:
-        preprocessed_state = self.preprocess_function(state, use_cuda=self.use_cuda)
+        preprocessed_state = self.preprocessed_state_cache(state, use_cuda=self.use_cuda)
         # The I2A model will take care of its own rnn state:
-        self.current_prediction = self.algorithm.take_action(preprocessed_state)
+        self.current_prediction = self._make_prediction(preprocessed_state)
         self.current_prediction = self._post_process(self.current_prediction)
         return self.current_prediction['a'].numpy()
 
     def _make_prediction(self, preprocessed_state: torch.Tensor) -> Dict[str, object]:
-        prediction = self.algorithm.take_action(preprocessed_state)
+        with acting_mode(self.training):
+            prediction = self.algorithm.take_action(preprocessed_state)
         return prediction
 
     def clone(self, training: bool = None):
@@ -0,0 +1,219 @@
+import copy
+import numpy as np
+import torch
+
+from ..algorithms.algorithm import get_named_models, load_model_state_dicts
+from ..networks.export import export_acting_model
+from .agent import acting_mode, unwrap_agent
+
+
+# Attributes of the algorithms that are only needed to learn:
+TRAINING_ONLY_ATTRIBUTES = ['summary_writer', 'episode_buffer', 'n_step_buffer']
+# Models of the algorithms that are only needed to learn (e.g. RND and THER's predictor):
+TRAINING_ONLY_MODELS = ['target_model', 'target_intr_model', 'predict_intr_model', 'predictor']
+# Counters of the agents, that snapshots carry along with the weights (e.g. for epsilon-greedy policies):
+SNAPSHOT_COUNTERS = ['handled_experiences', 'episode_count', 'nbr_steps']
+
+
+def _algorithms(algorithm):
+    '''
+    :returns: list of :param algorithm: and of the algorithms it holds (e.g. wrapped algorithms).
+    '''
+    algorithms = [algorithm]
+    for value in vars(algorithm).values():
+        if 'Algorithm' in type(value).__name__:
+            algorithms += _algorithms(value)
+    return algorithms
+
+
+def _training_only_objects(algorithm):
+    '''
+    :returns: list of the objects held by :param algorithm:, and by the algorithms it holds,
+              that are only needed to learn: storages, optimizers, summary writers and
+              the models that are not used to act.
+    '''
+    objects = []
+    for algo in _algorithms(algorithm):
+        use_target_to_act = algo.kwargs.get('use_target_to_gather_data', False) if isinstance(getattr(algo, 'kwargs', None), dict) else False
+        for name, value in vars(algo).items():
+            if name.endswith('storages') or name in TRAINING_ONLY_ATTRIBUTES \
+               or isinstance(value, torch.optim.Optimizer) \
+               or (name in TRAINING_ONLY_MODELS and not(name == 'target_model' and use_target_to_act)):
+                objects.append(value)
+    return objects
+
+
+def _acting_models(algorithm):
+    return [value for algo in _algorithms(algorithm) for value in vars(algo).values() if isinstance(value, torch.nn.Module)]
+
+
+def get_acting_model_state_dicts(agent):
+    '''
+    :returns: Dictionnary of CPU copies of the state_dicts of the models that :param agent: acts with,
+              i.e. those that its `PolicySnapshot`s hold, as provided by `get_model_state_dicts`.
+              They are thus lighter to send to the processes holding snapshots of :param agent:.
+    '''
+    algorithm = unwrap_agent(agent).algorithm
+    training_only_ids = {id(obj) for obj in _training_only_objects(algorithm)}
+    return {name: {key: value.detach().cpu().clone() for key, value in model.state_dict().items()}
+            for name, model in get_named_models(algorithm).items() if id(model) not in training_only_ids}
+
+
+class PolicySnapshot(object):
+    '''
+    Inference-only snapshot of an agent, that can act but never trains.
+    Unlike `agent.clone(training=False)`, it does not copy what the agent only needs to learn:
+    neither the storages, nor the optimizers, nor the models that are not used to act (e.g. DQN's target model).
+    It is thus cheap to create, to hold in a menagerie, and to send to other processes.
+
+    The snapshot relies on the agent's own acting logic (preprocessing, epsilon-greedy, goals, rnn states),
+    on a copy of the agent whose algorithm only holds the acting models.
+    The other attributes are looked up on that copy.
+    '''
+    def __init__(self, agent, half_precision=False, export=None):
+        '''
+        :param agent: Agent, or agent wrapper, to snapshot.
+        :param half_precision: Boolean specifying whether to hold the weights in half precision,
+                               while the snapshot is idle (e.g. in a menagerie). They are cast back
+                               to single precision upon the first action.
+        :param export: Boolean specifying whether to act with the traced acting-only module
+                       of the acting model (cf. `export_acting_model`), when it can be exported.
+                       Defaults to the 'export_acting_model' entry of the agent's config, if any.
+        '''
+        if isinstance(agent, PolicySnapshot): agent = agent.agent
+        if export is None:
+            kwargs = getattr(unwrap_agent(agent).algorithm, 'kwargs', None)
+            export = kwargs.get('export_acting_model', False) if isinstance(kwargs, dict) else False
+        # The training-only objects are replaced by None in the copy:
+        memo = {id(obj): None for obj in _training_only_objects(unwrap_agent(agent).algorithm) if obj is not None}
+        self.agent = copy.deepcopy(agent, memo)
+        unwrap_agent(self.agent).training = False
+        if hasattr(self.agent, 'training'): self.agent.training = False
+
+        self.name = agent.name
+        # Agent wrappers preprocess the states themselves, recurrent and goal-oriented policies act on more than states:
+        if hasattr(self.agent, 'agent') or not hasattr(self.agent, 'get_acting_model') \
+           or getattr(self.agent, 'recurrent', False) or getattr(self.agent, 'goal_oriented', False):
+            export = False
+        self.export = export
+        # Traced upon the first action, on the first states (cf. `_exported_model`):
+        self.exported_model = None
+        # Architecture of the acting model, computed upon the first batched action (cf. `batched_take_action`):
+        self.architecture_key = None
+        self.half_precision = half_precision
+        self.acting_precision = not(half_precision)
+        if self.half_precision:
+            for model in _acting_models(unwrap_agent(self.agent).algorithm): model.half()
+
+    def __getattr__(self, name):
+        # Only called when the attribute is not found on the snapshot itself:
+        if name == 'agent': raise AttributeError(name)
+        return getattr(self.agent, name)
+
+    @property
+    def training(self):
+        return False
+
+    def update(self, state_dicts, counters={}):
+        '''
+        Loads new weights, and counters, into the snapshot.
+        :param state_dicts: Dictionnary of state_dicts, as provided by `get_model_state_dicts`.
+                            Those of the models that the snapshot does not hold are ignored.
+        :param counters: Dictionnary of counters of the agent (e.g. 'nbr_steps' for epsilon-greedy policies).
+        '''
+        load_model_state_dicts(unwrap_agent(self.agent).algorithm, state_dicts)
+        for counter, value in counters.items():
+            setattr(unwrap_agent(self.agent), counter, value)
+
+    def prepare_to_act(self):
+        # Weights held in half precision are cast back to single precision:
+        if not(self.acting_precision):
+            for model in _acting_models(unwrap_agent(self.agent).algorithm): model.float()
+            self.acting_precision = True
+
+    def __getstate__(self):
+        # Traced modules cannot be pickled, they are exported anew upon the next action,
+        # and the models may be loaded on another device:
+        state = dict(self.__dict__)
+        state['exported_model'] = None
+        state['architecture_key'] = None
+        return state
+
+    def _exported_model(self, state):
+        '''
+        :returns: the exported acting model, traced on the preprocessed :param state: if not yet exported,
+                  or None if the policy cannot be exported, in which case the snapshot acts
+                  with the agent's own acting logic from then on.
+        '''
+        if self.exported_model is None:
+            self.exported_model = export_acting_model(self.agent.get_acting_model(), state)
+            if self.exported_model is None: self.export = False
+        return self.exported_model
+
+    def take_action(self, state):
+        self.prepare_to_act()
+        if self.export:
+            agent = self.agent
+            preprocessed_state = agent.preprocessed_state_cache(state, use_cuda=agent.algorithm.kwargs['use_cuda'])
+            exported_model = self._exported_model(preprocessed_state)
+            if exported_model is not None:
+                with acting_mode(training=False):
+                    prediction = exported_model(preprocessed_state)
+                return agent.act_from_prediction(prediction)
+        return self.agent.take_action(state)
+
+    def handle_experience(self, s, a, r, succ_s, done, goals=None, infos=None):
+        '''
+        Nothing is stored, nor learned, but the bookkeeping of the actors goes on,
+        since batches shrink as the actors' episodes end (unless they are fixed-size, cf. `set_fixed_size_batches`).
+        '''
+        agent = unwrap_agent(self.agent)
+        # Single-environment loops provide a single done flag, and some agents have no actors to keep track of:
+        if not isinstance(done, (list, tuple, np.ndarray)) or not hasattr(agent, 'previously_done_actors'):
+            return
+        fixed_size_batch = getattr(agent, 'fixed_size_batches', False)
+
+        batch_index = -1
+        done_actors_among_notdone = []
+        for actor_index in range(agent.nbr_actor):
+            if agent.previously_done_actors[actor_index]:
+                continue
+            batch_index = actor_index if fixed_size_batch else batch_index+1
+            if done[actor_index]:
+                done_actors_among_notdone.append(batch_index)
+            agent.previously_done_actors[actor_index] = done[actor_index]
+
+        if len(done_actors_among_notdone) and not fixed_size_batch:
+            done_actors_among_notdone.sort(reverse=True)
+            for batch_idx in done_actors_among_notdone:
+                agent.update_actors(batch_idx=batch_idx)
+
+    def get_intrinsic_reward(self, actor_idx):
+        # Intrinsic rewards are only computed when learning:
+        return 0.0
+
+    def set_nbr_actor(self, nbr_actor):
+        # Unlike agents, there are no storages to reset:
+        agent = unwrap_agent(self.agent)
+        if nbr_actor != agent.nbr_actor:
+            agent.nbr_actor = nbr_actor
+            agent.reset_actors(init=True)
+
+    def clone(self, training=None):
+        '''
+        :param training: unused, since snapshots never train.
+        :returns: a new snapshot of the same policy.
+        '''
+        return PolicySnapshot(self.agent, half_precision=self.half_precision and not(self.acting_precision), export=self.export)
+
+
+def snapshot_policy(agent):
+    '''
+    :param agent: Agent, or agent wrapper, whose current policy is to be frozen (e.g. to be added to a menagerie).
+    :returns: PolicySnapshot of :param agent:, if its algorithm holds acting models,
+              otherwise (e.g. tabular or fixed-strategy agents) a clone of :param agent: that does not train.
+    '''
+    algorithm = getattr(unwrap_agent(agent), 'algorithm', None)
+    if algorithm is None or not len(_acting_models(algorithm)):
+        return agent.clone(training=False)
+    return PolicySnapshot(agent)
@@ -2,7 +2,7 @@ import torch
 import numpy as np
 import copy
 
-from .agent import Agent
+from .agent import Agent, acting_mode
 from ..networks import CategoricalActorCriticNet, CategoricalActorCriticVAENet, GaussianActorCriticNet
 from ..networks import FCBody, LSTMBody, GRUBody, ConvolutionalBody, BetaVAEBody, resnet18Input64, ConvolutionalGruBody
 from ..networks import PreprocessFunction, ResizeCNNPreprocessFunction, ResizeCNNInterpolationFunction
@@ -49,6 +49,10 @@ class PPOAgent(Agent):
         # We assume that this function has been called directly after take_action:
         # therefore the current prediction correspond to this experience.
 
+        # Batches either shrink as the actors' episodes end, or keep all the actors (fixed-size batches),
+        # in which case the actors that are already done are masked out of the storages:
+        fixed_size_batch = self.fixed_size_batches
+
         batch_index = -1
         done_actors_among_notdone = []
         for actor_index in range(self.nbr_actor):
@@ -56,7 +60,7 @@ class PPOAgent(Agent):
             if self.previously_done_actors[actor_index]:
                 continue
             # Otherwise, there is bookkeeping to do:
-            batch_index +=1
+            batch_index = actor_index if fixed_size_batch else batch_index+1
             
             # Bookkeeping of the actors whose episode just ended:
             if done[actor_index] and not(self.previously_done_actors[actor_index]):
@@ -86,7 +90,7 @@ class PPOAgent(Agent):
             self.previously_done_actors[actor_index] = done[actor_index]
             self.handled_experiences +=1
 
-        if len(done_actors_among_notdone):
+        if len(done_actors_among_notdone) and not fixed_size_batch:
             # Regularization of the agents' actors:
             done_actors_among_notdone.sort(reverse=True)
             for batch_idx in done_actors_among_notdone:
@@ -98,16 +102,15 @@ class PPOAgent(Agent):
             if self.save_path is not None: torch.save(self, self.save_path)
 
     def take_action(self, state):
-        state = self.state_preprocessing(state, use_cuda=self.algorithm.kwargs['use_cuda'])
-
-        if self.recurrent:
-            self._pre_process_rnn_states()
-            self.current_prediction = self.algorithm.model(state, rnn_states=self.rnn_states)
-        else:
-            self.current_prediction = self.algorithm.model(state)
-        self.current_prediction = self._post_process(self.current_prediction)
+        state = self.preprocessed_state_cache(state, use_cuda=self.algorithm.kwargs['use_cuda'])
 
-        return self.current_prediction['a'].numpy()
+        with acting_mode(self.training, self.algorithm.kwargs):
+            if self.recurrent:
+                self._pre_process_rnn_states()
+                prediction = self.algorithm.model(state, rnn_states=self.rnn_states)
+            else:
+                prediction = self.algorithm.model(state)
+        return self.act_from_prediction(prediction)
 
     def clone(self, training=None):
         clone = PPOAgent(name=self.name, algorithm=copy.deepcopy(self.algorithm))
@@ -77,6 +77,9 @@ class DictHandlingAgentWrapper(AgentWrapper):
         self.use_achieved_goal = use_achieved_goal
 
     def _build_obs_dict(self, s):
+        # Environments batch dictionnary observations key-wise already:
+        if isinstance(s, dict): return s
+
         obs_dict = {}
         for lidx in range(s.shape[0]):
             d = s[lidx]
@@ -7,6 +7,8 @@ import torch.nn.functional as F
 
 from ...networks import random_sample
 from ...replay_buffers import Storage
+from ..algorithm import MixedPrecision
+from ..vtrace import compute_vtrace_advantages_and_returns
 from . import a2c_loss
 
 summary_writer = None 
@@ -22,6 +24,7 @@ class A2CAlgorithm():
         discount: (0,1) Reward discount factor
         use_gae: Flag, wether to use Generalized Advantage Estimation (GAE) (instead of return base estimation)
         gae_tau: (0,1) GAE hyperparameter.
+        use_vtrace: Flag, whether to compute V-trace returns and advantages instead, for experience that lags behind the policy (default: False).
         use_cuda: Flag, to specify whether to use CUDA tensors in Pytorch calculations
         entropy_weight: (0,1) Coefficient for (regularatization) entropy based loss
         gradient_clip: float, Clips gradients to reduce the chance of destructive updates
@@ -84,6 +87,8 @@ class A2CAlgorithm():
         else: self.optimizer = optimizer
         print(f"Optimizer: {self.optimizer}")
 
+        self.mixed_precision = MixedPrecision(self.kwargs)
+
         self.recurrent = False
         # TECHNICAL DEBT: check for recurrent property by looking at the modules in the model rather than relying on the kwargs that may contain
         # elements that do not concern the model trained by this algorithm, given that it is now use-able inside I2A...
@@ -122,7 +127,11 @@ class A2CAlgorithm():
         for idx, storage in enumerate(self.storages): 
             if len(storage) <= 1: continue
             storage.placeholder()
-            self.compute_advantages_and_returns(storage_idx=idx)
+            if 'use_vtrace' in self.kwargs and self.kwargs['use_vtrace']:
+                # The experience lags behind the policy (cf. `gather_experience_actor_learner`):
+                compute_vtrace_advantages_and_returns(self, storage_idx=idx)
+            else:
+                self.compute_advantages_and_returns(storage_idx=idx)
             if self.use_rnd: 
                 self.compute_int_advantages_and_int_returns(storage_idx=idx, non_episodic=self.kwargs['rnd_non_episodic_int_r'])
         
@@ -440,21 +449,23 @@ class A2CAlgorithm():
                 states_std = self.obs_std.cuda() if self.kwargs['use_cuda'] else self.obs_std
 
             self.optimizer.zero_grad()
-            loss = a2c_loss.compute_loss(sampled_states, 
-                                         sampled_actions, 
-                                         sampled_returns, 
-                                         sampled_advantages, 
-                                         rnn_states=sampled_rnn_states,
-                                         entropy_weight=self.kwargs['entropy_weight'],
-                                         value_weight=self.kwargs['value_weight'],
-                                         model=self.model,
-                                         iteration_count=self.param_update_counter,
-                                         summary_writer=summary_writer)
-
-            loss.backward(retain_graph=False)
+            with self.mixed_precision.autocast():
+                loss = a2c_loss.compute_loss(sampled_states, 
+                                             sampled_actions, 
+                                             sampled_returns, 
+                                             sampled_advantages, 
+                                             rnn_states=sampled_rnn_states,
+                                             entropy_weight=self.kwargs['entropy_weight'],
+                                             value_weight=self.kwargs['value_weight'],
+                                             model=self.model,
+                                             iteration_count=self.param_update_counter,
+                                             summary_writer=summary_writer)
+
+            self.mixed_precision.backward(loss)
             if self.kwargs['gradient_clip'] > 1e-3:
+                self.mixed_precision.unscale_(self.optimizer)
                 nn.utils.clip_grad_norm_(self.model.parameters(), self.kwargs['gradient_clip'], norm_type=float('inf'))
-            self.optimizer.step()
+            self.mixed_precision.step(self.optimizer)
 
             if summary_writer is not None:
                 self.param_update_counter += 1 
@@ -9,9 +9,10 @@ import torch.nn.functional as F
 
 from . import dqn_loss, ddqn_loss
 
-from ..algorithm import Algorithm
+from ..algorithm import Algorithm, MixedPrecision
 from ...replay_buffers import ReplayBuffer, PrioritizedReplayBuffer, EXP, EXPPER
 from ...replay_buffers import PrioritizedReplayStorage, ReplayStorage
+from ...replay_buffers import compress, decompress, OBSERVATION_KEYS
 from ...networks import hard_update, random_sample
 
 
@@ -68,6 +69,8 @@ class DQNAlgorithm(Algorithm):
             self.optimizer = optim.Adam(parameters, lr=lr, betas=(0.9,0.999), eps=kwargs['adam_eps'])
         else: self.optimizer = optimizer
 
+        self.mixed_precision = MixedPrecision(self.kwargs)
+
         self.loss_fn = loss_fn
         print(f"WARNING: loss_fn is {self.loss_fn}")
             
@@ -168,6 +171,10 @@ class DQNAlgorithm(Algorithm):
         if self.goal_oriented and 'g' not in exp_dict:
             exp_dict['g'] = exp_dict['goals']['desired_goals']['s']
 
+        if self.mixed_precision.dtype is not None:
+            # Observations are stored in reduced precision, wherever that is lossless (cf. `compress`):
+            current_exp_dict = {k: compress(v) if k in OBSERVATION_KEYS else v for k, v in current_exp_dict.items()}
+
         if self.use_PER:
             init_sampling_priority = None 
             self.storages[actor_index].add(current_exp_dict, priority=init_sampling_priority)
@@ -223,7 +230,7 @@ class DQNAlgorithm(Algorithm):
                 if isinstance(value[0], dict):   
                     value = Algorithm._concatenate_hdict(value.pop(0), value, map_keys=['hidden', 'cell'])
                 else:
-                    value = torch.cat(value, dim=0)
+                    value = torch.cat([decompress(v) for v in value], dim=0)
                 values[key] = value 
 
             for key, value in values.items():
@@ -289,31 +296,33 @@ class DQNAlgorithm(Algorithm):
             
             self.optimizer.zero_grad()
             
-            loss, loss_per_item = self.loss_fn(sampled_states, 
-                                          sampled_actions, 
-                                          sampled_next_states,
-                                          sampled_rewards,
-                                          sampled_non_terminals,
-                                          rnn_states=sampled_rnn_states,
-                                          goals=sampled_goals,
-                                          gamma=self.GAMMA,
-                                          model=self.model,
-                                          target_model=self.target_model,
-                                          weights_decay_lambda=self.weights_decay_lambda,
-                                          use_PER=self.use_PER,
-                                          PER_beta=beta,
-                                          importanceSamplingWeights=sampled_importanceSamplingWeights,
-                                          HER_target_clamping=self.kwargs['HER_target_clamping'],
-                                          iteration_count=self.param_update_counter,
-                                          summary_writer=summary_writer)
+            with self.mixed_precision.autocast():
+                loss, loss_per_item = self.loss_fn(sampled_states, 
+                                              sampled_actions, 
+                                              sampled_next_states,
+                                              sampled_rewards,
+                                              sampled_non_terminals,
+                                              rnn_states=sampled_rnn_states,
+                                              goals=sampled_goals,
+                                              gamma=self.GAMMA,
+                                              model=self.model,
+                                              target_model=self.target_model,
+                                              weights_decay_lambda=self.weights_decay_lambda,
+                                              use_PER=self.use_PER,
+                                              PER_beta=beta,
+                                              importanceSamplingWeights=sampled_importanceSamplingWeights,
+                                              HER_target_clamping=self.kwargs['HER_target_clamping'],
+                                              iteration_count=self.param_update_counter,
+                                              summary_writer=summary_writer)
             
-            loss.backward(retain_graph=False)
+            self.mixed_precision.backward(loss)
             if self.kwargs['gradient_clip'] > 1e-3:
+                self.mixed_precision.unscale_(self.optimizer)
                 nn.utils.clip_grad_norm_(self.model.parameters(), self.kwargs['gradient_clip'])
-            self.optimizer.step()
+            self.mixed_precision.step(self.optimizer)
 
             if self.use_PER:
-                sampled_losses_per_item.append(loss_per_item)
+                sampled_losses_per_item.append(loss_per_item.float())
 
             if summary_writer is not None:
                 self.param_update_counter += 1 
@@ -9,9 +9,10 @@ import torch.nn.functional as F
 
 from . import dqn_ther_loss, ddqn_ther_loss
 
-from ..algorithm import Algorithm
+from ..algorithm import Algorithm, MixedPrecision
 from ...replay_buffers import ReplayBuffer, PrioritizedReplayBuffer, EXP, EXPPER
 from ...replay_buffers import PrioritizedReplayStorage, ReplayStorage
+from ...replay_buffers import compress, decompress, OBSERVATION_KEYS
 from ...networks import hard_update, random_sample
 
 
@@ -69,6 +70,8 @@ class THERAlgorithm(Algorithm):
             self.optimizer = optim.Adam(parameters, lr=lr, betas=(0.9,0.999), eps=kwargs['adam_eps'])
         else: self.optimizer = optimizer
 
+        self.mixed_precision = MixedPrecision(self.kwargs)
+
         self.recurrent = False
         # TECHNICAL DEBT: check for recurrent property by looking at the modules in the model rather than relying on the kwargs that may contain
         # elements that do not concern the model trained by this algorithm, given that it is now use-able inside I2A...
@@ -165,6 +168,10 @@ class THERAlgorithm(Algorithm):
         if self.goal_oriented and 'g' not in exp_dict:
             exp_dict['g'] = exp_dict['goals']['desired_goals']['s']
 
+        if self.mixed_precision.dtype is not None:
+            # Observations are stored in reduced precision, wherever that is lossless (cf. `compress`):
+            current_exp_dict = {k: compress(v) if k in OBSERVATION_KEYS else v for k, v in current_exp_dict.items()}
+
         if self.use_PER:
             init_sampling_priority = None 
             self.storages[actor_index].add(current_exp_dict, priority=init_sampling_priority)
@@ -217,7 +224,7 @@ class THERAlgorithm(Algorithm):
             
             values = {}
             for key, value in zip(keys, sample):
-                value = torch.cat(value.tolist(), dim=0)
+                value = torch.cat([decompress(v) for v in value.tolist()], dim=0)
                 values[key] = value 
 
             for key, value in values.items():
@@ -282,53 +289,55 @@ class THERAlgorithm(Algorithm):
             sampled_non_terminals = non_terminals[batch_indices].cuda() if self.kwargs['use_cuda'] else non_terminals[batch_indices]
             
             self.optimizer.zero_grad()
-            if self.double or self.dueling:
-                loss, loss_per_item = ddqn_ther_loss.compute_loss(sampled_states, 
-                                              sampled_actions, 
-                                              sampled_next_states,
-                                              sampled_rewards,
-                                              sampled_non_terminals,
-                                              rnn_states=sampled_rnn_states,
-                                              goals=sampled_goals,
-                                              gamma=self.GAMMA,
-                                              model=self.model,
-                                              predictor=self.predictor,
-                                              target_model=self.target_model,
-                                              weights_decay_lambda=self.weights_decay_lambda,
-                                              use_PER=self.use_PER,
-                                              PER_beta=beta,
-                                              importanceSamplingWeights=sampled_importanceSamplingWeights,
-                                              use_HER=self.use_HER,
-                                              iteration_count=self.param_update_counter,
-                                              summary_writer=summary_writer)
-            else:
-                loss, loss_per_item = dqn_ther_loss.compute_loss(sampled_states, 
-                                              sampled_actions, 
-                                              sampled_next_states,
-                                              sampled_rewards,
-                                              sampled_non_terminals,
-                                              rnn_states=sampled_rnn_states,
-                                              goals=sampled_goals,
-                                              gamma=self.GAMMA,
-                                              model=self.model,
-                                              predictor=self.predictor,
-                                              target_model=self.target_model,
-                                              weights_decay_lambda=self.weights_decay_lambda,
-                                              use_PER=self.use_PER,
-                                              PER_beta=beta,
-                                              importanceSamplingWeights=sampled_importanceSamplingWeights,
-                                              use_HER=self.use_HER,
-                                              iteration_count=self.param_update_counter,
-                                              summary_writer=summary_writer)
-
-            loss.backward(retain_graph=False)
+            with self.mixed_precision.autocast():
+                if self.double or self.dueling:
+                    loss, loss_per_item = ddqn_ther_loss.compute_loss(sampled_states, 
+                                                  sampled_actions, 
+                                                  sampled_next_states,
+                                                  sampled_rewards,
+                                                  sampled_non_terminals,
+                                                  rnn_states=sampled_rnn_states,
+                                                  goals=sampled_goals,
+                                                  gamma=self.GAMMA,
+                                                  model=self.model,
+                                                  predictor=self.predictor,
+                                                  target_model=self.target_model,
+                                                  weights_decay_lambda=self.weights_decay_lambda,
+                                                  use_PER=self.use_PER,
+                                                  PER_beta=beta,
+                                                  importanceSamplingWeights=sampled_importanceSamplingWeights,
+                                                  use_HER=self.use_HER,
+                                                  iteration_count=self.param_update_counter,
+                                                  summary_writer=summary_writer)
+                else:
+                    loss, loss_per_item = dqn_ther_loss.compute_loss(sampled_states, 
+                                                  sampled_actions, 
+                                                  sampled_next_states,
+                                                  sampled_rewards,
+                                                  sampled_non_terminals,
+                                                  rnn_states=sampled_rnn_states,
+                                                  goals=sampled_goals,
+                                                  gamma=self.GAMMA,
+                                                  model=self.model,
+                                                  predictor=self.predictor,
+                                                  target_model=self.target_model,
+                                                  weights_decay_lambda=self.weights_decay_lambda,
+                                                  use_PER=self.use_PER,
+                                                  PER_beta=beta,
+                                                  importanceSamplingWeights=sampled_importanceSamplingWeights,
+                                                  use_HER=self.use_HER,
+                                                  iteration_count=self.param_update_counter,
+                                                  summary_writer=summary_writer)
+
+            self.mixed_precision.backward(loss)
             if self.kwargs['gradient_clip'] > 1e-3:
+                self.mixed_precision.unscale_(self.optimizer)
                 nn.utils.clip_grad_norm_(self.model.parameters(), self.kwargs['gradient_clip'])
                 nn.utils.clip_grad_norm_(self.predictor.parameters(), self.kwargs['gradient_clip'])
-            self.optimizer.step()
+            self.mixed_precision.step(self.optimizer)
 
             if self.use_PER:
-                sampled_losses_per_item.append(loss_per_item)
+                sampled_losses_per_item.append(loss_per_item.float())
 
             if summary_writer is not None:
                 self.param_update_counter += 1 
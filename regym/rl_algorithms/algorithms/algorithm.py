@@ -1,5 +1,61 @@
 import torch
 import copy
+import contextlib
+
+
+def reduced_precision_dtype(kwargs):
+    '''
+    :param kwargs: Dictionnary of hyperparameters, whose 'mixed_precision' entry is either False (default),
+                   True, 'bfloat16' or 'float16'.
+    :returns: torch.dtype in which to act and to compute the losses, or None for single precision.
+              True stands for float16 on CUDA devices, and for bfloat16 on CPU, which is also used
+              when float16 is requested on CPU, since autocasting to float16 is not available there.
+    '''
+    mixed_precision = kwargs.get('mixed_precision', False)
+    if not(mixed_precision) or not hasattr(torch, 'autocast'): return None
+    use_cuda = kwargs.get('use_cuda', False)
+    if mixed_precision == 'float16' or (mixed_precision is True and use_cuda):
+        return torch.float16 if use_cuda else torch.bfloat16
+    return torch.bfloat16
+
+
+class MixedPrecision(object):
+    '''
+    Mixed-precision training: the losses are computed under autocast, in the dtype given by
+    `reduced_precision_dtype`, while the weights and the optimizers' states remain in single precision.
+    float16 gradients are liable to underflow, thus the losses are then scaled (cf. `GradScaler`),
+    whereas bfloat16 shares the range of float32 and needs no scaling.
+    Without reduced precision, every method falls back to the usual single-precision step.
+    '''
+    def __init__(self, kwargs):
+        self.dtype = reduced_precision_dtype(kwargs)
+        self.device_type = 'cuda' if kwargs.get('use_cuda', False) else 'cpu'
+        self.scaler = None
+        if self.dtype == torch.float16:
+            try:
+                self.scaler = torch.amp.GradScaler('cuda')
+            except (AttributeError, TypeError):
+                self.scaler = torch.cuda.amp.GradScaler()
+
+    def autocast(self):
+        if self.dtype is None: return contextlib.nullcontext()
+        return torch.autocast(device_type=self.device_type, dtype=self.dtype)
+
+    def backward(self, loss):
+        if self.scaler is not None: loss = self.scaler.scale(loss)
+        loss.backward(retain_graph=False)
+
+    def unscale_(self, optimizer):
+        # The gradients are to be unscaled before being clipped:
+        if self.scaler is not None: self.scaler.unscale_(optimizer)
+
+    def step(self, optimizer):
+        if self.scaler is None:
+            optimizer.step()
+        else:
+            # The step is skipped if the gradients overflowed, and the scale is updated accordingly:
+            self.scaler.step(optimizer)
+            self.scaler.update()
 
 
 class Algorithm(object):
@@ -51,4 +107,36 @@ class Algorithm(object):
         return out_hd
 
     def clone(self):
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+def get_named_models(algorithm, prefix=''):
+    '''
+    :param algorithm: algorithm, or algorithm wrapper (whose wrapped algorithm is `algorithm.algorithm`).
+    :returns: Dictionnary of the torch.nn.Module held by :param algorithm:, 
+              with the models of wrapped algorithms prefixed by 'algorithm.'.
+    '''
+    named_models = {prefix+name: value for name, value in vars(algorithm).items() if isinstance(value, torch.nn.Module)}
+    wrapped_algorithm = vars(algorithm).get('algorithm', None)
+    if wrapped_algorithm is not None and not isinstance(wrapped_algorithm, torch.nn.Module):
+        named_models.update(get_named_models(wrapped_algorithm, prefix=prefix+'algorithm.'))
+    return named_models
+
+
+def get_model_state_dicts(algorithm):
+    '''
+    :returns: Dictionnary of CPU copies of the state_dicts of the models held by :param algorithm:.
+              Being copies, they can be handed over to other processes while training goes on.
+    '''
+    return {name: {key: value.detach().cpu().clone() for key, value in model.state_dict().items()}
+            for name, model in get_named_models(algorithm).items()}
+
+
+def load_model_state_dicts(algorithm, state_dicts):
+    '''
+    Loads :param state_dicts:, as provided by `get_model_state_dicts`, into the models of :param algorithm:.
+    The state_dicts of the models that :param algorithm: does not hold (e.g. in a `PolicySnapshot`) are ignored.
+    '''
+    named_models = get_named_models(algorithm)
+    for name, state_dict in state_dicts.items():
+        if name not in named_models: continue
+        named_models[name].load_state_dict(state_dict)
@@ -0,0 +1,92 @@
+import torch
+
+
+def vtrace(behaviour_log_pi_a, target_log_pi_a, rewards, values, bootstrap_value, non_terminals, discount, rho_bar=1.0, c_bar=1.0):
+    '''
+    V-trace off-policy correction (cf. IMPALA: https://arxiv.org/abs/1802.01561),
+    over a trajectory of T consecutive steps of one actor, gathered with a behaviour policy
+    that lags behind the target policy being learned.
+    Episode boundaries within the trajectory are handled with :param non_terminals:.
+    :param behaviour_log_pi_a: torch.Tensor of shape T x 1, log-probabilities of the actions under the behaviour policy.
+    :param target_log_pi_a: torch.Tensor of shape T x 1, log-probabilities of the actions under the target policy.
+    :param rewards: torch.Tensor of shape T x 1.
+    :param values: torch.Tensor of shape T x 1, values of the states under the target policy's critic.
+    :param bootstrap_value: torch.Tensor of shape 1 x 1, value of the successor state of the last step
+                            (zero if the last step ended an episode).
+    :param non_terminals: torch.Tensor of shape T x 1, 0.0 on the steps that ended an episode, 1.0 otherwise.
+    :param discount: Float, discount factor.
+    :param rho_bar: Float, truncation of the importance weights of the temporal differences.
+    :param c_bar: Float, truncation of the importance weights of the traces.
+    :returns: the V-trace targets v_s, and the policy gradient advantages, as torch.Tensor of shape T x 1.
+    '''
+    behaviour_log_pi_a, target_log_pi_a, rewards, values, non_terminals = [t.detach().float().view(-1, 1) for t in [behaviour_log_pi_a, target_log_pi_a, rewards, values, non_terminals]]
+    bootstrap_value = bootstrap_value.detach().float().view(1, 1)
+
+    ratios = torch.exp(target_log_pi_a - behaviour_log_pi_a)
+    rhos = ratios.clamp(max=rho_bar)
+    cs = ratios.clamp(max=c_bar)
+
+    next_values = torch.cat([values[1:], bootstrap_value], dim=0)
+    deltas = rhos * (rewards + discount * non_terminals * next_values - values)
+
+    # v_s - V(x_s) = delta_s + discount * c_s * (v_{s+1} - V(x_{s+1})):
+    vs_minus_values = torch.zeros_like(values)
+    acc = torch.zeros(1)
+    for t in reversed(range(values.size(0))):
+        acc = deltas[t] + discount * non_terminals[t] * cs[t] * acc
+        vs_minus_values[t] = acc
+    vs = vs_minus_values + values
+
+    next_vs = torch.cat([vs[1:], bootstrap_value], dim=0)
+    pg_advantages = rhos * (rewards + discount * non_terminals * next_vs - values)
+    return vs, pg_advantages
+
+
+def compute_vtrace_advantages_and_returns(algorithm, storage_idx):
+    '''
+    Replaces the computation of the returns and advantages of an on-policy actor-critic
+    algorithm (e.g. PPO, A2C) when its experience lags behind its policy (cf. `gather_experience_actor_learner`):
+    the returns are the V-trace targets, and the advantages are V-trace's policy gradient advantages,
+    both computed with the algorithm's current model. The behaviour log-probabilities remain in the storage,
+    thus PPO's clipped ratio is taken with respect to the behaviour policy.
+    :param algorithm: PPOAlgorithm or A2CAlgorithm, whose 'discount' hyperparameter is used, along
+                      with the optional 'vtrace_rho_bar' and 'vtrace_c_bar' (default: 1.0).
+    :param storage_idx: index of the storage (i.e. of the actor) whose trajectory is corrected.
+    '''
+    storage = algorithm.storages[storage_idx]
+    nbr_steps = len(storage.r)
+    states = torch.cat(storage.s[:nbr_steps], dim=0)
+    actions = torch.cat(storage.a[:nbr_steps], dim=0)
+    rnn_states = algorithm.reformat_rnn_states(storage.rnn_states[:nbr_steps]) if algorithm.recurrent else None
+    if algorithm.kwargs['use_cuda']:
+        states, actions = states.cuda(), actions.cuda()
+        if rnn_states is not None:
+            rnn_states = {k: {key: [t.cuda() for t in tensors] for key, tensors in states_dict.items()} for k, states_dict in rnn_states.items()}
+
+    with torch.no_grad():
+        prediction = algorithm.model(states, action=actions, rnn_states=rnn_states)
+        bootstrap_value = torch.zeros(1, 1)
+        if storage.non_terminal[nbr_steps-1]:
+            next_state = storage.succ_s[nbr_steps-1].cuda() if algorithm.kwargs['use_cuda'] else storage.succ_s[nbr_steps-1]
+            next_rnn_states = storage.next_rnn_states[nbr_steps-1] if algorithm.recurrent else None
+            if next_rnn_states is not None and algorithm.kwargs['use_cuda']:
+                next_rnn_states = {k: {key: [t.cuda() for t in tensors] for key, tensors in states_dict.items()} for k, states_dict in next_rnn_states.items()}
+            bootstrap_value = algorithm.model(next_state, rnn_states=next_rnn_states)['v'].cpu()
+
+    vs, pg_advantages = vtrace(behaviour_log_pi_a=torch.cat(storage.log_pi_a[:nbr_steps], dim=0),
+                               target_log_pi_a=prediction['log_pi_a'].cpu(),
+                               rewards=torch.cat([r.view(-1) for r in storage.r], dim=0),
+                               values=prediction['v'].cpu(),
+                               bootstrap_value=bootstrap_value,
+                               non_terminals=torch.cat([nt.view(-1) for nt in storage.non_terminal[:nbr_steps]], dim=0),
+                               discount=algorithm.kwargs['discount'],
+                               rho_bar=float(algorithm.kwargs['vtrace_rho_bar']) if 'vtrace_rho_bar' in algorithm.kwargs else 1.0,
+                               c_bar=float(algorithm.kwargs['vtrace_c_bar']) if 'vtrace_c_bar' in algorithm.kwargs else 1.0)
+
+    # Same layout as `compute_advantages_and_returns`: the N+1 spots hold the bootstrap value and dummy advantages,
+    # which are not used during optimization.
+    for i in range(nbr_steps):
+        storage.ret[i] = vs[i:i+1]
+        storage.adv[i] = pg_advantages[i:i+1]
+    storage.ret[nbr_steps] = bootstrap_value
+    storage.adv[nbr_steps] = torch.zeros(1, 1)
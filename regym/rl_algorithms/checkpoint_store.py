@@ -0,0 +1,192 @@
+import os
+import io
+import copy
+import json
+import hashlib
+import torch
+
+from .algorithms.algorithm import get_named_models
+from .agents.agent import unwrap_agent
+from .agents.policy_snapshot import _algorithms
+
+
+# Attributes of the agents that are specific to their current actors, which are not saved:
+ACTOR_STATE_ATTRIBUTES = ['current_prediction', 'rnn_states', 'goals']
+
+
+def _hash_tensor(tensor):
+    tensor = tensor.detach().cpu().contiguous()
+    h = hashlib.sha1(f'{tensor.dtype}{tuple(tensor.shape)}'.encode())
+    # NumPy has no bfloat16, but only the bytes matter:
+    if tensor.dtype == torch.bfloat16: tensor = tensor.view(torch.int16)
+    h.update(tensor.numpy().tobytes())
+    return h.hexdigest()
+
+
+def _save_atomically(obj, path):
+    # Saving atomically, in case of concurrent writers (e.g. several training processes):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _load_tensor(path):
+    try:
+        # Memory-mapped, the tensor is only read from disk when it is used:
+        return torch.load(path, mmap=True)
+    except TypeError:
+        # Versions of torch that do not support memory-mapping:
+        return torch.load(path)
+
+
+def _named_models(agent):
+    algorithm = getattr(agent, 'algorithm', None)
+    if algorithm is None: return {}
+    return get_named_models(algorithm)
+
+
+def _counter_holders(agent):
+    '''
+    :returns: list of :param agent:, of the agents it wraps (e.g. the agent of a `PolicySnapshot`),
+              and of the algorithms of the innermost one, in a deterministic order.
+    '''
+    holders = [agent]
+    while hasattr(holders[-1], 'agent'): holders.append(holders[-1].agent)
+    algorithm = getattr(holders[-1], 'algorithm', None)
+    if algorithm is not None: holders += _algorithms(algorithm)
+    return holders
+
+
+def _counters(agent):
+    '''
+    :returns: list of Dictionnaries of the numerical attributes (e.g. 'nbr_steps', or the algorithms' update counters)
+              of each of the holders of :param agent: (cf. `_counter_holders`).
+    '''
+    return [{name: value for name, value in vars(holder).items() if type(value) in [int, float]}
+            for holder in _counter_holders(agent)]
+
+
+class CheckpointStore(object):
+    '''
+    Stores the checkpoints of a menagerie, deduplicated by content:
+    - the tensors of the agents' models are saved one by one, under their content hash,
+      so that the tensors shared by several checkpoints (e.g. frozen layers, or agents that did
+      not train between two checkpoints) are only saved once,
+    - the rest of the agent, i.e. its skeleton, is saved without the models' tensors,
+      without the state of its current actors (e.g. rnn states), and without its counters
+      (e.g. 'nbr_steps'), under its content hash too, so that checkpoints of the same agent share their skeleton,
+    - the manifest, `manifest/`, holds one entry per checkpoint, which maps it to its skeleton and tensors,
+      and holds its counters. Each entry is written on its own, so that concurrent writers
+      (e.g. several training processes) do not overwrite each other's entries.
+
+    Skeletons are only small if the agents do not hold storages or optimizers:
+    agents ought to be stored as `PolicySnapshot`s.
+    '''
+    def __init__(self, path):
+        '''
+        :param path: path to the directory of the menagerie.
+        '''
+        self.path = path
+        self.manifest_path = os.path.join(self.path, 'manifest')
+        self.tensors_path = os.path.join(self.path, 'tensors')
+        self.skeletons_path = os.path.join(self.path, 'skeletons')
+
+    @staticmethod
+    def exists(path):
+        '''
+        :returns: Boolean stating whether there is a checkpoint store in directory :param path:.
+        '''
+        return os.path.isdir(os.path.join(path, 'manifest'))
+
+    def _entry_path(self, key):
+        # Keys are hashed, since they need not be valid file names:
+        return os.path.join(self.manifest_path, f"{hashlib.sha1(key.encode()).hexdigest()}.json")
+
+    def _read_entry(self, entry_path):
+        with open(entry_path, 'r') as f:
+            return json.load(f)
+
+    def _write_entry(self, key, entry):
+        entry_path = self._entry_path(key)
+        tmp_path = f'{entry_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f, indent=1)
+        os.replace(tmp_path, entry_path)
+
+    def keys(self):
+        if not os.path.isdir(self.manifest_path): return []
+        return [self._read_entry(os.path.join(self.manifest_path, f))['key'] 
+                for f in sorted(os.listdir(self.manifest_path)) if f.endswith('.json')]
+
+    def save(self, agent, key):
+        '''
+        :param agent: Agent to save.
+        :param key: String identifying the checkpoint within the menagerie (e.g. 'checkpoint_episode_10.pt').
+        '''
+        os.makedirs(self.tensors_path, exist_ok=True)
+        os.makedirs(self.skeletons_path, exist_ok=True)
+        os.makedirs(self.manifest_path, exist_ok=True)
+
+        entry = {'key': key, 'models': dict(), 'counters': _counters(agent)}
+        memo = dict()
+        # The state of the current actors is not saved, it is reset upon loading:
+        for holder in _counter_holders(agent):
+            for attr in ACTOR_STATE_ATTRIBUTES:
+                value = vars(holder).get(attr, None)
+                if value is not None: memo[id(value)] = None
+            if isinstance(vars(holder).get('previously_done_actors', None), list):
+                memo[id(holder.previously_done_actors)] = [False]*len(holder.previously_done_actors)
+        for model_name, model in _named_models(agent).items():
+            entry['models'][model_name] = dict()
+            for tensor_name, tensor in model.state_dict(keep_vars=True).items():
+                tensor_hash = _hash_tensor(tensor)
+                tensor_path = os.path.join(self.tensors_path, f'{tensor_hash}.pt')
+                if not os.path.exists(tensor_path):
+                    _save_atomically(tensor.detach().cpu().clone(), tensor_path)
+                entry['models'][model_name][tensor_name] = tensor_hash
+                # The skeleton holds empty tensors in place of the models' tensors:
+                placeholder = torch.empty(0, dtype=tensor.dtype)
+                if isinstance(tensor, torch.nn.Parameter):
+                    placeholder = torch.nn.Parameter(placeholder, requires_grad=tensor.requires_grad)
+                memo[id(tensor)] = placeholder
+
+        skeleton = copy.deepcopy(agent, memo)
+        # Counters are saved in the entry:
+        for holder, counters in zip(_counter_holders(skeleton), entry['counters']):
+            for name, value in counters.items(): setattr(holder, name, type(value)(0))
+        buffer = io.BytesIO()
+        torch.save(skeleton, buffer)
+        skeleton_hash = hashlib.sha1(buffer.getvalue()).hexdigest()
+        skeleton_path = os.path.join(self.skeletons_path, f'{skeleton_hash}.pt')
+        if not os.path.exists(skeleton_path):
+            _save_atomically(skeleton, skeleton_path)
+        entry['skeleton'] = skeleton_hash
+        self._write_entry(key, entry)
+
+    def load(self, key):
+        '''
+        :param key: String identifying the checkpoint within the menagerie.
+        :returns: the agent saved under :param key:, whose models' tensors are memory-mapped (when torch supports it).
+        '''
+        entry = self._read_entry(self._entry_path(key))
+        agent = torch.load(os.path.join(self.skeletons_path, f"{entry['skeleton']}.pt"))
+        for holder, counters in zip(_counter_holders(agent), entry['counters']):
+            for name, value in counters.items(): setattr(holder, name, value)
+
+        named_models = _named_models(agent)
+        for model_name, tensor_hashes in entry['models'].items():
+            modules = dict(named_models[model_name].named_modules())
+            for tensor_name, tensor_hash in tensor_hashes.items():
+                tensor = _load_tensor(os.path.join(self.tensors_path, f'{tensor_hash}.pt'))
+                module_name, _, name = tensor_name.rpartition('.')
+                module = modules[module_name]
+                if name in module._parameters:
+                    module._parameters[name] = torch.nn.Parameter(tensor, requires_grad=module._parameters[name].requires_grad)
+                else:
+                    module._buffers[name] = tensor
+
+        acting_agent = unwrap_agent(agent)
+        if hasattr(acting_agent, 'reset_actors') and hasattr(acting_agent, 'previously_done_actors'):
+            # e.g. the rnn states of the actors are initialized anew:
+            acting_agent.reset_actors(init=True)
+        return agent
@@ -5,6 +5,7 @@ from .bodies import ConvolutionalBody, BetaVAEBody, resnet18Input64, Convolution
 from .bodies import NoisyLinear
 from .heads import CategoricalActorCriticNet, CategoricalActorCriticVAENet, GaussianActorCriticNet
 from .heads import CategoricalQNet, InstructionPredictor
+from .export import export_acting_model
 
 import torch.nn.functional as F 
 
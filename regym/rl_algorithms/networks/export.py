@@ -0,0 +1,118 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from .heads import CategoricalQNet, CategoricalActorCriticNet, GaussianActorCriticNet
+
+
+class CategoricalQNetActing(nn.Module):
+    '''
+    Acting-only view of a CategoricalQNet: observation → greedy action.
+    It shares the parameters of the head, thus the updates of the head are reflected.
+    '''
+    prediction_keys = ('a', 'qa')
+
+    def __init__(self, head):
+        super(CategoricalQNetActing, self).__init__()
+        self.head = head
+
+    def forward(self, obs):
+        qa = self.head.fc_critic(self.head.critic_body(self.head.phi_body(obs)))
+        return qa.max(dim=-1)[1], qa
+
+
+class CategoricalActorCriticNetActing(nn.Module):
+    '''
+    Acting-only view of a CategoricalActorCriticNet: observation → sampled action, and value.
+    '''
+    prediction_keys = ('a', 'v')
+
+    def __init__(self, head):
+        super(CategoricalActorCriticNetActing, self).__init__()
+        self.network = head.network
+
+    def forward(self, obs):
+        phi = self.network.phi_body(obs)
+        logits = self.network.fc_action(self.network.actor_body(phi))
+        action = torch.multinomial(F.softmax(logits, dim=-1), num_samples=1).squeeze(1)
+        v = self.network.fc_critic(self.network.critic_body(phi))
+        return action, v
+
+
+class GaussianActorCriticNetActing(nn.Module):
+    '''
+    Acting-only view of a GaussianActorCriticNet: observation → sampled action, and value.
+    '''
+    prediction_keys = ('a', 'v')
+
+    def __init__(self, head):
+        super(GaussianActorCriticNetActing, self).__init__()
+        self.network = head.network
+        self.std = head.std
+
+    def forward(self, obs):
+        phi = self.network.phi_body(obs)
+        mean = torch.tanh(self.network.fc_action(self.network.actor_body(phi)))
+        action = mean + F.softplus(self.std)*torch.randn_like(mean)
+        v = self.network.fc_critic(self.network.critic_body(phi))
+        return action, v
+
+
+# Exact types only: subclasses (e.g. CategoricalActorCriticVAENet) compute their predictions differently.
+ACTING_MODULES = {CategoricalQNet: CategoricalQNetActing,
+                  CategoricalActorCriticNet: CategoricalActorCriticNetActing,
+                  GaussianActorCriticNet: GaussianActorCriticNetActing}
+
+
+def acting_module(model):
+    '''
+    :param model: head, as defined in `heads.py`.
+    :returns: acting-only module of :param model:, or None if it has none.
+              Goal-oriented and noisy Q-networks have none, since they depend on
+              the goals and on the noise sampled before each action.
+    '''
+    if type(model) not in ACTING_MODULES: return None
+    if getattr(model, 'goal_oriented', False) or getattr(model, 'noisy', False): return None
+    return ACTING_MODULES[type(model)](model)
+
+
+class ExportedActingModel(object):
+    '''
+    Callable that wraps the traced acting-only module of a head, and returns
+    its outputs as a prediction dictionnary, in place of the head's own prediction.
+    '''
+    def __init__(self, traced_module, prediction_keys):
+        self.traced_module = traced_module
+        self.prediction_keys = prediction_keys
+
+    def __call__(self, obs):
+        return dict(zip(self.prediction_keys, self.traced_module(obs)))
+
+
+def export_acting_model(model, example_obs, compile=False):
+    '''
+    Traces (cf. `torch.jit.trace`) the acting-only module of :param model:, which skips
+    the dictionnary building, the branching on rnn_states/goals, and the computation of
+    the entropy and log-likelihoods that are only needed to learn.
+    Recurrent bodies are not supported: the model's acting module must only take observations.
+
+    :param model: head, as defined in `heads.py`.
+    :param example_obs: torch.Tensor of preprocessed observations, on which the module is traced.
+    :param compile: Boolean specifying whether to further compile the traced module with `torch.compile`,
+                    where it is available.
+    :returns: ExportedActingModel, or None if :param model: has no acting module or if the export failed,
+              in which case the model is meant to be used as is.
+    '''
+    module = acting_module(model)
+    if module is None: return None
+    try:
+        with torch.no_grad():
+            # The actions are sampled: consecutive traces would differ.
+            traced_module = torch.jit.trace(module, example_obs, check_trace=False)
+            if compile and hasattr(torch, 'compile'):
+                traced_module = torch.compile(traced_module)
+                # Compilation is lazy, it fails upon the first call, if at all:
+                traced_module(example_obs)
+    except Exception:
+        return None
+    return ExportedActingModel(traced_module, module.prediction_keys)
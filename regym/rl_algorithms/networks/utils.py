@@ -95,12 +95,28 @@ def PreprocessFunction(x, use_cuda=False, normalization=True):
     else:
         return torch.from_numpy(x)
 
+def _bilinear_resize(x, size, antialias=False):
+    '''
+    Resizes a whole batch of images in one call.
+    :param x: torch.Tensor of shape (Batch, Channels, Height, Width).
+    :param size: tuple, (height,width) size.
+    :param antialias: Boolean, whether to smooth the images when downsampling (as PIL does).
+    '''
+    try:
+        return F.interpolate(x, size=size, mode='bilinear', align_corners=False, antialias=antialias)
+    except TypeError:
+        # Older PyTorch versions do not support antialiasing:
+        return F.interpolate(x, size=size, mode='bilinear', align_corners=False)
+
+
 def ResizeCNNPreprocessFunction(x, size, use_cuda=False, normalize_rgb_values=True):
     '''
     Used to resize, normalize and convert OpenAI Gym raw pixel observations,
     which are structured as numpy arrays of shape (Height, Width, Channels),
     into the equivalent Pytorch Convention of (Channels, Height, Width).
     Required for torch.nn.Modules which use a convolutional architechture.
+    The whole batch is resized at once, on the GPU if :param use_cuda: is True,
+    with the same (antialiased bilinear) filter as PIL.
 
     :param x: Numpy array to be processed
     :param size: int or tuple, (height,width) size
@@ -109,78 +125,58 @@ def ResizeCNNPreprocessFunction(x, size, use_cuda=False, normalize_rgb_values=Tr
                                  to interval (0-1)
     '''
     if isinstance(size, int): size = (size,size)
-    scaling_operation = T.Compose([T.ToPILImage(),
-                                    T.Resize(size=size)])
-    if len(x.shape) == 4:
-        #batch:
-        imgs = []
-        for i in range(x.shape[0]):
-            img = x[i]
-            # handled Stacked images...
-            per_image_first_channel_indices = range(0,img.shape[-1]+1,3)
-            img = np.concatenate( [ np.array(scaling_operation(img[...,idx_begin:idx_end])) for idx_begin, idx_end in zip(per_image_first_channel_indices,per_image_first_channel_indices[1:])], axis=-1)
-            img = torch.from_numpy(img.transpose((2, 0, 1))).unsqueeze(0)
-            imgs.append(img)
-        x = torch.cat(imgs, dim=0)
-    else:
-        x = scaling_operation(x)
-        x = np.array(x)
-        x = x.transpose((2, 0, 1))
-        x = torch.from_numpy(x).unsqueeze(0)
-    # WATCHOUT: it is necessary to cast the tensor into float before doing
-    # the division, otherwise the result is yielded as a uint8 (full of zeros...)
-    x = x.type(torch.FloatTensor) / 255. if normalize_rgb_values else x
-    if use_cuda:
-        return x.type(torch.cuda.FloatTensor)
-    return x.type(torch.FloatTensor)
+    x = torch.from_numpy(np.ascontiguousarray(x))
+    if len(x.shape) == 3: x = x.unsqueeze(0)
+    if use_cuda: x = x.cuda()
+    # batch x h x w x c --> batch x c x h x w:
+    x = x.permute(0, 3, 1, 2).float()
+    x = _bilinear_resize(x, size=size, antialias=True)
+    # Pixel values are rounded, as PIL does:
+    x = x.round().clamp(0, 255)
+    x = x / 255. if normalize_rgb_values else x
+    return x.contiguous()
 
 
-def ResizeCNNInterpolationFunction(x, size, use_cuda=False, normalize_rgb_values=True):
+def ResizeCNNInterpolationFunction(x, size, use_cuda=False, normalize_rgb_values=True, resize_on_device=False):
     '''
     Used to resize, normalize and convert OpenAI Gym raw pixel observations,
     which are structured as numpy arrays of shape (Height, Width, Channels),
     into the equivalent Pytorch Convention of (Channels, Height, Width).
     Required for torch.nn.Modules which use a convolutional architechture.
+    The whole batch is resized at once: either with a single cv2 call, or,
+    if :param resize_on_device: is True, with F.interpolate on the device.
 
     :param x: Numpy array to be processed
     :param size: int size (height==width)
     :param use_cuda: Boolean to determine whether to create Cuda Tensor
     :param normalize_rgb_values: Maps the 0-255 values of rgb colours
                                  to interval (0-1)
+    :param resize_on_device: Boolean to determine whether to resize the batch
+                             after moving it to the device.
     '''
-    x = np.array(x).astype(np.float32)
+    x = np.asarray(x, dtype=np.float32)
     
-    h,w = x.shape[1:3]
-    '''
-    osize = h
-    if h != w:
-        osize = max([h, w])
-        b = x.shape[0]
-        c = x.shape[3]
-        x_flat = x.reshape((-1, h, w))
-        xs = []
-        for idx in range(x_flat.shape[0]):
-            xs.append( cv2.resize(x_flat[idx], (osize, osize)).reshape((1, osize, osize)))
-        xs = np.concatenate(xs, axis=0)
-        x = xs.reshape((b, osize, osize, c))
-
-    scaling_factor = float(size)/osize
-    '''
-    b = x.shape[0]
-    c = x.shape[3]
-    x = x.transpose(0, 3, 1, 2)
-    # b x c x h x w 
-    if size is not None and size != h:
-        x_flat = x.reshape((-1, h, w))
-        xs = []
-        for idx in range(x_flat.shape[0]):
-            xs.append( cv2.resize(x_flat[idx], (size, size)).reshape((1, size, size)))
-        xs = np.concatenate(xs, axis=0)
-        x = xs.reshape((b, c, size, size))
-
-    x = torch.from_numpy(x)
+    b, h, w, c = x.shape
+    if size is not None and size != h and resize_on_device:
+        x = torch.from_numpy(x)
+        if use_cuda: x = x.cuda()
+        # b x c x h x w 
+        x = _bilinear_resize(x.permute(0, 3, 1, 2), size=(size, size))
+    elif size is not None and size != h:
+        # cv2 resizes each channel independently: the batch is thus
+        # resized in one call, as a single image of b*c channels (at most 512):
+        x_flat = x.transpose(1, 2, 0, 3).reshape((h, w, b*c))
+        max_channels = 512
+        xs = [ cv2.resize(np.ascontiguousarray(x_flat[..., idx:idx+max_channels]), (size, size)).reshape((size, size, -1)) 
+               for idx in range(0, b*c, max_channels)]
+        x = np.concatenate(xs, axis=-1) if len(xs) > 1 else xs[0]
+        # b x c x h x w 
+        x = torch.from_numpy(x.reshape((size, size, b, c)).transpose(2, 3, 0, 1))
+    else:
+        # b x c x h x w 
+        x = torch.from_numpy(x.transpose(0, 3, 1, 2))
+
     x = x / 255. if normalize_rgb_values else x
-    #x = F.interpolate(x, scale_factor=scaling_factor)
     if use_cuda:
         return x.type(torch.cuda.FloatTensor)
     return x.type(torch.FloatTensor)
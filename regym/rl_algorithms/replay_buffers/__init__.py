@@ -2,3 +2,4 @@ from .experience import EXP, EXPPER
 from .ReplayBuffer import ReplayBuffer, ReplayStorage, SplitReplayStorage
 from .PrioritizedReplayBuffer import PrioritizedReplayBuffer, PrioritizedReplayStorage, SplitPrioritizedReplayStorage
 from .storage import Storage
+from .compression import compress, decompress, OBSERVATION_KEYS
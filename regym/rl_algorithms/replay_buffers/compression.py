@@ -0,0 +1,50 @@
+import torch
+
+
+# Keys of the experiences that hold observations (states and goals):
+OBSERVATION_KEYS = ['s', 'g']
+
+# Divisors tried, in order, to represent floating-point tensors as uint8 tensors:
+# integer values (e.g. binary bits, or raw pixels), then normalized pixels (cf. `PreprocessFunction`).
+UINT8_DIVISORS = [1.0, 255.0]
+
+
+class CompressedTensor(object):
+    '''
+    uint8 representation of a floating-point tensor, whose values are `data/divisor`.
+    '''
+    __slots__ = ['data', 'divisor', 'dtype']
+
+    def __init__(self, data, divisor, dtype):
+        self.data = data
+        self.divisor = divisor
+        self.dtype = dtype
+
+    def decompress(self):
+        return self.data.to(self.dtype) / self.divisor
+
+
+def compress(tensor):
+    '''
+    :param tensor: torch.Tensor, e.g. a preprocessed observation.
+    :returns: CompressedTensor holding :param tensor: in a quarter (float32) or an eighth (float64)
+              of its memory, if that is lossless, i.e. if decompressing it yields :param tensor: exactly.
+              Otherwise, :param tensor: itself.
+    '''
+    if not isinstance(tensor, torch.Tensor) or not tensor.is_floating_point() or tensor.numel() == 0:
+        return tensor
+    for divisor in UINT8_DIVISORS:
+        data = (tensor*divisor).round()
+        # NaNs fail both comparisons, as well as the final check:
+        if not(data.min() >= 0 and data.max() <= 255): continue
+        compressed = CompressedTensor(data.to(torch.uint8), divisor, tensor.dtype)
+        if torch.equal(compressed.decompress(), tensor): return compressed
+    return tensor
+
+
+def decompress(value):
+    '''
+    :returns: the tensor that :param value: holds, if it is a CompressedTensor, otherwise :param value: itself.
+    '''
+    if isinstance(value, CompressedTensor): return value.decompress()
+    return value
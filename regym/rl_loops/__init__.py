@@ -1,2 +1,3 @@
 from . import singleagent_loops
 from . import multiagent_loops
+from .inference_server import InferenceServer, InferenceClient
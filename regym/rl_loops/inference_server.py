@@ -0,0 +1,208 @@
+import time
+import queue
+import numpy as np
+from torch.multiprocessing import Process, Queue, Value
+
+from regym.environments.utils import concatenate_batches
+from regym.rl_algorithms.agents.agent import unwrap_agent
+from regym.rl_algorithms.agents.policy_snapshot import PolicySnapshot, SNAPSHOT_COUNTERS, get_acting_model_state_dicts
+
+
+# Attributes of the acting agent that are specific to each client (its actors):
+ACTOR_STATE_ATTRIBUTES = ['nbr_actor', 'previously_done_actors', 'rnn_states', 'goals', 'fixed_size_batches']
+
+
+def _batch_size(states):
+    if isinstance(states, dict): return _batch_size(next(iter(states.values())))
+    return states.shape[0]
+
+
+def inference_server_worker(agent, request_queue, response_queues, max_batch_size, max_latency, heartbeat=None, heartbeat_interval=1.0):
+    '''
+    Serves the action requests of the clients, received through :param request_queue:, until None is received.
+    Requests are gathered until either :param max_batch_size: states are pending, or :param max_latency: seconds
+    elapsed since the first one. The states of non-recurrent policies are then acted upon in one batch.
+    Recurrent policies act upon each client's states separately, with the client's own rnn states,
+    which follow the client's actors as their episodes end (cf. `InferenceClient.handle_experience`).
+    :param agent: PolicySnapshot of the agent that acts.
+    :param response_queues: list of Queues, one per client, through which the actions are sent back.
+    :param heartbeat: shared Value stamped with the time at which the server was last seen alive, if any.
+    :param heartbeat_interval: Float, period (in seconds) of the heartbeat, while the server is idle.
+    '''
+    acting_agent = unwrap_agent(agent.agent)
+    actor_states = dict()
+    update_count = 0
+
+    def save_actor_state(client_id):
+        actor_states[client_id] = {attr: getattr(acting_agent, attr) for attr in ACTOR_STATE_ATTRIBUTES if hasattr(acting_agent, attr)}
+
+    def load_actor_state(client_id):
+        for attr, value in actor_states[client_id].items(): setattr(acting_agent, attr, value)
+
+    def reset_client_actors(client_id, nbr_actor, indices=None, init=False):
+        if client_id in actor_states: load_actor_state(client_id)
+        agent.set_nbr_actor(nbr_actor)
+        agent.reset_actors(indices=indices, init=init)
+        save_actor_state(client_id)
+
+    stop = False
+    while not stop:
+        if heartbeat is not None: heartbeat.value = time.time()
+        try:
+            requests = [request_queue.get(timeout=heartbeat_interval)]
+        except queue.Empty:
+            continue
+        deadline = time.time() + max_latency
+        nbr_pending_states = 0
+        while requests[-1] is not None and nbr_pending_states < max_batch_size:
+            client_id, command, payload = requests[-1]
+            if command == 'act': nbr_pending_states += _batch_size(payload)
+            timeout = deadline - time.time()
+            if timeout <= 0: break
+            try:
+                requests.append(request_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        if requests[-1] is None:
+            stop = True
+            requests.pop()
+
+        act_requests = []
+        for client_id, command, payload in requests:
+            if command == 'act':
+                act_requests.append((client_id, payload))
+            elif command == 'reset':
+                reset_client_actors(client_id, **payload)
+            elif command == 'done':
+                if client_id not in actor_states: continue
+                # Bookkeeping of the client's actors whose episode ended (e.g. removal of their rnn states):
+                load_actor_state(client_id)
+                acting_agent.fixed_size_batches = payload['fixed_size_batches']
+                agent.handle_experience(None, None, None, None, payload['done'])
+                save_actor_state(client_id)
+            elif command == 'update':
+                agent.update(state_dicts=payload['state_dicts'], counters=payload['counters'])
+                update_count = payload['update_count']
+        if not len(act_requests): continue
+
+        if acting_agent.recurrent:
+            for client_id, states in act_requests:
+                if client_id not in actor_states: reset_client_actors(client_id, nbr_actor=_batch_size(states), init=True)
+                load_actor_state(client_id)
+                actions = agent.take_action(states)
+                save_actor_state(client_id)
+                response_queues[client_id].put((actions, update_count))
+        else:
+            batch_sizes = [_batch_size(states) for _, states in act_requests]
+            actions = agent.take_action(concatenate_batches([states for _, states in act_requests]))
+            offsets = np.cumsum([0]+batch_sizes)
+            for (client_id, _), start, end in zip(act_requests, offsets[:-1], offsets[1:]):
+                response_queues[client_id].put((actions[start:end], update_count))
+
+
+class InferenceClient(object):
+    def __init__(self, client_id, name, request_queue, response_queue, recurrent=False, heartbeat=None, heartbeat_timeout=30.0):
+        '''
+        Stand-in for an inference-only agent, within any rollout loop (e.g. `test_agent`, or
+        as an opponent in the self-play loops), whose actions are computed by an `InferenceServer`.
+        The client holds no model: it sends its states to the server, and waits for the actions.
+        :param client_id: index of the client among the server's clients.
+        :param recurrent: Boolean specifying whether the served policy is recurrent, in which case
+                          the server is notified of the actors whose episode ends.
+        :param heartbeat: shared Value stamped by the server (cf. `inference_server_worker`), if any.
+        :param heartbeat_timeout: Float, duration (in seconds) without heartbeat after which the server
+                                  is deemed unresponsive, and waiting for actions raises a RuntimeError.
+        '''
+        self.client_id = client_id
+        self.name = name
+        self.request_queue = request_queue
+        self.response_queue = response_queue
+        self.recurrent = recurrent
+        self.heartbeat = heartbeat
+        self.heartbeat_timeout = heartbeat_timeout
+
+        self.algorithm = None
+        self.training = False
+        self.nbr_actor = 1
+        self.fixed_size_batches = False
+        self.update_count = 0
+
+    def get_update_count(self):
+        # As of the weights that acted last:
+        return self.update_count
+
+    def set_nbr_actor(self, nbr_actor):
+        if nbr_actor != self.nbr_actor:
+            self.nbr_actor = nbr_actor
+            self.reset_actors(init=True)
+
+    def reset_actors(self, indices=None, init=False):
+        self.request_queue.put((self.client_id, 'reset', {'nbr_actor': self.nbr_actor, 'indices': indices, 'init': init}))
+
+    def take_action(self, state):
+        self.request_queue.put((self.client_id, 'act', state))
+        while True:
+            try:
+                actions, self.update_count = self.response_queue.get(timeout=1.0)
+                return actions
+            except queue.Empty:
+                if self.heartbeat is not None and (time.time()-self.heartbeat.value) > self.heartbeat_timeout:
+                    raise RuntimeError(f'Inference server of {self.name} unresponsive for more than {self.heartbeat_timeout} seconds.')
+
+    def handle_experience(self, s, a, r, succ_s, done, goals=None, infos=None):
+        '''
+        Clients never learn, but the server keeps track of the actors of recurrent policies,
+        whose rnn states are removed as their episodes end (unless the batches are fixed-size).
+        '''
+        if not self.recurrent or not isinstance(done, (list, tuple, np.ndarray)): return
+        self.request_queue.put((self.client_id, 'done', {'done': list(done), 'fixed_size_batches': self.fixed_size_batches}))
+
+    def get_intrinsic_reward(self, actor_idx):
+        return 0.0
+
+    def clone(self, training=None):
+        # Clients are stateless, the actors' states are held by the server:
+        return self
+
+
+class InferenceServer(object):
+    '''
+    Process holding one inference-only copy (`PolicySnapshot`) of an agent, which acts on behalf of
+    several clients (e.g. the rollout loops of several processes, or of training and benchmarking jobs).
+    The clients' states are batched up to a size/latency budget, so that one forward pass serves them all.
+    Clients are created along with the server, and can then be handed over to other processes.
+    '''
+    def __init__(self, agent, nbr_clients=1, max_batch_size=256, max_latency=1e-3, heartbeat_interval=1.0, heartbeat_timeout=30.0):
+        '''
+        :param agent: Agent whose policy is served.
+        :param nbr_clients: Integer, number of clients.
+        :param max_batch_size: Integer, number of states beyond which the pending requests are served at once.
+        :param max_latency: Float, number of seconds after which the pending requests are served, whatever their number.
+        :param heartbeat_interval: Float, period (in seconds) of the server's heartbeat.
+        :param heartbeat_timeout: Float, duration (in seconds) without heartbeat after which the clients deem the server unresponsive.
+        '''
+        self.request_queue = Queue()
+        self.heartbeat = Value('d', time.time())
+        response_queues = [Queue() for _ in range(nbr_clients)]
+        recurrent = getattr(unwrap_agent(agent), 'recurrent', False)
+        self.clients = [InferenceClient(client_id, agent.name, self.request_queue, response_queue, 
+                                        recurrent=recurrent, heartbeat=self.heartbeat, heartbeat_timeout=heartbeat_timeout) 
+                        for client_id, response_queue in enumerate(response_queues)]
+        args = (PolicySnapshot(agent), self.request_queue, response_queues, max_batch_size, max_latency, self.heartbeat, heartbeat_interval)
+        self.process = Process(target=inference_server_worker, args=args)
+        self.process.start()
+
+    def update(self, agent):
+        '''
+        Sends the current weights (and counters) of :param agent: to the server.
+        :param agent: Agent, or `PolicySnapshot`, of the same architecture as the served agent.
+        '''
+        acting_agent = unwrap_agent(agent)
+        payload = {'state_dicts': get_acting_model_state_dicts(agent),
+                   'counters': {counter: getattr(acting_agent, counter) for counter in SNAPSHOT_COUNTERS if hasattr(acting_agent, counter)},
+                   'update_count': agent.get_update_count()}
+        self.request_queue.put((None, 'update', payload))
+
+    def close(self):
+        self.request_queue.put(None)
+        self.process.join()
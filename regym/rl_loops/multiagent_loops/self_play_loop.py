@@ -3,11 +3,29 @@ import numpy as np
 import os
 
 
+def serve_opponents(opponent_agent_vector, inference_servers):
+    '''
+    Loads the weights of the opponents in the servers, so that their clients act on behalf of the opponents.
+    As updating a server swaps the weights served to all of its clients, the servers must belong to
+    this loop only: each of them has exactly one client, which is not shared with any other job.
+    :param opponent_agent_vector: list of opponents, of the same architecture as the agents served by :param inference_servers:
+                                  (e.g. snapshots of the training agent, from the menagerie).
+    :param inference_servers: list of `InferenceServer`s, one per opponent, with one client each.
+    :returns: list of the clients standing in for the opponents.
+    '''
+    for inference_server in inference_servers:
+        assert len(inference_server.clients) == 1, 'Servers of rotating opponents must belong to exactly one job, i.e. have exactly one client.'
+    for inference_server, opponent in zip(inference_servers, opponent_agent_vector):
+        inference_server.update(opponent)
+    return [inference_server.clients[0] for inference_server in inference_servers[:len(opponent_agent_vector)]]
+
+
 def self_play_training(task, training_agent, self_play_scheme,
                        target_episodes: int=10, opci: int=1,
                        menagerie: List=[],
                        menagerie_path: str='.',
-                       initial_episode: int=0):
+                       initial_episode: int=0,
+                       inference_servers: List=None):
     '''
     Extension of the multi-agent rl loop. The extension works thus:
     - Opponent sampling distribution
@@ -23,6 +41,8 @@ def self_play_training(task, training_agent, self_play_scheme,
     :param opci: Opponent policy Change Interval
     :param menageries_path: path to folder where all menageries are stored.
     :param initial_episode: Episode from where training takes on. Useful when training is interrupted.
+    :param inference_servers: list of `InferenceServer`s, one per opponent, if any, owned by this loop with exactly one client each.
+                              The sampled opponents are then played by the servers' clients (cf. `serve_opponents`).
     :returns: Menagerie after target_episodes have elapsed
     :returns: Trained agent. freshly baked!
     :returns: Array of arrays of trajectories for all target_episodes
@@ -35,6 +55,8 @@ def self_play_training(task, training_agent, self_play_scheme,
     for episode in range(target_episodes):
         if episode % opci == 0:
             opponent_agent_vector_e = self_play_scheme.opponent_sampling_distribution(menagerie, training_agent)
+            if inference_servers is not None:
+                opponent_agent_vector_e = serve_opponents(opponent_agent_vector_e, inference_servers)
         training_agent_index = np.random.choice(range(len(opponent_agent_vector_e)))
         opponent_agent_vector_e.insert(training_agent_index, training_agent)
         episode_trajectory = task.run_episode(agent_vector=opponent_agent_vector_e, training=True)
@@ -53,7 +75,8 @@ def self_play_training_with_verbose(task, training_agent, self_play_scheme,
                                     target_episodes: int=10, opci: int=1,
                                     menagerie: List=[],
                                     menagerie_path: str='.',
-                                    initial_episode: int=0):
+                                    initial_episode: int=0,
+                                    inference_servers: List=None):
     '''
     Extension of the multi-agent rl loop. The extension works thus:
     - Opponent sampling distribution
@@ -68,7 +91,10 @@ def self_play_training_with_verbose(task, training_agent, self_play_scheme,
     :param target_episodes: number of episodes that will be run before training ends.
     :param opci: Opponent policy Change Interval
     :param menageries_path: path to folder where all menageries are stored.
-    :param initial_episode: Episode from where training takes on. Useful when training is interrupted.    :returns: Menagerie after target_episodes have elapsed
+    :param initial_episode: Episode from where training takes on. Useful when training is interrupted.
+    :param inference_servers: list of `InferenceServer`s, one per opponent, if any, owned by this loop with exactly one client each.
+                              The sampled opponents are then played by the servers' clients (cf. `serve_opponents`).
+    :returns: Menagerie after target_episodes have elapsed
     :returns: Trained agent. freshly baked!
     :returns: Array of arrays of trajectories for all target_episodes
     '''
@@ -81,6 +107,8 @@ def self_play_training_with_verbose(task, training_agent, self_play_scheme,
     for episode in progress_bar:
         if episode % opci == 0:
             opponent_agent_vector_e = self_play_scheme.opponent_sampling_distribution(menagerie, training_agent)
+            if inference_servers is not None:
+                opponent_agent_vector_e = serve_opponents(opponent_agent_vector_e, inference_servers)
         if isinstance(env, ParallelEnv):
             episode_trajectory = run_episode_parallel(env, [training_agent]+opponent_agent_vector_e, training=True)
         else:
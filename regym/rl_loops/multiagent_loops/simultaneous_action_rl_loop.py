@@ -3,10 +3,12 @@ import copy
 import gym
 from tqdm import tqdm
 import numpy as np
+from regym.rl_algorithms.agents import batched_take_action
+from regym.rl_algorithms.agents.agent import set_fixed_size_batches
 
 episode_n = 0
 
-def run_episode(env, agent_vector, training, record=False):
+def run_episode(env, agent_vector, training, record=False, copy_free=False):
     '''
     Runs a single multi-agent rl loop until termination.
     The observations vector is of length n, where n is the number of agents
@@ -14,6 +16,12 @@ def run_episode(env, agent_vector, training, record=False):
     :param env: OpenAI gym environment
     :param agent_vector: Vector containing the agent for each agent in the environment
     :param training: (boolean) Whether the agents will learn from the experience they recieve
+    :param record: (boolean/string) Whether to record a video of the episode (and the name to record it under).
+    :param copy_free: (boolean) Whether to hand over the environment signals as they are, rather than deep copies.
+                      This relies on the buffer ownership rules: the environment returns fresh objects at each step, 
+                      which it does not modify afterwards, and the agents take ownership of whatever they store,
+                      without modifying it either. Environments that update their observations in place require 
+                      the (default) deep copies.
     :returns: Episode trajectory (o,a,r,o')
     '''
     if record:
@@ -21,7 +29,9 @@ def run_episode(env, agent_vector, training, record=False):
         episode_n +=1
         video_recorder = gym.wrappers.monitoring.video_recorder.VideoRecorder(env=env, base_path=("/tmp/{}-episode-{}".format(record, episode_n)), enabled=True)
 
-    observations = copy.deepcopy( env.reset() )
+    copy_fn = (lambda x: x) if copy_free else copy.deepcopy
+
+    observations = copy_fn( env.reset() )
     done = False
     trajectory = []
     timestep = 0
@@ -29,20 +39,21 @@ def run_episode(env, agent_vector, training, record=False):
     inner_loop = True
 
     while not done:
-        action_vector = copy.deepcopy( [agent.take_action(observations[i]) for i, agent in enumerate(agent_vector)] )
-        succ_observations, reward_vector, done, info = copy.deepcopy( env.step(action_vector) )
-        trajectory.append( copy.deepcopy( (observations, action_vector, reward_vector, succ_observations, done) ) )
+        # Same-architecture inference-only opponents act in one batched forward pass:
+        action_vector = copy_fn( batched_take_action(agent_vector, observations) )
+        succ_observations, reward_vector, done, info = copy_fn( env.step(action_vector) )
+        trajectory.append( copy_fn( (observations, action_vector, reward_vector, succ_observations, done) ) )
 
         if inner_loop:
             if training:
                 for i, agent in enumerate(agent_vector):
-                    agent.handle_experience( copy.deepcopy(observations[i]), copy.deepcopy(action_vector[i]), copy.deepcopy(reward_vector[i]), copy.deepcopy(succ_observations[i]), copy.deepcopy(done) )
+                    agent.handle_experience( copy_fn(observations[i]), copy_fn(action_vector[i]), copy_fn(reward_vector[i]), copy_fn(succ_observations[i]), copy_fn(done) )
 
         if record:
             video_recorder.capture_frame()
 
         timestep += 1
-        observations = copy.deepcopy(succ_observations)
+        observations = copy_fn(succ_observations)
 
 
     if not(inner_loop) and training:
@@ -74,13 +85,15 @@ def run_episode_parallel(env, agent_vector, training, self_play=True):
     for agent in agent_vector: 
         agent.set_nbr_actor(nbr_actors)
         agent.reset_actors()
+        # The batches shrink as the episodes end:
+        set_fixed_size_batches(agent, False)
     done = [False]*nbr_actors
-    previous_done = copy.deepcopy(done)
+    previous_done = list(done)
 
     per_actor_trajectories = [list() for i in range(nbr_actors)]
     trajectory = []
     while not all(done):
-        action_vector = [agent.take_action(observations[i]) for i, agent in enumerate(agent_vector)]
+        action_vector = batched_take_action(agent_vector, observations)
         succ_observations, reward_vector, done, info = env.step(action_vector)
 
         if training:
@@ -112,7 +125,9 @@ def run_episode_parallel(env, agent_vector, training, self_play=True):
             if actor_index == 0 :
                 trajectory.append((pa_obs, pa_a, pa_r, pa_succ_obs, done[actor_index]))
 
-        observations = copy.deepcopy(succ_observations)
+        # The batched environments provide fresh observations at each step,
+        # that are not modified afterwards, thus they need not be copied:
+        observations = succ_observations
         if len(batch_idx_done_actors_among_not_done):
             # Regularization of the agents' next observations:
             batch_idx_done_actors_among_not_done.sort(reverse=True)
@@ -120,7 +135,7 @@ def run_episode_parallel(env, agent_vector, training, self_play=True):
                 for batch_idx in batch_idx_done_actors_among_not_done:
                     observations[i] = np.concatenate( [observations[i][:batch_idx,...], observations[i][batch_idx+1:,...]], axis=0)
         
-        previous_done = copy.deepcopy(done)
+        previous_done = list(done)
 
     if self_play:
         return trajectory
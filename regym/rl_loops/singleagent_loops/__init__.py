@@ -1 +1,2 @@
 from . import rl_loop
+from . import actor_learner_loop
@@ -0,0 +1,290 @@
+import queue
+from tqdm import tqdm
+import numpy as np
+import torch
+from torch.multiprocessing import Process, Queue, Event
+
+from regym.environments.vec_env import batched_env_creator
+from regym.environments.utils import batch_observations, index_batch, is_episode_end
+from regym.rl_algorithms.algorithms.algorithm import get_named_models
+from regym.rl_algorithms.agents.agent import Agent, unwrap_agent
+from regym.rl_algorithms.agents.dqn_agent import DQNAgent
+from regym.rl_algorithms.agents.ppo_agent import PPOAgent
+from regym.rl_algorithms.agents.a2c_agent import A2CAgent
+from regym.rl_algorithms.agents.policy_snapshot import PolicySnapshot, SNAPSHOT_COUNTERS, get_acting_model_state_dicts
+from .rl_loop import AsyncEvaluator, EpisodeStatistics
+
+
+# Agents whose algorithm learns off-policy, from replay buffers (e.g. DQN, THER):
+OFF_POLICY_AGENTS = (DQNAgent,)
+# Agents whose algorithm learns on-policy, from trajectories, which are corrected with V-trace (e.g. PPO, A2C):
+ON_POLICY_AGENTS = (PPOAgent, A2CAgent)
+
+
+def _replace_in_queue(q, item):
+    # Only the latest item matters, pending ones are replaced:
+    try:
+        q.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        q.put_nowait(item)
+    except queue.Full:
+        # The actor has not consumed the item that replaced the pending one yet,
+        # it will be replaced upon the next broadcast:
+        pass
+
+
+def actor_worker(actor_id, agent, env_creator, env_configs, experience_queue, weights_queue, stop_event):
+    '''
+    Gathers experience with a CPU snapshot of the agent's policy, and streams it to the learner.
+    :param actor_id: Integer, index of this actor.
+    :param agent: PolicySnapshot of the agent, that is only used to act.
+    :param env_creator: callable creating the (batched) environments of this actor (cf. `batched_env_creator`).
+    :param experience_queue: Queue, shared by the actors, through which batches of experience are sent to the learner,
+                             along with the index of the actor. Being bounded, it prevents the actors from running
+                             too far ahead of the learner.
+    :param weights_queue: Queue through which the learner broadcasts its latest weights and counters (cf. `PolicySnapshot.update`).
+    :param stop_event: Event set by the learner when the actor ought to stop.
+    '''
+    agent.algorithm.kwargs['use_cuda'] = False
+    for model in get_named_models(agent.algorithm).values(): model.cpu()
+    acting_agent = unwrap_agent(agent)
+
+    env = env_creator()
+    nbr_parallel_env = env.get_nbr_envs()
+    observations = env.reset(env_configs=env_configs)
+    agent.set_nbr_actor(nbr_parallel_env)
+    agent.reset_actors()
+
+    while not stop_event.is_set():
+        try:
+            state_dicts, counters = weights_queue.get_nowait()
+            agent.update(state_dicts, counters=counters)
+        except queue.Empty:
+            pass
+
+        action = agent.take_action(observations)
+        next_observations, reward, done, info = env.step(action)
+
+        # Environments whose episode ended have already been reset,
+        # and their terminal observation is provided in the info:
+        succ_observations = next_observations
+        if any(['terminal_observation' in i for i in info]):
+            succ_observations = batch_observations([ i['terminal_observation'] if 'terminal_observation' in i else index_batch(next_observations, idx)
+                                                     for idx, i in enumerate(info)])
+
+        experience = {'s': observations,
+                      'a': action,
+                      'r': reward,
+                      'succ_s': succ_observations,
+                      'done': list(done),
+                      'infos': info,
+                      'prediction': acting_agent.current_prediction}
+        while not stop_event.is_set():
+            try:
+                experience_queue.put((actor_id, experience), timeout=1.0)
+                break
+            except queue.Full:
+                continue
+
+        reset_indices = [idx for idx in range(nbr_parallel_env) if done[idx] or is_episode_end(done[idx], info[idx])]
+        if len(reset_indices): agent.reset_actors(indices=reset_indices)
+        observations = next_observations
+
+    # The learner does not consume the remaining experiences:
+    experience_queue.cancel_join_thread()
+    env.close()
+
+
+def handle_actor_experience(agent, experience, actor_indices):
+    '''
+    Stores the batch of experience of one actor process into the storages of the learning :param agent:,
+    whose actors :param actor_indices: are that process' environments.
+    Only the rows of the actor process are preprocessed and stored: the other actors are left untouched.
+    :param experience: Dictionnary of the batch of experience of the actor process.
+    :param actor_indices: list of the indices of the agent's actors that :param experience: is about.
+    :returns: number of episodes that ended within :param experience:.
+    '''
+    learning_agent = unwrap_agent(agent)
+    off_policy = isinstance(learning_agent, OFF_POLICY_AGENTS)
+    state, r, succ_state, non_terminal = learning_agent.preprocess_environment_signals(experience['s'],
+                                                                                      np.asarray(experience['r']).reshape(-1),
+                                                                                      experience['succ_s'],
+                                                                                      experience['done'])
+    a = torch.from_numpy(np.asarray(experience['a']))
+    prediction = experience['prediction']
+
+    nbr_episode_ends = 0
+    for batch_index, actor_index in enumerate(actor_indices):
+        exp_dict = {}
+        exp_dict['s'] = state[batch_index,...].unsqueeze(0)
+        exp_dict['a'] = a[batch_index,...].unsqueeze(0)
+        exp_dict['r'] = r[batch_index,...].unsqueeze(0)
+        exp_dict['succ_s'] = succ_state[batch_index,...].unsqueeze(0)
+        exp_dict['non_terminal'] = non_terminal[batch_index,...].unsqueeze(0)
+        exp_dict.update(Agent._extract_from_prediction(prediction, batch_index))
+
+        if learning_agent.recurrent:
+            exp_dict['rnn_states'] = Agent._extract_from_rnn_states(prediction['rnn_states'], batch_index)
+            exp_dict['next_rnn_states'] = Agent._extract_from_rnn_states(prediction['next_rnn_states'], batch_index)
+
+        if off_policy:
+            exp_dict['info'] = experience['infos'][batch_index]
+            learning_agent.algorithm.store(exp_dict, actor_index=actor_index)
+        else:
+            if learning_agent.use_rnd:
+                int_reward, target_int_f = learning_agent.algorithm.compute_intrinsic_reward(exp_dict['succ_s'])
+                exp_dict.update({'int_r':int_reward, 'target_int_f':target_int_f})
+            learning_agent.algorithm.storages[actor_index].add(exp_dict)
+        learning_agent.handled_experiences += 1
+        if experience['done'][batch_index]: nbr_episode_ends += 1
+
+    return nbr_episode_ends
+
+
+def gather_experience_actor_learner(task,
+                                    agent,
+                                    nbr_actor_processes=2,
+                                    max_obs_count=1e7,
+                                    weights_broadcast_interval=10,
+                                    experience_queue_size=8,
+                                    test_obs_interval=1e4,
+                                    test_nbr_episode=10,
+                                    env_configs=None,
+                                    sum_writer=None,
+                                    base_path='./',
+                                    actor_timeout=60.0):
+    '''
+    Runs an actor/learner split of `gather_experience_parallel` until the number of observation, `max_obs_count`, is reached.
+    Each of the :param nbr_actor_processes: actor processes steps its own copy of `task.env` (cf. `batched_env_creator`)
+    with a CPU snapshot of the agent's policy, and streams batches of experience to the learner (this process).
+    The learner handles each batch as soon as it arrives, whichever actor it comes from, as the experience of
+    its own `task.env.get_nbr_envs()` actors among `nbr_actor_processes*task.env.get_nbr_envs()` actors.
+    Thus, each environment keeps its own storage, and a slow actor does not hold the learner up.
+    The learner trains as it handles experience, at the same pace as `gather_experience_parallel`, with respect to
+    the number of observations: off-policy algorithms (e.g. DQN) count a replay period for every
+    `nbr_actor_processes*task.env.get_nbr_envs()` observations, whereas on-policy algorithms (e.g. PPO, A2C)
+    train once `horizon` observations per actor have been handled. It broadcasts its weights, and counters
+    (e.g. the number of steps that the epsilon-greedy exploration depends on),
+    every :param weights_broadcast_interval: batches.
+
+    Meanwhile, the actors keep going on with their weights: their experience is thus off-policy.
+    Off-policy algorithms, that learn from replay buffers (DQN), need no correction, whereas the
+    trajectories of on-policy algorithms (PPO, A2C) are corrected with V-trace (cf. `vtrace`).
+    :param task: Task whose `env` is a VecEnv, a ParallelEnv or natively batched single-agent environments.
+    :param agent: Agent policy, to train.
+    :param nbr_actor_processes: Integer, number of actor processes.
+    :param max_obs_count: Maximum number of observations to gather data for.
+    :param weights_broadcast_interval: Integer, number of batches of experience handled by the learner
+                                       between two broadcasts of the weights to the actors.
+    :param experience_queue_size: Integer, number of batches of experience an actor can run ahead of the learner.
+    :param test_obs_interval: Integer, interval between two testing of the agent in the test environment.
+    :param test_nbr_episode: Integer, nbr of episode to test the agent with (in a separate process, cf. `AsyncEvaluator`).
+    :param env_configs: configuration dictionnary to use when resetting the environments.
+    :param sum_writer: SummaryWriter.
+    :param base_path: Path where to save gifs.
+    :param actor_timeout: Float, number of seconds without experience from any actor after which
+                          the actors are checked upon, and an error is raised if they all died.
+    :returns: the trained agent.
+    '''
+    learning_agent = unwrap_agent(agent)
+    if not isinstance(learning_agent, OFF_POLICY_AGENTS+ON_POLICY_AGENTS):
+        raise NotImplementedError(f'{type(learning_agent).__name__} is not supported by the actor/learner loop.')
+    off_policy = isinstance(learning_agent, OFF_POLICY_AGENTS)
+    if not off_policy:
+        learning_agent.algorithm.kwargs['use_vtrace'] = True
+
+    env = task.env
+    nbr_parallel_env = env.get_nbr_envs()
+    nbr_actors = nbr_actor_processes*nbr_parallel_env
+    # Each actor keeps its own storage, in which the learner stores the actor's experience directly:
+    agent.set_nbr_actor(nbr_actors)
+
+    stop_event = Event()
+    experience_queue = Queue(maxsize=experience_queue_size*nbr_actor_processes)
+    weights_queues = [Queue(maxsize=1) for _ in range(nbr_actor_processes)]
+    actor_processes = []
+    # Natively batched environments have no seed attribute, but a seeding method:
+    seed = env.seed if isinstance(env.seed, int) else 0
+    for actor_id in range(nbr_actor_processes):
+        # Actors only receive what they need to act, and the weights afterwards:
+        env_creator = batched_env_creator(env, seed=seed+actor_id*nbr_parallel_env, gathering=True)
+        args = (actor_id, PolicySnapshot(agent), env_creator, env_configs,
+                experience_queue, weights_queues[actor_id], stop_event)
+        p = Process(target=actor_worker, args=args)
+        p.start()
+        actor_processes.append(p)
+
+    evaluator = None
+    if test_nbr_episode != 0:
+        evaluator = AsyncEvaluator(agent=agent, test_env=task.test_env, sum_writer=sum_writer, base_path=base_path)
+
+    statistics = EpisodeStatistics(nbr_actors)
+    obs_count = agent.get_experience_count() if hasattr(agent, "get_experience_count") else 0
+    batch_count = 0
+    # Observations handled since the last training (or replay period), and episodes that ended meanwhile:
+    untrained_obs_count = 0
+    untrained_episode_count = 0
+    training_period = nbr_actors if off_policy else int(learning_agent.algorithm.kwargs['horizon'])*nbr_actors
+
+    pbar = tqdm(total=max_obs_count)
+
+    while obs_count < max_obs_count:
+        try:
+            actor_id, experience = experience_queue.get(timeout=actor_timeout)
+        except queue.Empty:
+            if not any([p.is_alive() for p in actor_processes]):
+                raise RuntimeError('All the actor processes died.')
+            continue
+        actor_indices = list(range(actor_id*nbr_parallel_env, (actor_id+1)*nbr_parallel_env))
+        untrained_episode_count += handle_actor_experience(agent, experience, actor_indices)
+        # The learner does not act, thus it counts the steps of the actors:
+        if hasattr(learning_agent, 'nbr_steps'): learning_agent.nbr_steps += nbr_parallel_env
+
+        # Training is paced by the number of observations actually stored, rather than by the number
+        # of batches, so that the training and target update periods mean the same as in the lockstep loop:
+        untrained_obs_count += nbr_parallel_env
+        while untrained_obs_count >= training_period:
+            untrained_obs_count -= training_period
+            if off_policy:
+                learning_agent.train_on_replay_period(nbr_episode_ends=untrained_episode_count)
+            elif learning_agent.training:
+                learning_agent.algorithm.train()
+                if learning_agent.save_path is not None: torch.save(learning_agent, learning_agent.save_path)
+            untrained_episode_count = 0
+
+        previous_obs_count = obs_count
+        obs_count += nbr_parallel_env
+        batch_count += 1
+        pbar.update(nbr_parallel_env)
+
+        # Bookkeeping of the actors whose episode just ended:
+        done, infos = experience['done'], experience['infos']
+        episode_ends = np.array([is_episode_end(d, i) for d, i in zip(done, infos)], dtype=bool)
+        statistics.step(experience['r'], actor_indices=actor_indices)
+        ended_actor_indices = [actor_indices[idx] for idx in np.nonzero(episode_ends)[0]]
+        if len(ended_actor_indices):
+            summaries = statistics.end_episodes(ended_actor_indices, obs_count, agent.get_update_count())
+            if sum_writer is not None:
+                for tag, value, step in summaries:
+                    sum_writer.add_scalar(tag, value, step)
+
+        if batch_count % weights_broadcast_interval == 0:
+            state_dicts = get_acting_model_state_dicts(agent)
+            counters = {counter: getattr(learning_agent, counter) for counter in SNAPSHOT_COUNTERS if hasattr(learning_agent, counter)}
+            for weights_queue in weights_queues:
+                _replace_in_queue(weights_queue, (state_dicts, counters))
+
+        if evaluator is not None and obs_count // test_obs_interval > previous_obs_count // test_obs_interval:
+            evaluator.evaluate(agent=agent, nbr_episode=test_nbr_episode, iteration=obs_count)
+
+    stop_event.set()
+    for weights_queue in weights_queues:
+        # The actors may not consume the last weights:
+        weights_queue.cancel_join_thread()
+    for p in actor_processes:
+        p.join()
+    if evaluator is not None: evaluator.close()
+
+    return agent
@@ -1,9 +1,14 @@
 import math
-import copy
 import time
+import queue
 from tqdm import tqdm
 import numpy as np
+from torch.multiprocessing import Process, Queue
 from regym.util import save_traj_with_graph
+from regym.environments.utils import batch_observations, index_batch, remove_from_batch, is_episode_end
+from regym.environments.vec_env import batched_env_creator
+from regym.rl_algorithms.agents.policy_snapshot import PolicySnapshot, SNAPSHOT_COUNTERS, get_acting_model_state_dicts
+from regym.rl_algorithms.agents.agent import set_fixed_size_batches
 
 
 def run_episode(env, agent, training, max_episode_length=math.inf):
@@ -35,7 +40,9 @@ def run_episode_parallel(env,
                             agent, 
                             training, 
                             max_episode_length=1e30, 
-                            env_configs=None):
+                            env_configs=None,
+                            record_observations=True,
+                            fixed_size_batches=False):
     '''
     Runs a single multi-agent rl loop until termination.
     The observations vector is of length n, where n is the number of agents
@@ -45,6 +52,11 @@ def run_episode_parallel(env,
     :param training: (boolean) Whether the agents will learn from the experience they recieve
     :param max_episode_length: Maximum expisode duration meassured in steps.
     :param env_configs: configuration dictionnary to use when resetting the environments.
+    :param record_observations: (boolean) Whether to record the observations in the trajectories, 
+                                or only the other signals (None being recorded in place of the observations).
+    :param fixed_size_batches: (boolean) Whether the batches keep all the actors, even those whose episode is over,
+                               rather than shrinking as the episodes end. The batch shapes are then stable,
+                               and the finished actors are masked out of the agent's storages.
     :returns: Trajectory (o,a,r,o')
     '''
     observations = env.reset(env_configs=env_configs)
@@ -52,15 +64,27 @@ def run_episode_parallel(env,
     nbr_actors = env.get_nbr_envs()
     agent.set_nbr_actor(nbr_actors)
     agent.reset_actors()
+    set_fixed_size_batches(agent, fixed_size_batches)
     done = [False]*nbr_actors
-    previous_done = copy.deepcopy(done)
+    previous_done = list(done)
 
     per_actor_trajectories = [list() for i in range(nbr_actors)]
     #generator = tqdm(range(int(max_episode_length))) if max_episode_length != math.inf else range(int(1e20))
     #for step in generator:
     for step in range(int(max_episode_length)):
         action = agent.take_action(observations)
-        succ_observations, reward, done, info = env.step(action)
+        if fixed_size_batches:
+            # Only the environments whose episode is not over are stepped, 
+            # the others keep their last observation and get no reward:
+            active_indices = [idx for idx in range(nbr_actors) if not previous_done[idx]]
+            active_succ_observations, active_reward, done, info = env.step(action[active_indices])
+            active_batch_indices = {actor_index: batch_index for batch_index, actor_index in enumerate(active_indices)}
+            succ_observations = batch_observations([ index_batch(active_succ_observations, active_batch_indices[idx]) if idx in active_batch_indices else index_batch(observations, idx)
+                                                     for idx in range(nbr_actors)])
+            reward = np.zeros(nbr_actors)
+            reward[active_indices] = np.asarray(active_reward).reshape(-1)
+        else:
+            succ_observations, reward, done, info = env.step(action)
 
         if training:
             agent.handle_experience(observations, 
@@ -75,7 +99,7 @@ def run_episode_parallel(env,
         for actor_index in range(nbr_actors):
             if previous_done[actor_index]:
                 continue
-            batch_index +=1
+            batch_index = actor_index if fixed_size_batches else batch_index+1
             
             # Bookkeeping of the actors whose episode just ended:
             d = done[actor_index]
@@ -85,10 +109,10 @@ def run_episode_parallel(env,
             if d and not(previous_done[actor_index]):
                 batch_idx_done_actors_among_not_done.append(batch_index)
                 
-            pa_obs = observations[batch_index]
+            pa_obs = index_batch(observations, batch_index) if record_observations else None
             pa_a = action[batch_index]
             pa_r = reward[batch_index]
-            pa_succ_obs = succ_observations[batch_index]
+            pa_succ_obs = index_batch(succ_observations, batch_index) if record_observations else None
             pa_done = done[actor_index]
             pa_int_r = 0.0
             if getattr(agent.algorithm, "use_rnd", False):
@@ -97,14 +121,16 @@ def run_episode_parallel(env,
                     pa_int_r = agent.get_intrinsic_reward(actor_index)
             per_actor_trajectories[actor_index].append( (pa_obs, pa_a, pa_r, pa_int_r, pa_succ_obs, pa_done) )
 
-        observations = copy.deepcopy(succ_observations)
-        if len(batch_idx_done_actors_among_not_done):
+        # The environments provide fresh observations at each step, that are not modified afterwards,
+        # and the agent takes ownership of what it stores, thus they need not be copied:
+        observations = succ_observations
+        if len(batch_idx_done_actors_among_not_done) and not fixed_size_batches:
             # Regularization of the agents' next observations:
             batch_idx_done_actors_among_not_done.sort(reverse=True)
             for batch_idx in batch_idx_done_actors_among_not_done:
-                observations = np.concatenate( [observations[:batch_idx,...], observations[batch_idx+1:,...]], axis=0)
+                observations = remove_from_batch(observations, batch_idx)
 
-        previous_done = copy.deepcopy(done)
+        previous_done = list(done)
 
         alldone = all(done)
         allrealdone = False
@@ -118,7 +144,7 @@ def run_episode_parallel(env,
 
     return per_actor_trajectories
 
-def test_agent(env, agent, nbr_episode, sum_writer, iteration, base_path, nbr_save_traj=1, save_traj=False):
+def test_agent(env, agent, nbr_episode, sum_writer, iteration, base_path, nbr_save_traj=1, save_traj=False, update_count=None):
     max_episode_length = 1e4
     env.set_nbr_envs(nbr_episode)
     
@@ -126,7 +152,9 @@ def test_agent(env, agent, nbr_episode, sum_writer, iteration, base_path, nbr_sa
                                       agent, 
                                       training=False, 
                                       max_episode_length=max_episode_length,
-                                      env_configs=None)
+                                      env_configs=None,
+                                      record_observations=save_traj,
+                                      fixed_size_batches=True)
 
     total_return = [ sum([ exp[2] for exp in t]) for t in trajectory]
     mean_total_return = sum( total_return) / len(trajectory)
@@ -136,7 +164,7 @@ def test_agent(env, agent, nbr_episode, sum_writer, iteration, base_path, nbr_sa
     mean_total_int_return = sum( total_int_return) / len(trajectory)
     std_int_return = math.sqrt( sum( [math.pow( r-mean_total_int_return ,2) for r in total_int_return]) / len(total_int_return) )
 
-    update_count = agent.get_update_count()
+    if update_count is None: update_count = agent.get_update_count()
 
     for idx, (ext_ret, int_ret) in enumerate(zip(total_return, total_int_return)):
         sum_writer.add_scalar('PerObservation/Testing/TotalReturn', ext_ret, iteration*len(trajectory)+idx)
@@ -177,6 +205,178 @@ def test_agent(env, agent, nbr_episode, sum_writer, iteration, base_path, nbr_sa
             print(f'{actor_idx+1} / {nbr_save_traj} :: Time: {eta} sec.')
 
 
+def evaluation_worker(agent, env_creator, log_dir, base_path, request_queue):
+    '''
+    Evaluates the snapshots of an agent received through :param request_queue:, until None is received.
+    :param agent: PolicySnapshot of the agent, in which the snapshots' weights are loaded.
+    :param env_creator: callable creating the batched test environments (cf. `batched_env_creator`).
+    :param log_dir: directory of the SummaryWriter to which the results are written.
+    '''
+    from tensorboardX import SummaryWriter
+    sum_writer = SummaryWriter(log_dir)
+    test_env = env_creator()
+
+    while True:
+        request = request_queue.get()
+        if request is None: break
+
+        agent.update(state_dicts=request['state_dicts'], counters=request['counters'])
+        test_agent(env=test_env, 
+                   agent=agent, 
+                   nbr_episode=request['nbr_episode'], 
+                   sum_writer=sum_writer, 
+                   iteration=request['iteration'],
+                   base_path=base_path,
+                   save_traj=request['save_traj'],
+                   update_count=request['update_count'])
+        sum_writer.flush()
+
+    test_env.close()
+    sum_writer.close()
+
+
+class AsyncEvaluator(object):
+    '''
+    Offloads the testing of an agent to a separate process, while training goes on.
+    The process holds a `PolicySnapshot` of the agent, and only receives 
+    the weights of its acting models afterwards. Results are written to the same tags,
+    in a SummaryWriter of the same directory.
+    At most one snapshot is pending: if the process is still busy evaluating when a 
+    new snapshot is submitted, the pending one is replaced by the new one.
+    '''
+    def __init__(self, agent, test_env, sum_writer, base_path='./'):
+        '''
+        :param agent: Agent to evaluate.
+        :param test_env: batched test environments (e.g. VecEnv, ParallelEnv or BatchedNBitsSwapEnv),
+                         which are created anew within the evaluation process (cf. `batched_env_creator`).
+        :param sum_writer: SummaryWriter, whose directory the results are written to.
+        :param base_path: Path where to save gifs.
+        '''
+        self.request_queue = Queue(maxsize=1)
+        # Natively batched environments have no seed attribute, but a seeding method:
+        seed = test_env.seed if isinstance(test_env.seed, int) else 0
+        env_creator = batched_env_creator(test_env, seed=seed, gathering=False)
+        args = (PolicySnapshot(agent), env_creator, sum_writer.get_logdir(), base_path, self.request_queue)
+        self.process = Process(target=evaluation_worker, args=args)
+        self.process.start()
+
+    def evaluate(self, agent, nbr_episode, iteration, save_traj=False):
+        request = {'state_dicts': get_acting_model_state_dicts(agent),
+                   'counters': {counter: getattr(agent, counter) for counter in SNAPSHOT_COUNTERS if hasattr(agent, counter)},
+                   'update_count': agent.get_update_count(),
+                   'nbr_episode': nbr_episode,
+                   'iteration': iteration,
+                   'save_traj': save_traj}
+        try:
+            self.request_queue.get_nowait()
+            print(f'Evaluation process busy: skipping the pending evaluation in favour of iteration {iteration}.')
+        except queue.Empty:
+            pass
+        try:
+            self.request_queue.put_nowait(request)
+        except queue.Full:
+            # The pending request was not retrieved, since it may not have been flushed to the queue yet
+            # (by its feeder thread): the evaluation of this iteration is skipped, rather than waited for.
+            print(f'Evaluation process busy: skipping the evaluation of iteration {iteration}.')
+
+    def close(self):
+        '''
+        Waits for the pending evaluation to complete, and stops the evaluation process.
+        '''
+        self.request_queue.put(None)
+        self.process.join()
+
+
+class EpisodeStatistics(object):
+    '''
+    Running statistics of the actors' current episodes (returns and lengths), 
+    so that no observation is kept alive over a whole episode, and summaries
+    of the episodes that end, which are written to the training tags.
+    '''
+    def __init__(self, nbr_actors):
+        self.nbr_actors = nbr_actors
+        # Running statistics of the actors' current episodes:
+        self.per_actor_returns = np.zeros(nbr_actors)
+        self.per_actor_int_returns = np.zeros(nbr_actors)
+        self.per_actor_lengths = np.zeros(nbr_actors, dtype=np.int64)
+        # Statistics of the episodes that ended since the last logging:
+        self.total_returns = list()
+        self.total_int_returns = list()
+        self.episode_lengths = list()
+
+        self.episode_count = 0
+        self.sample_episode_count = 0
+
+    def step(self, reward, int_reward=None, actor_indices=None):
+        '''
+        :param reward: rewards of the actors :param actor_indices: (default: all of them).
+        :param int_reward: intrinsic rewards of the actors :param actor_indices:, if any.
+        '''
+        if actor_indices is None: actor_indices = slice(None)
+        self.per_actor_returns[actor_indices] += np.asarray(reward, dtype=np.float64).reshape(-1)
+        if int_reward is not None:
+            self.per_actor_int_returns[actor_indices] += np.asarray(int_reward, dtype=np.float64).reshape(-1)
+        self.per_actor_lengths[actor_indices] += 1
+
+    def end_episodes(self, ended_actor_indices, obs_count, update_count):
+        '''
+        :param ended_actor_indices: list of the indices of the actors whose episode really ended.
+        :returns: list of summaries (tag, value, step) of the episodes that ended, which are gathered
+                  to be written at once, and of the statistics over the last `nbr_actors` episodes, if any.
+        '''
+        summaries = list()
+        for actor_index in ended_actor_indices:
+            self.episode_count += 1
+            self.total_returns.append(float(self.per_actor_returns[actor_index]))
+            self.total_int_returns.append(float(self.per_actor_int_returns[actor_index]))
+            self.episode_lengths.append(int(self.per_actor_lengths[actor_index]))
+            
+            summaries.append(('Training/TotalReturn', self.total_returns[-1], self.episode_count))
+            summaries.append(('PerObservation/TotalReturn', self.total_returns[-1], obs_count))
+            summaries.append(('PerUpdate/TotalReturn', self.total_returns[-1], update_count))
+            if actor_index == 0:
+                self.sample_episode_count += 1
+                summaries.append(('data/reward', self.total_returns[-1], self.sample_episode_count))
+                summaries.append(('PerObservation/Actor0Reward', self.total_returns[-1], obs_count))
+                summaries.append(('PerUpdate/Actor0Reward', self.total_returns[-1], update_count))
+            summaries.append(('Training/TotalIntReturn', self.total_int_returns[-1], self.episode_count))
+
+        self.per_actor_returns[ended_actor_indices] = 0.0
+        self.per_actor_int_returns[ended_actor_indices] = 0.0
+        self.per_actor_lengths[ended_actor_indices] = 0
+
+        if len(self.total_returns) >= self.nbr_actors:
+            mean_total_return = np.mean(self.total_returns)
+            std_ext_return = np.std(self.total_returns)
+            mean_total_int_return = np.mean(self.total_int_returns)
+            std_int_return = np.std(self.total_int_returns)
+            mean_episode_length = np.mean(self.episode_lengths)
+            std_episode_length = np.std(self.episode_lengths)
+            step = self.episode_count // self.nbr_actors
+        
+            summaries.append(('Training/StdIntReturn', std_int_return, step))
+            summaries.append(('Training/StdExtReturn', std_ext_return, step))
+
+            summaries.append(('Training/MeanTotalReturn', mean_total_return, step))
+            summaries.append(('PerObservation/MeanTotalReturn', mean_total_return, obs_count))
+            summaries.append(('PerUpdate/MeanTotalReturn', mean_total_return, update_count))
+            summaries.append(('Training/MeanTotalIntReturn', mean_total_int_return, step))
+            
+            summaries.append(('Training/MeanEpisodeLength', mean_episode_length, step))
+            summaries.append(('PerObservation/MeanEpisodeLength', mean_episode_length, obs_count))
+            summaries.append(('PerUpdate/MeanEpisodeLength', mean_episode_length, update_count))
+            summaries.append(('Training/StdEpisodeLength', std_episode_length, step))
+            summaries.append(('PerObservation/StdEpisodeLength', std_episode_length, obs_count))
+            summaries.append(('PerUpdate/StdEpisodeLength', std_episode_length, update_count))
+            
+            # reset :
+            self.total_returns = list()
+            self.total_int_returns = list()
+            self.episode_lengths = list()
+
+        return summaries
+
+
 def gather_experience_parallel(task, 
                                 agent, 
                                 training, 
@@ -187,11 +387,16 @@ def gather_experience_parallel(task,
                                 sum_writer=None, 
                                 base_path='./', 
                                 benchmarking_record_episode_interval=None,
-                                step_hooks=[]):
+                                step_hooks=[],
+                                asynchronous_testing=False,
+                                inference_server=None):
     '''
     Runs a single multi-agent rl loop until the number of observation, `max_obs_count`, is reached.
     The observations vector is of length n, where n is the number of agents.
     observations[i] corresponds to the oberservation of agent i.
+    Only the returns and lengths of the episodes are tracked, as running statistics, 
+    so that no observation is kept alive over a whole episode. Observations are only
+    recorded when testing the agent, and only if some episodes are to be saved as gifs.
     :param env: ParallelEnv wrapper around an OpenAI gym environment
     :param agent: Agent policy used to take actionsin the environment and to process simulated experiences
     :param training: (boolean) Whether the agents will learn from the experience they recieve
@@ -202,6 +407,16 @@ def gather_experience_parallel(task,
     :param sum_writer: SummaryWriter.
     :param base_path: Path where to save gifs.
     :param benchmarking_record_episode_interval: None if not gif ought to be made, otherwise Integer.
+    :param step_hooks: list of callables (env, agent, obs_count, batch), called once per batch of observations, 
+                       i.e. once per environment step, with the number of observations gathered so far,
+                       and the batch of the step's experiences, as a dictionnary with the keys 'observations',
+                       'actions', 'rewards', 'succ_observations', 'dones' and 'infos', each holding the values
+                       of all the actors.
+    :param asynchronous_testing: Boolean specifying whether to test the agent in a separate process (cf. `AsyncEvaluator`),
+                                 while experience gathering goes on, rather than synchronously.
+    :param inference_server: `InferenceServer` of the agent (e.g. shared with concurrent benchmarking jobs), if any.
+                             It is then sent the agent's latest weights before each synchronous testing,
+                             and its first client tests the agent, in place of a `PolicySnapshot`.
     :returns: 
     '''
     env = task.env 
@@ -212,23 +427,32 @@ def gather_experience_parallel(task,
     nbr_actors = env.get_nbr_envs()
     agent.set_nbr_actor(nbr_actors)
     agent.reset_actors()
+    # The environments are reset as their episodes end, thus the batches always hold all the actors:
+    set_fixed_size_batches(agent, True)
     done = [False]*nbr_actors
     
-    per_actor_trajectories = [list() for i in range(nbr_actors)]
-    trajectories = list()
-    total_returns = list()
-    total_int_returns = list()
-    episode_lengths = list()
+    statistics = EpisodeStatistics(nbr_actors)
+
+    use_int_reward = getattr(agent.algorithm, "use_rnd", False) and callable(getattr(agent, "get_intrinsic_reward", None))
 
     obs_count = agent.get_experience_count() if hasattr(agent, "get_experience_count") else 0
-    episode_count = 0
-    sample_episode_count = 0
     
     pbar = tqdm(total=max_obs_count)
     
+    evaluator = None
+    if asynchronous_testing and test_nbr_episode != 0:
+        evaluator = AsyncEvaluator(agent=agent, test_env=test_env, sum_writer=sum_writer, base_path=base_path)
+
     while True:
         action = agent.take_action(observations)
-        succ_observations, reward, done, info = env.step(action)
+        next_observations, reward, done, info = env.step(action)
+        
+        # Environments whose episode ended have already been reset (within their worker),
+        # and their terminal observation is provided in the info:
+        succ_observations = next_observations
+        if any(['terminal_observation' in i for i in info]):
+            succ_observations = batch_observations([ i['terminal_observation'] if 'terminal_observation' in i else index_batch(next_observations, idx) 
+                                                     for idx, i in enumerate(info)])
 
         if training:
             agent.handle_experience(observations, 
@@ -238,99 +462,83 @@ def gather_experience_parallel(task,
                                     done,
                                     infos=info)
 
-        for actor_index in range(nbr_actors):
-            obs_count += 1
-            pbar.update(1)
-
+        # Bookkeeping over the whole batch of actors:
+        previous_obs_count = obs_count
+        obs_count += nbr_actors
+        pbar.update(nbr_actors)
+
+        # Hooks are called once per batch of observations, with the whole batch:
+        if len(step_hooks):
+            batch = {'observations': observations,
+                     'actions': action,
+                     'rewards': reward,
+                     'succ_observations': succ_observations,
+                     'dones': done,
+                     'infos': info}
             for hook in step_hooks:
-                hook(env, agent, obs_count)
-    
-            # Bookkeeping of the actors whose episode just ended:
-            if done[actor_index]:
-                agent.reset_actors(indices=[actor_index])
-
-            if ('real_done' in info[actor_index] and info[actor_index]['real_done'])\
-                or ('real_done' not in info[actor_index] and done[actor_index]):
-                update_count = agent.get_update_count()
-                episode_count += 1
-                succ_observations[actor_index] = env.reset(env_configs=env_configs, env_indices=[actor_index])
-                agent.reset_actors(indices=[actor_index])
-
-                # Logging:
-                trajectories.append(per_actor_trajectories[actor_index])
-                total_returns.append(sum([ exp[2] for exp in trajectories[-1]]))
-                total_int_returns.append(sum([ exp[3] for exp in trajectories[-1]]))
-                episode_lengths.append(len(trajectories[-1]))
-                
-                sum_writer.add_scalar('Training/TotalReturn', total_returns[-1], episode_count)
-                sum_writer.add_scalar('PerObservation/TotalReturn', total_returns[-1], obs_count)
-                sum_writer.add_scalar('PerUpdate/TotalReturn', total_returns[-1], update_count)
-                if actor_index == 0:
-                    sample_episode_count += 1
-                    sum_writer.add_scalar('data/reward', total_returns[-1], sample_episode_count)
-                    sum_writer.add_scalar('PerObservation/Actor0Reward', total_returns[-1], obs_count)
-                    sum_writer.add_scalar('PerUpdate/Actor0Reward', total_returns[-1], update_count)
-                sum_writer.add_scalar('Training/TotalIntReturn', total_int_returns[-1], episode_count)
-
-                if len(trajectories) >= nbr_actors:
-                    mean_total_return = sum( total_returns) / len(trajectories)
-                    std_ext_return = math.sqrt( sum( [math.pow( r-mean_total_return ,2) for r in total_returns]) / len(total_returns) )
-                    mean_total_int_return = sum( total_int_returns) / len(trajectories)
-                    std_int_return = math.sqrt( sum( [math.pow( r-mean_total_int_return ,2) for r in total_int_returns]) / len(total_int_returns) )
-                    mean_episode_length = sum( episode_lengths) / len(trajectories)
-                    std_episode_length = math.sqrt( sum( [math.pow( l-mean_episode_length ,2) for l in episode_lengths]) / len(episode_lengths) )
-                
-                    sum_writer.add_scalar('Training/StdIntReturn', std_int_return, episode_count // nbr_actors)
-                    sum_writer.add_scalar('Training/StdExtReturn', std_ext_return, episode_count // nbr_actors)
-
-                    sum_writer.add_scalar('Training/MeanTotalReturn', mean_total_return, episode_count // nbr_actors)
-                    sum_writer.add_scalar('PerObservation/MeanTotalReturn', mean_total_return, obs_count)
-                    sum_writer.add_scalar('PerUpdate/MeanTotalReturn', mean_total_return, update_count)
-                    sum_writer.add_scalar('Training/MeanTotalIntReturn', mean_total_int_return, episode_count // nbr_actors)
-                    
-                    sum_writer.add_scalar('Training/MeanEpisodeLength', mean_episode_length, episode_count // nbr_actors)
-                    sum_writer.add_scalar('PerObservation/MeanEpisodeLength', mean_episode_length, obs_count)
-                    sum_writer.add_scalar('PerUpdate/MeanEpisodeLength', mean_episode_length, update_count)
-                    sum_writer.add_scalar('Training/StdEpisodeLength', std_episode_length, episode_count // nbr_actors)
-                    sum_writer.add_scalar('PerObservation/StdEpisodeLength', std_episode_length, obs_count)
-                    sum_writer.add_scalar('PerUpdate/StdEpisodeLength', std_episode_length, update_count)
-                    
-                    # reset :
-                    trajectories = list()
-                    total_returns = list()
-                    total_int_returns = list()
-                    episode_lengths = list()
-
-                per_actor_trajectories[actor_index] = list()
-
-            pa_obs = observations[actor_index]
-            pa_a = action[actor_index]
-            pa_r = reward[actor_index]
-            pa_succ_obs = succ_observations[actor_index]
-            pa_done = done[actor_index]
-            pa_int_r = 0.0
-            
-            if getattr(agent.algorithm, "use_rnd", False):
-                get_intrinsic_reward = getattr(agent, "get_intrinsic_reward", None)
-                if callable(get_intrinsic_reward):
-                    pa_int_r = agent.get_intrinsic_reward(actor_index)
-            per_actor_trajectories[actor_index].append( (pa_obs, pa_a, pa_r, pa_int_r, pa_succ_obs, pa_done) )
-
-
-            if test_nbr_episode != 0 and obs_count % test_obs_interval == 0:
-                save_traj = False
-                if (benchmarking_record_episode_interval is not None and benchmarking_record_episode_interval>0):
-                    save_traj = (obs_count%benchmarking_record_episode_interval==0)
+                hook(env, agent, obs_count, batch)
+        
+        int_reward = None
+        if use_int_reward:
+            int_reward = [agent.get_intrinsic_reward(actor_index) for actor_index in range(nbr_actors)]
+        statistics.step(reward, int_reward=int_reward)
+
+        # Actors whose episode just ended, possibly only from the agent's perspective (e.g. life loss):
+        dones = np.array(done, dtype=bool)
+        episode_ends = np.array([is_episode_end(d, i) for d, i in zip(done, info)], dtype=bool)
+        reset_actor_indices = np.nonzero(np.logical_or(dones, episode_ends))[0]
+        if len(reset_actor_indices):
+            agent.reset_actors(indices=reset_actor_indices.tolist())
+
+        # Bookkeeping of the actors whose episode really ended:
+        ended_actor_indices = np.nonzero(episode_ends)[0].tolist()
+        if len(ended_actor_indices):
+            not_reset_indices = [actor_index for actor_index in ended_actor_indices if 'terminal_observation' not in info[actor_index]]
+            if len(not_reset_indices):
+                reset_observations = env.reset(env_configs=env_configs, env_indices=not_reset_indices)
+                # Rebuilding the batch, rather than assigning into it, since the agent
+                # may have cached its preprocessed version as the successor states:
+                reset_batch_indices = {actor_index: batch_index for batch_index, actor_index in enumerate(not_reset_indices)}
+                next_observations = batch_observations([ index_batch(reset_observations, reset_batch_indices[idx]) if idx in reset_batch_indices else index_batch(next_observations, idx)
+                                                         for idx in range(nbr_actors)])
+
+            update_count = agent.get_update_count()
+            # Scalars are gathered and written at once:
+            summaries = statistics.end_episodes(ended_actor_indices, obs_count, update_count)
+            for tag, value, step in summaries:
+                sum_writer.add_scalar(tag, value, step)
+
+        # Testing whenever the observation count crossed a multiple of the test interval:
+        if test_nbr_episode != 0 and obs_count // test_obs_interval > previous_obs_count // test_obs_interval:
+            save_traj = False
+            if (benchmarking_record_episode_interval is not None and benchmarking_record_episode_interval>0):
+                save_traj = (obs_count // benchmarking_record_episode_interval > previous_obs_count // benchmarking_record_episode_interval)
+            if evaluator is not None:
+                evaluator.evaluate(agent=agent, nbr_episode=test_nbr_episode, iteration=obs_count, save_traj=save_traj)
+            elif inference_server is not None:
+                inference_server.update(agent)
                 test_agent(env=test_env, 
-                            agent=agent.clone(training=False), 
+                            agent=inference_server.clients[0], 
+                            nbr_episode=test_nbr_episode, 
+                            sum_writer=sum_writer, 
+                            iteration=obs_count,
+                            base_path=base_path,
+                            save_traj=save_traj,
+                            update_count=agent.get_update_count())
+            else:
+                test_agent(env=test_env, 
+                            agent=PolicySnapshot(agent), 
                             nbr_episode=test_nbr_episode, 
                             sum_writer=sum_writer, 
                             iteration=obs_count,
                             base_path=base_path,
                             save_traj=save_traj)
 
-        observations = copy.deepcopy(succ_observations)
+        # No copy needed: see run_episode_parallel.
+        observations = next_observations
         
         if obs_count >= max_obs_count:  break
 
+    if evaluator is not None: evaluator.close()
+
     return agent
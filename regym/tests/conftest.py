@@ -0,0 +1,101 @@
+'''
+Dummy agents, algorithms and environments shared by the unit tests, e.g.:
+    from conftest import preprocess, DummyAlgorithm, DummyAgent, CountingEnv
+'''
+import numpy as np
+import torch
+
+from regym.rl_algorithms.agents.agent import Agent
+from regym.rl_algorithms.networks import CategoricalQNet, LSTMBody
+
+
+def preprocess(state, use_cuda=False):
+    return torch.from_numpy(state).float()
+
+
+def recurrent_q_net():
+    return CategoricalQNet(state_dim=1, action_dim=2, phi_body=LSTMBody(1, hidden_units=(4,)))
+
+
+class DummyAlgorithm():
+    '''
+    Algorithm that only holds a model, acting upon states of 3 features by default.
+    '''
+    def __init__(self, model_fn=lambda: torch.nn.Linear(3, 2), nbr_actor=1):
+        self.kwargs = {'state_preprocess': preprocess, 'use_cuda': False}
+        self.model = model_fn()
+        self.nbr_actor = nbr_actor
+
+    def get_models(self):
+        return {'model': self.model}
+
+    def get_nbr_actor(self):
+        return self.nbr_actor
+
+    def get_update_count(self):
+        return 0
+
+
+class DummyDQNAlgorithm(DummyAlgorithm):
+    '''
+    Algorithm that acts greedily, and only stores the experiences of each actor,
+    counting the calls to `train` once the storages hold :param min_capacity: experiences.
+    '''
+    def __init__(self, model_fn=lambda: torch.nn.Linear(3, 2), nbr_actor=1, min_capacity=1e9):
+        super(DummyDQNAlgorithm, self).__init__(model_fn=model_fn, nbr_actor=nbr_actor)
+        self.kwargs.update({'epsstart': 0.0, 'epsend': 0.0, 'epsdecay': 1.0,
+                            'min_capacity': min_capacity, 'batch_size': 1})
+        self.target_model = model_fn()
+        self.param_update_counter = 0
+        self.train_count = 0
+        self.reset_storages(nbr_actor=self.nbr_actor)
+
+    def get_models(self):
+        return {'model': self.model, 'target_model': self.target_model}
+
+    def get_epsilon(self, nbr_steps, strategy='exponential'):
+        return 0.0
+
+    def get_update_count(self):
+        return self.param_update_counter
+
+    def reset_storages(self, nbr_actor):
+        self.nbr_actor = nbr_actor
+        self.storages = [list() for _ in range(nbr_actor)]
+
+    def store(self, exp_dict, actor_index=0):
+        self.storages[actor_index].append(exp_dict)
+
+    def train(self, minibatch_size=None):
+        self.train_count += 1
+
+
+class DummyAgent(Agent):
+    '''
+    Agent that greedily acts upon the outputs of its algorithm's model.
+    '''
+    def take_action(self, state):
+        state = self.preprocessed_state_cache(state, use_cuda=False)
+        self.current_prediction = {'a': self.algorithm.model(state).argmax(dim=-1, keepdim=True).detach()}
+        return self.current_prediction['a'].numpy()
+
+
+class CountingEnv():
+    '''
+    Dummy environment whose episodes last for `episode_length` steps,
+    and whose observation is the number of steps taken in the current episode.
+    '''
+    def __init__(self, episode_length):
+        self.episode_length = episode_length
+        self.count = 0
+
+    def reset(self, env_config=None):
+        self.count = 0
+        return np.array([self.count])
+
+    def step(self, action):
+        self.count += 1
+        return np.array([self.count]), 1.0, self.count >= self.episode_length, {}
+
+    def close(self):
+        pass
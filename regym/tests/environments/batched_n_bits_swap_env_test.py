@@ -0,0 +1,62 @@
+import numpy as np
+
+from regym.environments.envs.gym_envs import BatchedNBitsSwapEnv
+from regym.environments.vec_env import batched_env_creator
+
+
+def test_step_flips_the_chosen_bits_of_all_envs():
+    env = BatchedNBitsSwapEnv(n=5, nbr_parallel_env=3, seed=0, gathering=True)
+    observations = env.reset()
+    assert observations['observation'].shape == (3, 5)
+
+    actions = np.array([0, 2, 4])
+    succ_observations, rewards, dones, infos = env.step(actions)
+    for idx, action in enumerate(actions):
+        expected_state = observations['observation'][idx].copy()
+        expected_state[action] = 1-expected_state[action]
+        assert np.array_equal(infos[idx]['latents']['s'], observations['observation'][idx])
+        assert np.array_equal(infos[idx]['latents']['succ_s'], expected_state)
+        if not dones[idx]:
+            assert np.array_equal(succ_observations['observation'][idx], expected_state)
+    # Previously handed over observations are left untouched:
+    assert not np.array_equal(observations['observation'], succ_observations['observation'])
+
+
+def test_solved_env_is_reset_when_gathering():
+    env = BatchedNBitsSwapEnv(n=3, nbr_parallel_env=2, seed=0, gathering=True)
+    observations = env.reset()
+    env.goal = observations['observation'].copy()
+    env.goal[:, 0] = 1-env.goal[:, 0]
+
+    succ_observations, rewards, dones, infos = env.step([0, 1])
+    assert dones == [True, False]
+    assert rewards.tolist() == [0, -1]
+    terminal_observation = infos[0]['terminal_observation']
+    assert np.array_equal(terminal_observation['achieved_goal'], terminal_observation['desired_goal'])
+    assert 'terminal_observation' not in infos[1]
+
+
+def test_done_envs_are_not_stepped_when_evaluating():
+    env = BatchedNBitsSwapEnv(n=2, nbr_parallel_env=2, seed=0, gathering=False)
+    observations = env.reset()
+    # A single flip cannot solve those goals:
+    env.goal = 1-observations['observation']
+    env.nbr_steps[0] = env.max_episode_steps-1
+    _, _, dones, _ = env.step([0, 0])
+    assert dones[0]
+
+    succ_observations, rewards, dones, infos = env.step([1])
+    assert succ_observations['observation'].shape == (1, 2)
+    assert infos[0] is None
+
+
+def test_batched_env_creator_copies_the_batched_envs():
+    env = BatchedNBitsSwapEnv(n=5, nbr_parallel_env=3, seed=0, gathering=True)
+    env.reset()
+    test_env = batched_env_creator(env, seed=1, gathering=False)()
+    assert isinstance(test_env, BatchedNBitsSwapEnv) and test_env is not env
+    assert test_env.get_nbr_envs() == 3 and not test_env.gathering
+    # The copy is reseeded, and does not share its arrays with the original environments:
+    test_observations = test_env.reset()
+    assert test_env.state is not env.state
+    assert test_observations['observation'].shape == (3, 5)
@@ -0,0 +1,30 @@
+from regym.environments import EnvConfigSchedule
+
+
+def test_schedule_samples_a_batch_of_configs():
+    schedule = EnvConfigSchedule({'tower-seed': list(range(100)), 'lighting-type': [0, 1, 2], 'total-floors': 10},
+                                 shared_params=['tower-seed'], seed=1)
+    env_configs = schedule.sample(nbr_envs=8)
+    
+    assert len(env_configs) == 8
+    assert len(set([env_config['tower-seed'] for env_config in env_configs])) == 1
+    assert all([env_config['lighting-type'] in [0, 1, 2] for env_config in env_configs])
+    assert all([env_config['total-floors'] == 10 for env_config in env_configs])
+    # Sampled values keep their type:
+    assert isinstance(env_configs[0]['lighting-type'], int)
+
+
+def test_schedule_update_moves_along_curriculum():
+    schedule = EnvConfigSchedule({'starting-floor': [0]})
+    schedule.update({'starting-floor': [5, 6]})
+    env_configs = schedule.sample(nbr_envs=4)
+    assert all([env_config['starting-floor'] in [5, 6] for env_config in env_configs])
+
+
+def test_schedule_draws_non_shared_params_for_each_env():
+    schedule = EnvConfigSchedule({'tower-seed': list(range(100)), 'lighting-type': list(range(100))},
+                                 shared_params=['tower-seed'], seed=2)
+    env_configs = schedule.sample(nbr_envs=16)
+    assert len(set([env_config['tower-seed'] for env_config in env_configs])) == 1
+    # Independent draws over 100 values hardly ever coincide for all 16 environments:
+    assert len(set([env_config['lighting-type'] for env_config in env_configs])) > 1
@@ -0,0 +1,86 @@
+import os
+import numpy as np
+import torch
+import pytest
+from PIL import Image
+from torchvision import transforms
+
+from regym.environments.envs.gym_envs import n_bits_swap_mnist_env
+from regym.environments.envs.gym_envs.n_bits_swap_mnist_env import NBitsSwapMNISTEnv, load_mnist_digits
+
+
+class FakeMNIST():
+    '''
+    Small stand-in for torchvision's MNIST, with random 28x28 digits, including digits that are neither zeros nor ones.
+    '''
+    instances = list()
+    targets_list = [0, 2, 1, 1, 0, 2, 1]
+
+    def __init__(self, root, train=True, transform=None, download=False):
+        rng = np.random.RandomState(0)
+        self.images = [Image.fromarray(rng.randint(0, 256, size=(28, 28)).astype(np.uint8)) for _ in FakeMNIST.targets_list]
+        self.targets = torch.tensor(FakeMNIST.targets_list)
+        self.transform = transform
+        FakeMNIST.instances.append(self)
+
+    def __getitem__(self, idx):
+        img = self.images[idx]
+        if self.transform is not None: img = self.transform(img)
+        return img, int(self.targets[idx])
+
+
+@pytest.fixture
+def fake_mnist(tmp_path, monkeypatch):
+    FakeMNIST.instances = list()
+    monkeypatch.setattr(n_bits_swap_mnist_env, 'MNIST', FakeMNIST)
+    monkeypatch.setattr(n_bits_swap_mnist_env, '_MNIST_DIGITS', dict())
+    # The environments load the digits from the temporary directory, rather than from the package's:
+    tmp_root = str(tmp_path)
+    monkeypatch.setattr(n_bits_swap_mnist_env, 'load_mnist_digits', lambda root, **kwargs: load_mnist_digits(tmp_root, **kwargs))
+    return tmp_root
+
+
+def old_indices2mnist(mnist, indices, obs_shape=[32, 32]):
+    '''
+    Former path of `NBitsSwapMNISTEnv._indices2mnist`, which resized each digit upon each observation.
+    :param indices: indices of the digits in :param mnist:.
+    '''
+    images = []
+    for idx in indices:
+        img, target = mnist[idx]
+        images.append(255*np.array(img).astype(np.float32).reshape((*obs_shape, 1)))
+    return np.concatenate(images, axis=-1)
+
+
+def test_gathered_digits_match_the_resized_digits(fake_mnist):
+    env = NBitsSwapMNISTEnv(n=4, simple=False)
+    env.seed(0)
+    observation = env.reset()['observation']
+    assert observation.shape == (32, 32, 4) and observation.dtype == np.float32
+
+    # The cached digits are the zeros and ones of the dataset, in order:
+    mnist = FakeMNIST(root=fake_mnist, transform=transforms.Compose([transforms.Resize(size=[32, 32])]))
+    mnist_indices = [idx for idx, target in enumerate(FakeMNIST.targets_list) if target in [0, 1]]
+    expected = old_indices2mnist(mnist, [mnist_indices[idx] for idx in env.obs_as_indices])
+    assert np.array_equal(observation, expected)
+
+
+def test_resized_digits_are_cached_on_disk(fake_mnist):
+    digits, targets = load_mnist_digits(fake_mnist, train=True, obs_shape=[32, 32])
+    assert len(FakeMNIST.instances) == 1
+    assert targets.tolist() == [0, 1, 1, 0, 1]
+    assert os.path.exists(os.path.join(fake_mnist, 'zeros_ones_train_32x32_digits.npy'))
+
+    # Another process (i.e. without the in-memory cache) loads the saved digits, without resizing them again:
+    n_bits_swap_mnist_env._MNIST_DIGITS.clear()
+    loaded_digits, loaded_targets = load_mnist_digits(fake_mnist, train=True, obs_shape=[32, 32])
+    assert len(FakeMNIST.instances) == 1
+    assert loaded_digits is not digits
+    assert np.array_equal(loaded_digits, digits) and np.array_equal(loaded_targets, targets)
+
+
+def test_environments_share_the_memory_mapped_digits(fake_mnist):
+    envs = [NBitsSwapMNISTEnv(n=3, simple=True) for _ in range(2)]
+    assert len(FakeMNIST.instances) == 1
+    assert isinstance(envs[0].digits, np.memmap)
+    assert envs[0].digits is envs[1].digits
@@ -0,0 +1,142 @@
+import time
+import numpy as np
+import pytest
+
+import regym.environments.parallel_env as parallel_env
+from regym.environments.parallel_env import ParallelEnv
+
+
+class FlakyEnv():
+    '''
+    Dummy environment that crashes on the first `nbr_failures` steps
+    taken across all its instances.
+    '''
+    nbr_failures = 0
+
+    def __init__(self, worker_id=None, seed=0):
+        self.count = 0
+
+    def reset(self, env_config=None):
+        self.count = 0
+        return np.array([self.count])
+
+    def step(self, action):
+        if FlakyEnv.nbr_failures > 0:
+            FlakyEnv.nbr_failures -= 1
+            raise RuntimeError('Environment crashed.')
+        self.count += action
+        return np.array([self.count]), 1.0, False, {}
+
+    def close(self):
+        pass
+
+
+def test_failed_worker_is_restarted_and_pending_action_replayed(monkeypatch):
+    # Threads share the class attribute counting the failures:
+    monkeypatch.setattr(parallel_env, 'USE_PROC', False)
+    FlakyEnv.nbr_failures = 1
+
+    env = ParallelEnv(FlakyEnv, nbr_parallel_env=2, gathering=False, 
+                      step_timeout=5.0, heartbeat_interval=0.05, heartbeat_timeout=1.0)
+    env.reset()
+    observations, rewards, dones, infos = env.step([2, 3])
+    
+    assert observations[:, 0].tolist() == [2, 3]
+    assert sum(env.get_restart_counts()) == 1
+    env.close()
+
+
+class HangingEnv(FlakyEnv):
+    '''
+    Dummy environment whose first `nbr_hangs` steps, taken across all its instances, hang for `hang_duration` seconds.
+    '''
+    nbr_hangs = 0
+    hang_duration = 3.0
+
+    def step(self, action):
+        if HangingEnv.nbr_hangs > 0:
+            HangingEnv.nbr_hangs -= 1
+            time.sleep(HangingEnv.hang_duration)
+        return super(HangingEnv, self).step(action)
+
+
+def test_hanging_worker_misses_its_step_deadline_and_is_restarted(monkeypatch):
+    monkeypatch.setattr(parallel_env, 'USE_PROC', False)
+    FlakyEnv.nbr_failures = 0
+    HangingEnv.nbr_hangs = 1
+
+    env = ParallelEnv(HangingEnv, nbr_parallel_env=2, gathering=False, 
+                      step_timeout=0.5, heartbeat_interval=0.05, heartbeat_timeout=0.5)
+    env.reset()
+    begin = time.time()
+    observations, rewards, dones, infos = env.step([2, 3])
+
+    # The hanging worker was detected by its step deadline, well before the end of its step:
+    assert time.time()-begin < HangingEnv.hang_duration
+    assert observations[:, 0].tolist() == [2, 3]
+    assert sum(env.get_restart_counts()) == 1
+    env.close()
+
+
+def test_slow_step_keeps_beating(monkeypatch):
+    monkeypatch.setattr(parallel_env, 'USE_PROC', False)
+    FlakyEnv.nbr_failures = 0
+    HangingEnv.nbr_hangs = 1
+    HangingEnv.hang_duration = 1.0
+
+    # Workers beat from a side thread, thus a step lasting longer than the heartbeat timeout is only bounded by its deadline:
+    env = ParallelEnv(HangingEnv, nbr_parallel_env=1, gathering=False, 
+                      step_timeout=5.0, heartbeat_interval=0.05, heartbeat_timeout=0.3)
+    env.reset()
+    observations, rewards, dones, infos = env.step([2])
+
+    assert observations[:, 0].tolist() == [2]
+    assert env.get_restart_counts() == [0]
+    HangingEnv.hang_duration = 3.0
+    env.close()
+
+
+class SlowResetEnv(FlakyEnv):
+    '''
+    Dummy environment whose episodes last for a single step, and whose resets, 
+    after the first one, take `reset_duration` seconds.
+    '''
+    reset_duration = 1.0
+
+    def reset(self, env_config=None):
+        if self.count > 0: time.sleep(SlowResetEnv.reset_duration)
+        return super(SlowResetEnv, self).reset(env_config)
+
+    def step(self, action):
+        obs, r, done, info = super(SlowResetEnv, self).step(action)
+        return obs, r, True, info
+
+
+def test_automatic_reset_is_bounded_by_the_reset_deadline(monkeypatch):
+    monkeypatch.setattr(parallel_env, 'USE_PROC', False)
+    FlakyEnv.nbr_failures = 0
+
+    env = ParallelEnv(SlowResetEnv, nbr_parallel_env=1, gathering=True, 
+                      step_timeout=0.3, reset_timeout=5.0, heartbeat_interval=0.05, heartbeat_timeout=0.3)
+    env.reset()
+    observations, rewards, dones, infos = env.step([2])
+
+    # The step triggered a reset, which outlasts the step deadline, but not the reset deadline:
+    assert env.get_restart_counts() == [0]
+    assert infos[0]['terminal_observation'].tolist() == [2]
+    assert observations[:, 0].tolist() == [0]
+    env.close()
+
+
+def test_worker_failing_repeatedly_raises(monkeypatch):
+    monkeypatch.setattr(parallel_env, 'USE_PROC', False)
+    FlakyEnv.nbr_failures = 1000
+
+    env = ParallelEnv(FlakyEnv, nbr_parallel_env=1, gathering=False, 
+                      step_timeout=5.0, heartbeat_interval=0.05, heartbeat_timeout=1.0, max_restarts=3)
+    env.reset()
+    with pytest.raises(RuntimeError):
+        env.step([1])
+    assert env.get_restart_counts() == [3]
+    FlakyEnv.nbr_failures = 0
+    env.close()
@@ -0,0 +1,162 @@
+import numpy as np
+
+from regym.environments.utils import batch_observations, index_batch, remove_from_batch, concatenate_batches
+from regym.environments.vec_env import VecEnv
+from regym.util.wrappers import LazyFrames
+
+
+def test_batch_observations_of_arrays():
+    observations = [np.full((2, 3), fill_value=i, dtype=np.uint8) for i in range(4)]
+    batch = batch_observations(observations)
+    assert batch.shape == (4, 2, 3)
+    assert batch.dtype == np.uint8
+    for i in range(4): assert (batch[i] == i).all()
+
+
+def test_batch_observations_of_lazyframes_matches_concatenation():
+    frames = [np.random.randint(0, 255, size=(5, 5, 1), dtype=np.uint8) for _ in range(4)]
+    observations = [LazyFrames(frames[:3]), LazyFrames(frames[1:])]
+    batch = batch_observations(observations)
+    assert batch.shape == (2, 5, 5, 3)
+    assert np.array_equal(batch[0], np.array(observations[0]))
+    assert np.array_equal(batch[1], np.array(observations[1]))
+
+
+def test_batch_observations_of_dicts():
+    observations = [{'observation': np.zeros(3), 'desired_goal': np.ones(3), 'mission': 'go'},
+                    {'observation': np.ones(3), 'desired_goal': np.zeros(3), 'mission': 'go fetch'}]
+    batch = batch_observations(observations)
+    assert set(batch.keys()) == {'observation', 'desired_goal', 'mission'}
+    assert batch['observation'].shape == (2, 3)
+    # Strings of different lengths must not be truncated:
+    assert batch['mission'][1] == 'go fetch'
+
+    element = index_batch(batch, 1)
+    assert np.array_equal(element['observation'], np.ones(3))
+
+    batch = remove_from_batch(batch, 0)
+    assert batch['observation'].shape == (1, 3)
+
+
+def test_batch_observations_flattening():
+    observations = [np.zeros((2, 2)), np.ones((2, 2))]
+    batch = batch_observations(observations, flatten=True)
+    assert batch.shape == (2, 4)
+
+
+class CountingEnv():
+    '''
+    Dummy environment whose episodes last for `episode_length` steps,
+    and whose observation is the number of steps taken in the current episode.
+    '''
+    def __init__(self, episode_length):
+        self.episode_length = episode_length
+        self.count = 0
+
+    def reset(self, env_config=None):
+        self.count = 0
+        return np.array([self.count])
+
+    def step(self, action):
+        self.count += 1
+        return np.array([self.count]), 1.0, self.count >= self.episode_length, {}
+
+    def close(self):
+        pass
+
+
+def test_vec_env_auto_resets_when_gathering():
+    env_creator = lambda worker_id=None, seed=0: CountingEnv(episode_length=2+seed)
+    env = VecEnv(env_creator, nbr_parallel_env=2, gathering=True)
+    observations = env.reset()
+    assert observations.shape == (2, 1)
+
+    # Episode of env 0 lasts for 3 steps, while env 1's lasts for 4 steps:
+    for _ in range(2): observations, _, dones, infos = env.step([0, 0])
+    observations, rewards, dones, infos = env.step([0, 0])
+    assert dones == [True, False]
+    assert infos[0]['terminal_observation'][0] == 3
+    assert 'terminal_observation' not in infos[1]
+    # Env 0 has already been reset, and the batch size is unchanged:
+    assert observations[:, 0].tolist() == [0, 3]
+
+    observations, rewards, dones, infos = env.step([0, 0])
+    assert dones == [False, True]
+    assert observations[:, 0].tolist() == [1, 0]
+
+
+def test_vec_env_does_not_auto_reset_when_evaluating():
+    env_creator = lambda worker_id=None, seed=0: CountingEnv(episode_length=1)
+    env = VecEnv(env_creator, nbr_parallel_env=1, gathering=False)
+    env.reset()
+    observations, _, dones, infos = env.step([0])
+    assert dones == [True]
+    assert 'terminal_observation' not in infos[0]
+    assert observations[0, 0] == 1
+
+
+def test_vec_env_parks_and_reuses_environments():
+    env_creator = lambda worker_id=None, seed=0: CountingEnv(episode_length=10)
+    env = VecEnv(env_creator, nbr_parallel_env=2, gathering=False)
+    env.reset()
+    launched_envs = list(env.env_processes)
+
+    env.set_nbr_envs(1)
+    observations = env.reset()
+    assert observations.shape == (1, 1)
+    observations, _, dones, _ = env.step([0])
+    assert len(dones) == 1
+
+    env.set_nbr_envs(3)
+    observations = env.reset()
+    assert observations.shape == (3, 1)
+    # Only the missing environment has been launched:
+    assert env.env_processes[:2] == launched_envs
+
+
+class InPlaceCountingEnv(CountingEnv):
+    '''
+    Dummy environment that updates its observation buffer in place.
+    '''
+    def __init__(self, episode_length):
+        super(InPlaceCountingEnv, self).__init__(episode_length=episode_length)
+        self.obs = np.zeros(1)
+
+    def reset(self, env_config=None):
+        self.count = 0
+        self.obs[0] = self.count
+        return self.obs
+
+    def step(self, action):
+        self.count += 1
+        self.obs[0] = self.count
+        return self.obs, 1.0, self.count >= self.episode_length, {}
+
+
+def test_vec_env_observations_are_owned_by_the_caller():
+    # The rollout loops rely on it to not copy the observations:
+    env_creator = lambda worker_id=None, seed=0: InPlaceCountingEnv(episode_length=10)
+    env = VecEnv(env_creator, nbr_parallel_env=2, gathering=True)
+    observations = env.reset()
+    succ_observations, _, _, _ = env.step([0, 0])
+    assert observations[:, 0].tolist() == [0, 0]
+    assert succ_observations[:, 0].tolist() == [1, 1]
+
+
+
+def test_vec_env_terminal_observations_are_owned_by_the_caller():
+    # The environment's buffer is updated in place upon the automatic reset:
+    env_creator = lambda worker_id=None, seed=0: InPlaceCountingEnv(episode_length=1)
+    env = VecEnv(env_creator, nbr_parallel_env=1, gathering=True)
+    env.reset()
+    observations, _, dones, infos = env.step([0])
+    assert dones == [True]
+    assert infos[0]['terminal_observation'][0] == 1
+    assert observations[0, 0] == 0
+
+
+def test_concatenate_batches_of_dictionnaries():
+    batches = [{'observation': np.zeros((2, 3))}, {'observation': np.ones((1, 3))}]
+    batch = concatenate_batches(batches)
+    assert batch['observation'].shape == (3, 3)
+    assert batch['observation'][2].tolist() == [1, 1, 1]
@@ -49,7 +49,7 @@ class LinearInterpolationHook(object):
         self.stop_value = stop_value
         self.setter = setter
 
-    def __call__(self, env, agent, step):
+    def __call__(self, env, agent, step, batch=None):
         value = np.interp(step,
                           [1, self.total_steps],
                           [self.start_value, self.stop_value])
@@ -0,0 +1,19 @@
+import torch
+
+from regym.rl_algorithms.agents.agent import acting_mode
+
+
+def test_acting_builds_no_graph():
+    model = torch.nn.Linear(3, 4)
+    obs = torch.rand(2, 3)
+
+    # The predictions of training agents end up in their storages, they must not be inference tensors:
+    with acting_mode(training=True):
+        prediction = model(obs)
+    assert not prediction.requires_grad
+    assert not prediction.is_inference()
+
+    with acting_mode(training=False):
+        prediction = model(obs)
+    assert not prediction.requires_grad
+    assert prediction.is_inference()
@@ -0,0 +1,32 @@
+import torch
+
+from regym.rl_algorithms.networks import CategoricalQNet, CategoricalActorCriticNet, FCBody
+from regym.rl_algorithms.networks import export_acting_model
+
+
+def test_exported_qnet_acts_greedily_like_the_qnet():
+    model = CategoricalQNet(state_dim=3, action_dim=4, phi_body=FCBody(3, hidden_units=(8,)))
+    obs = torch.rand(5, 3)
+    exported_model = export_acting_model(model, obs)
+    assert exported_model is not None
+
+    # The traced module shares the parameters of the model, and handles other batch sizes:
+    with torch.no_grad(): model.fc_critic.bias.add_(1.0)
+    obs = torch.rand(7, 3)
+    prediction = exported_model(obs)
+    assert (prediction['a'] == model(obs)['a']).all()
+    assert torch.allclose(prediction['qa'], model(obs)['qa'], atol=1e-6)
+
+
+def test_exported_actor_critic_provides_actions_and_values():
+    model = CategoricalActorCriticNet(state_dim=3, action_dim=4, phi_body=FCBody(3, hidden_units=(8,)))
+    obs = torch.rand(5, 3)
+    prediction = export_acting_model(model, obs)(obs)
+    assert prediction['a'].shape == (5,)
+    assert ((0 <= prediction['a']) & (prediction['a'] < 4)).all()
+    assert torch.allclose(prediction['v'], model(obs)['v'], atol=1e-6)
+
+
+def test_models_without_acting_module_are_not_exported():
+    model = CategoricalQNet(state_dim=3, action_dim=4, noisy=True)
+    assert export_acting_model(model, torch.rand(5, 3)) is None
@@ -0,0 +1,39 @@
+import torch
+
+from regym.rl_algorithms.agents.agent import Agent
+
+
+def build_recurrent_agent(nbr_actor):
+    # Bypassing the algorithm, only the rnn states bookkeeping is tested:
+    agent = Agent.__new__(Agent)
+    agent.nbr_actor = nbr_actor
+    agent.previously_done_actors = [False]*nbr_actor
+    agent.recurrent = True
+    agent.training = True
+    agent.rnn_states = {'phi_body': {'hidden': [torch.ones(nbr_actor, 4), torch.ones(nbr_actor, 2)],
+                                     'cell': [torch.ones(nbr_actor, 4), torch.ones(nbr_actor, 2)]}}
+    return agent
+
+
+def test_reset_actors_only_resets_the_given_actors_rnn_states():
+    agent = build_recurrent_agent(nbr_actor=3)
+    previous_rnn_states = agent.rnn_states
+    agent.reset_actors(indices=[1])
+
+    for key in ['hidden', 'cell']:
+        for t in agent.rnn_states['phi_body'][key]:
+            assert t[1].abs().sum() == 0
+            assert (t[[0, 2]] == 1).all()
+    # The previous states, that predictions may refer to, are left untouched:
+    assert (previous_rnn_states['phi_body']['hidden'][0] == 1).all()
+
+
+def test_post_process_keeps_the_input_rnn_states_of_the_prediction():
+    agent = build_recurrent_agent(nbr_actor=2)
+    next_rnn_states = Agent._apply_to_rnn_states(agent.rnn_states, lambda t: t*2)
+    prediction = {'a': torch.zeros(2, 1), 'rnn_states': agent.rnn_states, 'next_rnn_states': next_rnn_states}
+    prediction = agent._post_process(prediction)
+
+    assert (prediction['rnn_states']['phi_body']['hidden'][0] == 1).all()
+    assert (prediction['next_rnn_states']['phi_body']['hidden'][0] == 2).all()
+    assert (agent.rnn_states['phi_body']['hidden'][0] == 2).all()
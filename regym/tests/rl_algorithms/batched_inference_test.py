@@ -0,0 +1,112 @@
+import numpy as np
+import torch
+import pytest
+
+from regym.rl_algorithms.agents import PolicySnapshot, batched_take_action
+from regym.rl_algorithms.agents import batched_inference
+from regym.rl_algorithms.networks import CategoricalQNet, CategoricalActorCriticNet
+
+from conftest import DummyAlgorithm, DummyAgent
+
+
+requires_vmap = pytest.mark.skipif(batched_inference.vmap is None, reason='torch.func is not available')
+
+
+class GreedyNet(torch.nn.Module):
+    def __init__(self):
+        super(GreedyNet, self).__init__()
+        self.fc = torch.nn.Linear(3, 4)
+
+    def forward(self, obs):
+        qa = self.fc(obs)
+        return {'a': qa.max(dim=-1)[1], 'qa': qa}
+
+
+class NotVectorizableNet(GreedyNet):
+    def forward(self, obs):
+        # Data-dependent control flow cannot be vectorized:
+        if self.fc(obs).sum().item() > 0: return super(NotVectorizableNet, self).forward(obs)
+        return super(NotVectorizableNet, self).forward(-obs)
+
+
+class GreedyAgent(DummyAgent):
+    def take_action(self, state):
+        state = self.preprocessed_state_cache(state, use_cuda=False)
+        return self.act_from_prediction(self.algorithm.model(state))
+
+
+def record_batched_predictions(monkeypatch):
+    '''
+    :returns: list to which the results of the batched forward passes are appended
+              (None for the forward passes that did not complete).
+    '''
+    results = []
+    batched_predictions = batched_inference._batched_predictions
+    def recording_batched_predictions(agents, states):
+        results.append(None)
+        results[-1] = batched_predictions(agents, states)
+        return results[-1]
+    monkeypatch.setattr(batched_inference, '_batched_predictions', recording_batched_predictions)
+    return results
+
+
+@requires_vmap
+def test_batched_take_action_matches_individual_actions(monkeypatch):
+    batched_results = record_batched_predictions(monkeypatch)
+    agents = [GreedyAgent(name=f'dummy{i}', algorithm=DummyAlgorithm(GreedyNet, nbr_actor=2)) for i in range(3)]
+    snapshots = [PolicySnapshot(agent) for agent in agents]
+    states = [np.random.rand(2, 3) for _ in agents]
+
+    # The training agent acts on its own, the snapshots are batched if torch.func is available:
+    actions = batched_take_action([agents[0]]+snapshots, [states[0]]+states)
+    expected_actions = [agent.take_action(state) for agent, state in zip([agents[0]]+agents, [states[0]]+states)]
+    for action, expected_action in zip(actions, expected_actions):
+        assert (action == expected_action).all()
+    for snapshot, agent in zip(snapshots, agents):
+        assert torch.allclose(snapshot.current_prediction['qa'], agent.current_prediction['qa'], atol=1e-6)
+    # The snapshots were batched:
+    assert len(batched_results) == 1 and batched_results[0] is not None
+
+
+@requires_vmap
+def test_batched_take_action_with_categorical_q_nets(monkeypatch):
+    batched_results = record_batched_predictions(monkeypatch)
+    agents = [GreedyAgent(name=f'dqn{i}', algorithm=DummyAlgorithm(lambda: CategoricalQNet(state_dim=3, action_dim=4), nbr_actor=2)) for i in range(3)]
+    snapshots = [PolicySnapshot(agent) for agent in agents]
+    states = [np.random.rand(2, 3) for _ in agents]
+
+    actions = batched_take_action(snapshots, states)
+    assert len(batched_results) == 1 and batched_results[0] is not None
+    for action, agent, state in zip(actions, agents, states):
+        assert (action == agent.take_action(state)).all()
+
+
+@requires_vmap
+def test_batched_take_action_with_categorical_actor_critic_nets(monkeypatch):
+    batched_results = record_batched_predictions(monkeypatch)
+    agents = [GreedyAgent(name=f'ppo{i}', algorithm=DummyAlgorithm(lambda: CategoricalActorCriticNet(state_dim=3, action_dim=4), nbr_actor=2)) for i in range(3)]
+    snapshots = [PolicySnapshot(agent) for agent in agents]
+    states = [np.random.rand(2, 3) for _ in agents]
+
+    actions = batched_take_action(snapshots, states)
+    assert len(batched_results) == 1 and batched_results[0] is not None
+    for action, snapshot, agent, state in zip(actions, snapshots, agents, states):
+        # Actions are sampled, but the values are deterministic:
+        assert action.shape == agent.take_action(state).shape
+        assert torch.allclose(snapshot.current_prediction['v'], agent.current_prediction['v'], atol=1e-6)
+
+
+@requires_vmap
+def test_batched_take_action_gives_up_batching_architectures_that_cannot_be_vectorized(monkeypatch):
+    batched_results = record_batched_predictions(monkeypatch)
+    agents = [GreedyAgent(name=f'dummy{i}', algorithm=DummyAlgorithm(NotVectorizableNet, nbr_actor=2)) for i in range(2)]
+    snapshots = [PolicySnapshot(agent) for agent in agents]
+    states = [np.random.rand(2, 3) for _ in agents]
+
+    for _ in range(2):
+        actions = batched_take_action(snapshots, states)
+        for action, agent, state in zip(actions, agents, states):
+            assert (action == agent.take_action(state)).all()
+    # The vectorization failed once, and was not attempted again:
+    assert batched_results == [None]
+    assert snapshots[0].architecture_key in batched_inference._UNBATCHABLE_ARCHITECTURES
@@ -0,0 +1,67 @@
+import os
+import numpy as np
+import torch
+
+from regym.rl_algorithms.checkpoint_store import CheckpointStore
+from regym.rl_algorithms.agents import DQNAgent, PolicySnapshot
+from regym.rl_algorithms.networks import CategoricalQNet
+
+from conftest import DummyAlgorithm, DummyDQNAlgorithm, DummyAgent
+
+
+def batch_norm_model():
+    return torch.nn.Sequential(torch.nn.Linear(3, 4), torch.nn.BatchNorm1d(4), torch.nn.Linear(4, 2))
+
+
+def test_checkpoint_store_deduplicates_tensors(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    agent = DummyAgent(name='dummy', algorithm=DummyAlgorithm(batch_norm_model))
+    store.save(agent, key='checkpoint_episode_0.pt')
+    nbr_tensor_files = len(os.listdir(store.tensors_path))
+
+    # Only the last layer is updated:
+    with torch.no_grad(): agent.algorithm.model[2].weight.add_(1.0)
+    store.save(agent, key='checkpoint_episode_1.pt')
+    assert len(os.listdir(store.tensors_path)) == nbr_tensor_files+1
+    assert len(os.listdir(store.skeletons_path)) == 1
+    assert set(store.keys()) == {'checkpoint_episode_0.pt', 'checkpoint_episode_1.pt'}
+
+    loaded_agent = store.load('checkpoint_episode_1.pt')
+    assert loaded_agent.name == 'dummy'
+    for (name, tensor), loaded_tensor in zip(agent.algorithm.model.state_dict().items(), loaded_agent.algorithm.model.state_dict().values()):
+        assert torch.equal(tensor, loaded_tensor), name
+    assert isinstance(loaded_agent.algorithm.model[0].weight, torch.nn.Parameter)
+
+
+def test_checkpoint_store_shares_the_skeleton_of_policy_snapshots(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    agent = DQNAgent(name='dqn', algorithm=DummyDQNAlgorithm(lambda: CategoricalQNet(state_dim=3, action_dim=2)))
+    state = np.random.rand(2, 3)
+
+    for episode in range(2):
+        # The agent acts, and trains, in between the checkpoints:
+        agent.take_action(state)
+        agent.nbr_steps += 10
+        agent.algorithm.param_update_counter += 1
+        with torch.no_grad(): agent.algorithm.model.fc_critic.bias.add_(1.0)
+        store.save(PolicySnapshot(agent), key=f'checkpoint_episode_{episode}.pt')
+    # The counters and the predictions of the actors are not part of the skeleton:
+    assert len(os.listdir(store.skeletons_path)) == 1
+
+    loaded_snapshot = store.load('checkpoint_episode_1.pt')
+    assert isinstance(loaded_snapshot, PolicySnapshot)
+    assert loaded_snapshot.nbr_steps == agent.nbr_steps
+    assert loaded_snapshot.algorithm.param_update_counter == 2
+    # The training-only model was not saved:
+    assert loaded_snapshot.algorithm.target_model is None
+    assert (loaded_snapshot.take_action(state) == agent.take_action(state)).all()
+    assert torch.equal(loaded_snapshot.current_prediction['qa'], agent.current_prediction['qa'])
+
+
+def test_checkpoint_store_keeps_the_entries_of_every_writer(tmp_path):
+    # Two stores of the same directory, e.g. within two training processes:
+    stores = [CheckpointStore(str(tmp_path)) for _ in range(2)]
+    for idx, store in enumerate(stores):
+        store.save(DummyAgent(name=f'dummy{idx}', algorithm=DummyAlgorithm(batch_norm_model)), key=f'checkpoint_{idx}.pt')
+    assert set(stores[0].keys()) == {'checkpoint_0.pt', 'checkpoint_1.pt'}
+    assert stores[1].load('checkpoint_0.pt').name == 'dummy0'
@@ -0,0 +1,39 @@
+import torch
+
+from regym.rl_algorithms.algorithms.algorithm import MixedPrecision
+from regym.rl_algorithms.replay_buffers import compress, decompress
+from regym.rl_algorithms.replay_buffers.compression import CompressedTensor
+
+
+def test_observations_are_only_compressed_when_lossless():
+    pixels = torch.randint(0, 256, (1, 3, 4, 4)).float()/255.0
+    bits = torch.randint(0, 2, (1, 8)).float()
+    for observation in [pixels, bits]:
+        compressed = compress(observation)
+        assert isinstance(compressed, CompressedTensor)
+        assert compressed.data.dtype == torch.uint8
+        assert torch.equal(decompress(compressed), observation)
+
+    noise = torch.rand(1, 8)
+    assert compress(noise) is noise
+    assert decompress(noise) is noise
+
+
+def test_mixed_precision_training_step_on_cpu():
+    assert MixedPrecision({'use_cuda': False}).dtype is None
+
+    mixed_precision = MixedPrecision({'mixed_precision': True, 'use_cuda': False})
+    # bfloat16 gradients need no scaling:
+    assert mixed_precision.dtype == torch.bfloat16
+    assert mixed_precision.scaler is None
+
+    model = torch.nn.Linear(3, 2)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    weight = model.weight.detach().clone()
+    with mixed_precision.autocast():
+        loss = model(torch.rand(4, 3)).pow(2).mean()
+    mixed_precision.backward(loss)
+    mixed_precision.unscale_(optimizer)
+    mixed_precision.step(optimizer)
+    assert not torch.equal(model.weight, weight)
+    assert model.weight.dtype == torch.float32
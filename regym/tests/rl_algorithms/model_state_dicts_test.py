@@ -0,0 +1,26 @@
+import torch
+
+from regym.rl_algorithms.algorithms.algorithm import get_model_state_dicts, load_model_state_dicts
+
+from conftest import DummyDQNAlgorithm
+
+
+class DummyAlgorithmWrapper():
+    def __init__(self, algorithm):
+        self.algorithm = algorithm
+        self.predictor = torch.nn.Linear(2, 1)
+
+
+def test_model_state_dicts_are_detached_copies():
+    algorithm = DummyAlgorithmWrapper(DummyDQNAlgorithm())
+    state_dicts = get_model_state_dicts(algorithm)
+    assert set(state_dicts.keys()) == {'predictor', 'algorithm.model', 'algorithm.target_model'}
+
+    # Training goes on without affecting the snapshot:
+    with torch.no_grad(): algorithm.algorithm.model.weight.add_(1.0)
+    assert not torch.equal(state_dicts['algorithm.model']['weight'], algorithm.algorithm.model.weight)
+
+    other_algorithm = DummyAlgorithmWrapper(DummyDQNAlgorithm())
+    load_model_state_dicts(other_algorithm, state_dicts)
+    assert torch.equal(other_algorithm.predictor.weight, algorithm.predictor.weight)
+    assert torch.equal(other_algorithm.algorithm.model.weight, state_dicts['algorithm.model']['weight'])
@@ -0,0 +1,98 @@
+import numpy as np
+import torch
+
+from regym.rl_algorithms.agents import MixedStrategyAgent
+from regym.rl_algorithms.agents.policy_snapshot import PolicySnapshot, snapshot_policy
+from regym.rl_algorithms.algorithms.algorithm import get_model_state_dicts
+from regym.environments.vec_env import VecEnv
+from regym.rl_loops.multiagent_loops import simultaneous_action_rl_loop
+
+from conftest import DummyDQNAlgorithm, DummyAgent
+
+
+class DummyTrainingAlgorithm(DummyDQNAlgorithm):
+    def __init__(self):
+        super(DummyTrainingAlgorithm, self).__init__(nbr_actor=2)
+        self.optimizer = torch.optim.Adam(self.model.parameters())
+
+
+def test_policy_snapshot_only_holds_the_acting_model():
+    agent = DummyAgent(name='dummy', algorithm=DummyTrainingAlgorithm())
+    snapshot = PolicySnapshot(agent)
+
+    assert not snapshot.training
+    assert snapshot.algorithm.target_model is None
+    assert snapshot.algorithm.optimizer is None
+    assert snapshot.algorithm.storages is None
+    assert snapshot.algorithm.model is not agent.algorithm.model
+
+    state = np.random.rand(2, 3)
+    assert (snapshot.take_action(state) == agent.take_action(state)).all()
+    # Acting does not touch the agent's storages:
+    snapshot.handle_experience(state, snapshot.current_prediction['a'].numpy(), np.zeros(2), state, [False, False])
+    assert all(len(storage) == 0 for storage in agent.algorithm.storages)
+
+    # Training goes on without affecting the snapshot, until it is updated:
+    with torch.no_grad(): agent.algorithm.model.weight.add_(1.0)
+    assert not torch.equal(snapshot.algorithm.model.weight, agent.algorithm.model.weight)
+    snapshot.update(get_model_state_dicts(agent.algorithm), counters={'handled_experiences': 10})
+    assert torch.equal(snapshot.algorithm.model.weight, agent.algorithm.model.weight)
+    assert snapshot.handled_experiences == 10
+
+
+def test_half_precision_policy_snapshot_acts_in_single_precision():
+    agent = DummyAgent(name='dummy', algorithm=DummyTrainingAlgorithm())
+    snapshot = PolicySnapshot(agent, half_precision=True)
+    assert snapshot.algorithm.model.weight.dtype == torch.float16
+
+    snapshot.take_action(np.random.rand(2, 3))
+    assert snapshot.algorithm.model.weight.dtype == torch.float32
+
+
+class TwoPlayerCountingEnv():
+    '''
+    Dummy two-player environment whose episodes last for `episode_length` steps.
+    '''
+    def __init__(self, episode_length):
+        self.episode_length = episode_length
+        self.count = 0
+
+    def reset(self, env_config=None):
+        self.count = 0
+        return [np.zeros(3), np.zeros(3)]
+
+    def step(self, action_vector):
+        self.count += 1
+        observations = [np.full(3, self.count, dtype=np.float64)]*2
+        return observations, [0.0, 0.0], self.count >= self.episode_length, {}
+
+    def close(self):
+        pass
+
+
+def test_policy_snapshots_play_single_environment_episodes():
+    agent = DummyAgent(name='dummy', algorithm=DummyTrainingAlgorithm())
+    agent_vector = [PolicySnapshot(agent), snapshot_policy(MixedStrategyAgent(support_vector=[1, 0, 0], name='RockAgent'))]
+    # The done flag of a single environment is a boolean:
+    trajectory = simultaneous_action_rl_loop.run_episode(TwoPlayerCountingEnv(episode_length=3), agent_vector, training=True)
+    assert len(trajectory) == 3
+
+
+def test_policy_snapshots_play_parallel_episodes_of_different_lengths():
+    agent = DummyAgent(name='dummy', algorithm=DummyTrainingAlgorithm())
+    agent_vector = [PolicySnapshot(agent), PolicySnapshot(agent)]
+    # Episode of env 0 lasts for 3 steps, while env 1's lasts for 4 steps:
+    env_creator = lambda worker_id=None, seed=0: TwoPlayerCountingEnv(episode_length=2+seed)
+    env = VecEnv(env_creator, nbr_parallel_env=2, single_agent=False, gathering=False)
+    trajectories = simultaneous_action_rl_loop.run_episode_parallel(env, agent_vector, training=True, self_play=False)
+    assert [len(t) for t in trajectories] == [3, 4]
+    for snapshot in agent_vector:
+        assert snapshot.previously_done_actors == [True, True]
+
+
+def test_only_agents_with_acting_models_are_snapshot():
+    assert isinstance(snapshot_policy(DummyAgent(name='dummy', algorithm=DummyTrainingAlgorithm())), PolicySnapshot)
+    rock_agent = MixedStrategyAgent(support_vector=[1, 0, 0], name='RockAgent')
+    frozen_rock_agent = snapshot_policy(rock_agent)
+    assert isinstance(frozen_rock_agent, MixedStrategyAgent)
+    assert frozen_rock_agent is not rock_agent
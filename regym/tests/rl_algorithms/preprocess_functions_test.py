@@ -0,0 +1,67 @@
+import numpy as np
+import cv2
+
+from regym.rl_algorithms.networks import ResizeCNNPreprocessFunction, ResizeCNNInterpolationFunction
+
+
+def test_batched_cv2_resize_matches_per_channel_resize():
+    x = np.random.randint(0, 255, size=(3, 20, 20, 4)).astype(np.float32)
+    resized = ResizeCNNInterpolationFunction(x, size=12, normalize_rgb_values=False)
+    assert resized.shape == (3, 4, 12, 12)
+    
+    for b in range(x.shape[0]):
+        for c in range(x.shape[-1]):
+            expected = cv2.resize(x[b, ..., c], (12, 12))
+            assert np.allclose(resized[b, c].numpy(), expected, atol=1e-4)
+
+
+def test_batched_pil_like_resize_shape_and_range():
+    x = np.random.randint(0, 255, size=(2, 30, 30, 6)).astype(np.uint8)
+    resized = ResizeCNNPreprocessFunction(x, size=16)
+    assert resized.shape == (2, 6, 16, 16)
+    assert resized.min() >= 0. and resized.max() <= 1.
+
+    single = ResizeCNNPreprocessFunction(x[0], size=16)
+    assert single.shape == (1, 6, 16, 16)
+
+
+def test_preprocessed_state_cache_preprocesses_each_state_once():
+    from regym.rl_algorithms.agents.agent import PreprocessedStateCache
+    from regym.rl_algorithms.networks import PreprocessFunction
+    calls = []
+    def preprocess(x, use_cuda=False):
+        calls.append(x)
+        return PreprocessFunction(x, use_cuda=use_cuda)
+    cache = PreprocessedStateCache(preprocess)
+
+    s = np.ones((2, 3))
+    succ_s = np.zeros((2, 3))
+    # take_action(s), handle_experience(s, succ_s), take_action(succ_s):
+    preprocessed_s = cache(s)
+    experience_s, preprocessed_succ_s = cache.preprocess_experience(s, succ_s)
+    assert experience_s is preprocessed_s
+    assert cache(succ_s) is preprocessed_succ_s
+    assert len(calls) == 2
+
+    # Equal but distinct states are preprocessed again:
+    cache(succ_s.copy())
+    assert len(calls) == 3
+
+
+def test_preprocessed_state_cache_handles_observations_updated_in_place():
+    from regym.rl_algorithms.agents.agent import PreprocessedStateCache
+    from regym.rl_algorithms.networks import PreprocessFunction
+    cache = PreprocessedStateCache(PreprocessFunction)
+
+    # The environment refills the same buffer at each step:
+    observation = np.zeros((1, 3))
+    cache(observation)
+    observation[:] = 255.0
+    s, succ_s = cache.preprocess_experience(observation, observation)
+    assert s.sum().item() == 0.0 and succ_s.sum().item() == 3.0
+
+    # The successor state is handed over to the next step only:
+    assert cache(observation) is succ_s
+    observation[:] = 510.0
+    s, succ_s = cache.preprocess_experience(observation, observation)
+    assert s.sum().item() == 3.0 and succ_s.sum().item() == 6.0
@@ -0,0 +1,101 @@
+import numpy as np
+import torch
+import pytest
+
+from regym.rl_algorithms.agent_hook import AgentHook, UnhookedAgentCache, agent_nbytes
+from regym.rl_algorithms.agents import DQNAgent
+from regym.rl_algorithms.agents.policy_snapshot import PolicySnapshot
+
+from conftest import DummyAlgorithm, DummyDQNAlgorithm, DummyAgent
+
+
+def large_agent():
+    return DummyAgent(name='dummy', algorithm=DummyAlgorithm(lambda: torch.nn.Linear(10, 10)))
+
+
+def test_unhooked_agent_cache_evicts_least_recently_used_agents():
+    agents = [large_agent() for _ in range(3)]
+    nbytes = agent_nbytes(agents[0])
+    assert nbytes == (10*10+10)*4
+
+    cache = UnhookedAgentCache(byte_budget=2*nbytes)
+    cache.put('a.pt', agents[0])
+    cache.put('b.pt', agents[1])
+    assert cache.get('a.pt') is agents[0]
+    # 'b.pt' is now the least recently used agent:
+    cache.put('c.pt', agents[2])
+    assert cache.get('b.pt') is None
+    assert cache.get('a.pt') is agents[0]
+    assert cache.get('c.pt') is agents[2]
+    assert cache.nbytes == 2*nbytes
+
+    # Agents bigger than the budget are not cached:
+    cache.byte_budget = nbytes-1
+    cache.put('d.pt', large_agent())
+    assert cache.get('d.pt') is None
+
+    # Lowering the budget evicts the least recently used agents:
+    cache.byte_budget = 2*nbytes
+    cache.put('d.pt', large_agent())
+    cache.set_byte_budget(nbytes)
+    assert cache.get('c.pt') is None
+    assert cache.nbytes == nbytes
+
+
+@pytest.fixture
+def saved_snapshot_hook(tmp_path, monkeypatch):
+    AgentHook.unhooked_agent_cache.clear()
+    load_paths = []
+    torch_load = torch.load
+    def counting_load(path, *args, **kwargs):
+        load_paths.append(path)
+        return torch_load(path, *args, **kwargs)
+    monkeypatch.setattr(torch, 'load', counting_load)
+
+    agent = DummyAgent(name='dummy', algorithm=DummyAlgorithm())
+    save_path = str(tmp_path / 'dummy.pt')
+    yield agent, AgentHook(PolicySnapshot(agent), save_path=save_path), load_paths
+    AgentHook.unhooked_agent_cache.clear()
+
+
+def test_unhooked_snapshots_are_loaded_once_and_not_shared(saved_snapshot_hook):
+    agent, hook, load_paths = saved_snapshot_hook
+    first = AgentHook.unhook(hook, nbr_actor=4)
+    second = AgentHook.unhook(hook)
+    assert len(load_paths) == 1
+    assert isinstance(first, PolicySnapshot) and isinstance(second, PolicySnapshot)
+    # Each unhook call gets its own agent, whose actors are not affected by the others':
+    assert first is not second
+    assert first.algorithm.model is not second.algorithm.model
+    assert first.nbr_actor == 4 and second.nbr_actor == 1
+    state = np.random.rand(1, 3)
+    assert (second.take_action(state) == agent.take_action(state)).all()
+
+
+def test_unhooked_snapshots_are_invalidated_when_saved_anew(saved_snapshot_hook):
+    agent, hook, load_paths = saved_snapshot_hook
+    AgentHook.unhook(hook)
+    with torch.no_grad(): agent.algorithm.model.weight.add_(1.0)
+    hook = AgentHook(PolicySnapshot(agent), save_path=hook.save_path)
+    unhooked_agent = AgentHook.unhook(hook)
+    assert len(load_paths) == 2
+    assert torch.equal(unhooked_agent.algorithm.model.weight, agent.algorithm.model.weight)
+
+
+def test_training_agents_are_not_cached(tmp_path):
+    AgentHook.unhooked_agent_cache.clear()
+    agent = DQNAgent(name='dqn', algorithm=DummyDQNAlgorithm())
+    hook = AgentHook(agent, save_path=str(tmp_path / 'dqn.pt'))
+    assert AgentHook.unhook(hook) is not AgentHook.unhook(hook)
+    assert AgentHook.unhooked_agent_cache.get(hook.save_path) is None
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason='requires a GPU')
+def test_unhooked_snapshots_devices_are_not_shared(saved_snapshot_hook):
+    agent, hook, load_paths = saved_snapshot_hook
+    cuda_agent = AgentHook.unhook(hook, use_cuda=True)
+    assert cuda_agent.algorithm.model.weight.is_cuda
+    cpu_agent = AgentHook.unhook(hook)
+    assert not cpu_agent.algorithm.kwargs['use_cuda']
+    assert not cpu_agent.algorithm.model.weight.is_cuda
+    assert len(load_paths) == 1
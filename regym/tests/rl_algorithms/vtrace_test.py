@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+import torch
+
+from regym.rl_algorithms.algorithms.vtrace import vtrace, compute_vtrace_advantages_and_returns
+from regym.rl_algorithms.networks import CategoricalActorCriticNet
+from regym.rl_algorithms.replay_buffers import Storage
+
+
+def discounted_returns(rewards, non_terminals, bootstrap_value, discount):
+    returns = []
+    ret = bootstrap_value
+    for r, nt in zip(reversed(rewards), reversed(non_terminals)):
+        ret = r + discount * nt * ret
+        returns.insert(0, ret)
+    return torch.tensor(returns).view(-1, 1)
+
+
+def test_vtrace_on_policy_targets_are_the_bootstrapped_returns():
+    rewards = torch.tensor([1.0, 0.0, 2.0, 1.0])
+    # The 2nd step ends an episode:
+    non_terminals = torch.tensor([1.0, 0.0, 1.0, 1.0])
+    values = torch.tensor([0.5, 0.2, 0.3, 0.1])
+    bootstrap_value = torch.tensor([[0.7]])
+    log_pi_a = torch.log(torch.tensor([0.2, 0.5, 0.9, 0.4]))
+
+    vs, pg_advantages = vtrace(log_pi_a, log_pi_a, rewards, values, bootstrap_value, non_terminals, discount=0.9)
+
+    expected_vs = discounted_returns(rewards.tolist(), non_terminals.tolist(), 0.7, discount=0.9)
+    assert torch.allclose(vs, expected_vs)
+    next_vs = torch.cat([vs[1:], bootstrap_value], dim=0)
+    assert torch.allclose(pg_advantages, rewards.view(-1, 1) + 0.9 * non_terminals.view(-1, 1) * next_vs - values.view(-1, 1))
+
+
+def test_vtrace_truncates_the_importance_weights():
+    rewards = torch.tensor([1.0])
+    values = torch.tensor([0.5])
+    bootstrap_value = torch.tensor([[0.0]])
+    non_terminals = torch.tensor([0.0])
+
+    # Actions that are more likely under the target policy are truncated to the on-policy targets:
+    vs, _ = vtrace(torch.log(torch.tensor([0.1])), torch.log(torch.tensor([0.8])), rewards, values, bootstrap_value, non_terminals, discount=0.9)
+    assert torch.allclose(vs, torch.tensor([[1.0]]))
+    # Otherwise, the temporal difference is weighted by the importance weight:
+    vs, pg_advantages = vtrace(torch.log(torch.tensor([0.8])), torch.log(torch.tensor([0.2])), rewards, values, bootstrap_value, non_terminals, discount=0.9)
+    assert torch.allclose(vs, torch.tensor([[0.5 + 0.25 * 0.5]]))
+    assert torch.allclose(pg_advantages, torch.tensor([[0.25 * 0.5]]))
+
+
+def test_vtrace_advantages_and_returns_fill_the_storage():
+    torch.manual_seed(0)
+    model = CategoricalActorCriticNet(state_dim=1, action_dim=2)
+    storage = Storage()
+    algorithm = SimpleNamespace(model=model, storages=[storage], recurrent=False, kwargs={'use_cuda': False, 'discount': 0.9})
+
+    # On-policy trajectory of 3 steps, which does not end an episode:
+    with torch.no_grad():
+        for step in range(3):
+            state = torch.tensor([[float(step)]])
+            prediction = model(state)
+            storage.add({'s': state, 'a': prediction['a'], 'r': torch.ones(1), 'succ_s': torch.tensor([[float(step+1)]]),
+                         'non_terminal': torch.ones(1), 'log_pi_a': prediction['log_pi_a'], 'v': prediction['v']})
+        bootstrap_value = model(torch.tensor([[3.0]]))['v']
+    storage.placeholder()
+
+    compute_vtrace_advantages_and_returns(algorithm, storage_idx=0)
+
+    expected_returns = discounted_returns([1.0]*3, [1.0]*3, bootstrap_value.item(), discount=0.9)
+    assert torch.allclose(torch.cat(storage.ret[:-1], dim=0), expected_returns, atol=1e-5)
+    values = torch.cat(storage.v, dim=0).view(-1, 1)
+    next_returns = torch.cat([expected_returns[1:], bootstrap_value.view(1, 1)], dim=0)
+    assert torch.allclose(torch.cat(storage.adv[:-1], dim=0), 1.0 + 0.9 * next_returns - values, atol=1e-5)
+    # The N+1 spots hold the bootstrap value and dummy advantages:
+    assert torch.allclose(storage.ret[-1], bootstrap_value.view(1, 1))
+    assert storage.adv[-1].sum().item() == 0.0
@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+import torch
+import pytest
+
+from regym.rl_algorithms.agents import DQNAgent, PPOAgent
+from regym.rl_algorithms.agents.agent import Agent
+from regym.rl_algorithms.networks import CategoricalQNet, CategoricalActorCriticNet
+from regym.rl_algorithms.replay_buffers import Storage
+from regym.environments.vec_env import VecEnv
+from regym.rl_loops.singleagent_loops.actor_learner_loop import gather_experience_actor_learner
+
+from conftest import preprocess, DummyDQNAlgorithm, CountingEnv
+
+
+def q_net():
+    return CategoricalQNet(state_dim=1, action_dim=2)
+
+
+def test_actor_learner_gathers_the_experience_of_every_environment():
+    env_creator = lambda worker_id=None, seed=0: CountingEnv(episode_length=2+seed%3)
+    task = SimpleNamespace(env=VecEnv(env_creator, nbr_parallel_env=2, gathering=True), test_env=None)
+    agent = DQNAgent(name='dqn', algorithm=DummyDQNAlgorithm(q_net))
+
+    agent = gather_experience_actor_learner(task, agent, nbr_actor_processes=2, max_obs_count=40,
+                                            weights_broadcast_interval=2, test_nbr_episode=0, actor_timeout=10.0)
+
+    assert agent.handled_experiences >= 40
+    # The learner counts the steps of the actors, for their epsilon-greedy exploration:
+    assert agent.nbr_steps == agent.handled_experiences
+    storages = agent.algorithm.storages
+    assert len(storages) == 4
+    # Only the actors' own transitions are stored, without any padding:
+    assert sum([len(storage) for storage in storages]) == agent.handled_experiences
+    for storage in storages:
+        assert len(storage) > 0
+        # Each environment's storage holds its consecutive observations, from its own actor:
+        for exp, next_exp in zip(storage[:-1], storage[1:]):
+            if exp['non_terminal'].item() == 1.0:
+                assert torch.equal(exp['succ_s'], next_exp['s'])
+
+
+def test_actor_learner_trains_once_per_batch_of_all_the_actors():
+    env_creator = lambda worker_id=None, seed=0: CountingEnv(episode_length=3)
+    task = SimpleNamespace(env=VecEnv(env_creator, nbr_parallel_env=2, gathering=True), test_env=None)
+    agent = DQNAgent(name='dqn', algorithm=DummyDQNAlgorithm(q_net, min_capacity=0))
+
+    agent = gather_experience_actor_learner(task, agent, nbr_actor_processes=2, max_obs_count=40,
+                                            weights_broadcast_interval=2, test_nbr_episode=0, actor_timeout=10.0)
+
+    # As in the lockstep loop, the replay period counts batches of 4 observations, one per actor,
+    # even though each actor process only provides 2 observations at a time:
+    assert agent.handled_experiences == 40
+    assert agent.replay_period_count == 10
+    assert agent.algorithm.train_count == 10
+
+
+class DummyOnPolicyAlgorithm():
+    '''
+    On-policy algorithm that only records the trajectories it is trained on.
+    '''
+    def __init__(self, horizon):
+        self.kwargs = {'state_preprocess': preprocess, 'use_cuda': False, 'horizon': horizon}
+        self.model = CategoricalActorCriticNet(state_dim=1, action_dim=2)
+        self.use_rnd = False
+        self.nbr_actor = 1
+        self.trained_storage_lengths = []
+        self.reset_storages(nbr_actor=self.nbr_actor)
+
+    def get_models(self):
+        return {'model': self.model}
+
+    def get_nbr_actor(self):
+        return self.nbr_actor
+
+    def reset_storages(self, nbr_actor=None):
+        if nbr_actor is not None: self.nbr_actor = nbr_actor
+        self.storages = [Storage() for _ in range(self.nbr_actor)]
+
+    def train(self):
+        self.trained_storage_lengths.append([len(storage) for storage in self.storages])
+        self.reset_storages()
+
+
+def test_actor_learner_corrects_on_policy_trajectories_with_vtrace():
+    env_creator = lambda worker_id=None, seed=0: CountingEnv(episode_length=3)
+    task = SimpleNamespace(env=VecEnv(env_creator, nbr_parallel_env=2, gathering=True), test_env=None)
+    agent = PPOAgent(name='ppo', algorithm=DummyOnPolicyAlgorithm(horizon=4))
+
+    agent = gather_experience_actor_learner(task, agent, nbr_actor_processes=2, max_obs_count=40,
+                                            weights_broadcast_interval=2, test_nbr_episode=0, actor_timeout=10.0)
+
+    assert agent.algorithm.kwargs['use_vtrace']
+    # The algorithm trains once horizon*nbr_actors = 16 observations have been handled:
+    trained_storage_lengths = agent.algorithm.trained_storage_lengths
+    assert len(trained_storage_lengths) == 2
+    assert all([sum(lengths) == 16 for lengths in trained_storage_lengths])
+    # The behaviour policy's log-probabilities are stored along the trajectories, for the V-trace correction:
+    for storage in agent.algorithm.storages:
+        assert len(storage.log_pi_a) == len(storage.s)
+
+
+class UnsupportedAgent(Agent):
+    pass
+
+
+def test_actor_learner_refuses_unsupported_agents():
+    algorithm = DummyDQNAlgorithm(q_net)
+    task = SimpleNamespace(env=VecEnv(lambda worker_id=None, seed=0: CountingEnv(episode_length=2), nbr_parallel_env=1), test_env=None)
+    with pytest.raises(NotImplementedError):
+        gather_experience_actor_learner(task, UnsupportedAgent(name='unsupported', algorithm=algorithm), test_nbr_episode=0)
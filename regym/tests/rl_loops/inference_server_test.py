@@ -0,0 +1,115 @@
+import time
+import queue
+from threading import Thread
+import numpy as np
+import torch
+import pytest
+from torch.multiprocessing import Value
+
+from regym.rl_algorithms.agents.agent import unwrap_agent
+from regym.rl_algorithms.agents import PolicySnapshot, DQNAgent
+from regym.environments.vec_env import VecEnv
+from regym.rl_loops.singleagent_loops.rl_loop import run_episode_parallel
+from regym.rl_loops.inference_server import inference_server_worker, InferenceClient, InferenceServer
+
+from conftest import DummyAlgorithm, DummyDQNAlgorithm, DummyAgent, CountingEnv, recurrent_q_net
+
+
+def test_inference_server_batches_the_clients_requests():
+    agent = DummyAgent(name='dummy', algorithm=DummyAlgorithm())
+    request_queue = queue.Queue()
+    response_queues = [queue.Queue() for _ in range(2)]
+    clients = [InferenceClient(client_id, agent.name, request_queue, response_queue) for client_id, response_queue in enumerate(response_queues)]
+
+    states = [np.random.rand(2, 3), np.random.rand(3, 3)]
+    for client, state in zip(clients, states):
+        request_queue.put((client.client_id, 'act', state))
+    request_queue.put(None)
+    inference_server_worker(PolicySnapshot(agent), request_queue, response_queues, max_batch_size=256, max_latency=1.0)
+
+    for response_queue, state in zip(response_queues, states):
+        actions, update_count = response_queue.get_nowait()
+        assert (actions == agent.take_action(state)).all()
+
+
+def start_server_thread(agent, nbr_clients=1, max_batch_size=256, max_latency=1e-3, recurrent=False):
+    request_queue = queue.Queue()
+    response_queues = [queue.Queue() for _ in range(nbr_clients)]
+    clients = [InferenceClient(client_id, agent.name, request_queue, response_queue, recurrent=recurrent) for client_id, response_queue in enumerate(response_queues)]
+    snapshot = PolicySnapshot(agent)
+    server = Thread(target=inference_server_worker, args=(snapshot, request_queue, response_queues, max_batch_size, max_latency))
+    server.start()
+    return snapshot, server, request_queue, clients
+
+
+def test_inference_server_serves_pending_requests_within_the_latency_budget():
+    agent = DummyAgent(name='dummy', algorithm=DummyAlgorithm())
+    _, server, request_queue, clients = start_server_thread(agent, max_latency=0.2)
+
+    begin = time.time()
+    request_queue.put((0, 'act', np.random.rand(2, 3)))
+    clients[0].response_queue.get(timeout=10.0)
+    # The server waited for other requests until the latency budget was spent:
+    assert time.time()-begin >= 0.2
+    request_queue.put(None)
+    server.join()
+
+
+def test_inference_server_serves_pending_requests_as_soon_as_the_batch_is_full():
+    agent = DummyAgent(name='dummy', algorithm=DummyAlgorithm())
+    _, server, request_queue, clients = start_server_thread(agent, max_batch_size=2, max_latency=60.0)
+
+    request_queue.put((0, 'act', np.random.rand(2, 3)))
+    # Served well before the latency budget is spent:
+    clients[0].response_queue.get(timeout=10.0)
+    request_queue.put(None)
+    server.join()
+
+
+def test_inference_client_raises_when_the_server_is_unresponsive():
+    request_queue, response_queue = queue.Queue(), queue.Queue()
+    # The server was last seen alive a while ago:
+    heartbeat = Value('d', time.time()-60.0)
+    client = InferenceClient(0, 'dummy', request_queue, response_queue, heartbeat=heartbeat, heartbeat_timeout=1.0)
+    with pytest.raises(RuntimeError):
+        client.take_action(np.random.rand(2, 3))
+
+
+def test_inference_server_process_serves_the_updated_weights():
+    agent = DummyAgent(name='dummy', algorithm=DummyAlgorithm())
+    inference_server = InferenceServer(agent, nbr_clients=2)
+
+    states = [np.random.rand(2, 3), np.random.rand(3, 3)]
+    for client, state in zip(inference_server.clients, states):
+        assert (client.take_action(state) == agent.take_action(state)).all()
+
+    with torch.no_grad():
+        for param in agent.algorithm.model.parameters(): param.copy_(torch.randn_like(param))
+    inference_server.update(agent)
+    for client, state in zip(inference_server.clients, states):
+        assert (client.take_action(state) == agent.take_action(state)).all()
+    inference_server.close()
+
+
+def test_inference_server_follows_the_actors_of_recurrent_policies():
+    agent = DQNAgent(name='recurrent_dqn', algorithm=DummyDQNAlgorithm(recurrent_q_net))
+    snapshot, server, request_queue, clients = start_server_thread(agent, recurrent=True)
+    # Episode of env 0 lasts for 3 steps, while env 1's lasts for 4 steps:
+    env_creator = lambda worker_id=None, seed=0: CountingEnv(episode_length=2+seed)
+    env = VecEnv(env_creator, nbr_parallel_env=2, gathering=False)
+
+    # The client does not learn, but forwards the actors' dones to the server, as the batches shrink:
+    served_trajectories = [run_episode_parallel(env, clients[0], training=True, fixed_size_batches=False) for _ in range(2)]
+    request_queue.put(None)
+    server.join()
+    # The rnn states of the client's actors have been removed as their episodes ended:
+    assert unwrap_agent(snapshot).rnn_states['phi_body']['hidden'][0].size(0) == 0
+
+    trajectories = run_episode_parallel(env, PolicySnapshot(agent), training=True, fixed_size_batches=False)
+    for served_trajectory in served_trajectories:
+        # The actors' rnn states were reset between the episodes:
+        assert [len(t) for t in served_trajectory] == [3, 4]
+        for served_t, t in zip(served_trajectory, trajectories):
+            assert len(served_t) == len(t)
+            for served_exp, exp in zip(served_t, t):
+                assert np.array_equal(served_exp[1], exp[1])
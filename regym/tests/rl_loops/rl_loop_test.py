@@ -0,0 +1,125 @@
+from types import SimpleNamespace
+import numpy as np
+import torch
+
+from regym.rl_algorithms.agents import DQNAgent
+from regym.rl_algorithms.agents.agent import Agent, PreprocessedStateCache
+from regym.environments.vec_env import VecEnv
+from regym.rl_loops.singleagent_loops.rl_loop import run_episode, run_episode_parallel, gather_experience_parallel
+
+from conftest import preprocess, DummyDQNAlgorithm, CountingEnv, recurrent_q_net
+
+
+def assert_rnn_states_are_continuous(experiences):
+    # Each experience's rnn states are the next rnn states of the actor's previous experience:
+    for previous_exp, exp in zip(experiences[:-1], experiences[1:]):
+        for key in ['hidden', 'cell']:
+            for previous_state, state in zip(previous_exp['next_rnn_states']['phi_body'][key], exp['rnn_states']['phi_body'][key]):
+                assert torch.equal(previous_state, state)
+
+
+def run_recurrent_agent(fixed_size_batches):
+    # Episode of env 0 lasts for 3 steps, while env 1's lasts for 4 steps:
+    env_creator = lambda worker_id=None, seed=0: CountingEnv(episode_length=2+seed)
+    env = VecEnv(env_creator, nbr_parallel_env=2, gathering=False)
+    agent = DQNAgent(name='recurrent_dqn', algorithm=DummyDQNAlgorithm(recurrent_q_net))
+    assert agent.recurrent
+
+    trajectories = run_episode_parallel(env, agent, training=True, fixed_size_batches=fixed_size_batches)
+    assert [len(t) for t in trajectories] == [3, 4]
+    return agent
+
+
+def test_recurrent_agent_over_shrinking_batches_when_an_actor_ends_early():
+    agent = run_recurrent_agent(fixed_size_batches=False)
+    assert not agent.fixed_size_batches
+    storages = agent.algorithm.storages
+    assert [len(storage) for storage in storages] == [3, 4]
+    for storage in storages: assert_rnn_states_are_continuous(storage)
+    # The rnn states of the actors have been removed as their episodes ended:
+    assert agent.rnn_states['phi_body']['hidden'][0].size(0) == 0
+
+
+def test_recurrent_agent_over_fixed_size_batches_when_an_actor_ends_early():
+    agent = run_recurrent_agent(fixed_size_batches=True)
+    assert agent.fixed_size_batches
+    storages = agent.algorithm.storages
+    assert [len(storage) for storage in storages] == [3, 4]
+    for storage in storages: assert_rnn_states_are_continuous(storage)
+    # Finished actors are masked out of the storages, but keep their rnn states:
+    assert agent.rnn_states['phi_body']['hidden'][0].size(0) == 2
+
+
+class DummySummaryWriter():
+    def __init__(self):
+        self.scalars = list()
+
+    def add_scalar(self, tag, value, step):
+        self.scalars.append((tag, value, step))
+
+
+def test_step_hooks_receive_the_whole_batch():
+    env_creator = lambda worker_id=None, seed=0: CountingEnv(episode_length=2+seed)
+    task = SimpleNamespace(env=VecEnv(env_creator, nbr_parallel_env=2, gathering=True), test_env=None)
+    agent = DQNAgent(name='recurrent_dqn', algorithm=DummyDQNAlgorithm(recurrent_q_net))
+
+    calls = list()
+    step_hook = lambda env, agent, obs_count, batch: calls.append((obs_count, batch))
+    gather_experience_parallel(task, agent, training=True, max_obs_count=8, test_nbr_episode=0,
+                               sum_writer=DummySummaryWriter(), step_hooks=[step_hook])
+
+    # One call per environment step, i.e. per batch of 2 observations:
+    assert [obs_count for obs_count, _ in calls] == [2, 4, 6, 8]
+    for _, batch in calls:
+        assert set(batch.keys()) == {'observations', 'actions', 'rewards', 'succ_observations', 'dones', 'infos'}
+        assert len(batch['rewards']) == 2 and len(batch['dones']) == 2 and len(batch['infos']) == 2
+    # The successor states include the terminal observations of the environments that were reset:
+    assert any([any(batch['dones']) for _, batch in calls])
+    for _, batch in calls:
+        for idx in range(2):
+            assert batch['succ_observations'][idx].item() == batch['observations'][idx].item()+1
+
+
+class InPlaceCountingEnv(CountingEnv):
+    '''
+    CountingEnv which refills the same observation buffer at each step, as some simulators do.
+    '''
+    def __init__(self, episode_length):
+        super(InPlaceCountingEnv, self).__init__(episode_length=episode_length)
+        self.observation = np.zeros((1, 1))
+
+    def reset(self, env_config=None):
+        self.count = 0
+        self.observation[:] = self.count
+        return self.observation
+
+    def step(self, action):
+        self.count += 1
+        self.observation[:] = self.count
+        return self.observation, 1.0, self.count >= self.episode_length, {}
+
+
+class RecordingAgent():
+    '''
+    Agent which records the preprocessed states of the experiences it handles.
+    '''
+    preprocess_environment_signals = Agent.preprocess_environment_signals
+
+    def __init__(self):
+        self.preprocessed_state_cache = PreprocessedStateCache(preprocess)
+        self.experiences = list()
+
+    def take_action(self, state):
+        self.preprocessed_state_cache(state)
+        return 0
+
+    def handle_experience(self, s, a, r, succ_s, done, goals=None, infos=None):
+        state, r, succ_state, non_terminal = self.preprocess_environment_signals(s, r, succ_s, done)
+        self.experiences.append((state.item(), succ_state.item()))
+
+
+def test_experiences_of_an_environment_updating_its_observations_in_place():
+    agent = RecordingAgent()
+    run_episode(InPlaceCountingEnv(episode_length=3), agent, training=True)
+    # Each state is the observation that was acted upon, before the environment step updated it:
+    assert agent.experiences == [(0.0, 1.0), (1.0, 2.0), (2.0, 3.0)]
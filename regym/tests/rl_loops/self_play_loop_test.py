@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+import pytest
+
+from regym.rl_loops.multiagent_loops.self_play_loop import serve_opponents
+
+
+class DummyInferenceServer():
+    def __init__(self, nbr_clients):
+        self.clients = ['client_{}'.format(client_id) for client_id in range(nbr_clients)]
+        self.updates = list()
+
+    def update(self, agent):
+        self.updates.append(agent)
+
+
+def test_serve_opponents_loads_each_opponent_in_its_own_server():
+    inference_servers = [DummyInferenceServer(nbr_clients=1) for _ in range(2)]
+    opponents = [SimpleNamespace(name='opponent_0'), SimpleNamespace(name='opponent_1')]
+    clients = serve_opponents(opponents, inference_servers)
+    assert clients == ['client_0', 'client_0']
+    assert [server.updates for server in inference_servers] == [[opponents[0]], [opponents[1]]]
+
+
+def test_serve_opponents_refuses_servers_shared_with_other_jobs():
+    # Updating a shared server would swap the weights served to the other jobs' clients:
+    inference_servers = [DummyInferenceServer(nbr_clients=2)]
+    with pytest.raises(AssertionError):
+        serve_opponents([SimpleNamespace(name='opponent')], inference_servers)
+    assert inference_servers[0].updates == []
@@ -2,6 +2,7 @@ import yaml
 import pytest
 
 from regym.training_schemes import DeltaDistributionalSelfPlay
+from regym.rl_algorithms import AgentHook
 from regym.util.experiment_parsing import filter_relevant_configurations
 from regym.util.experiment_parsing import initialize_training_schemes
 
@@ -52,3 +53,16 @@ def test_can_initialize_delta_uniform_self_plays():
     sp_schemes = initialize_training_schemes(yaml.load(sp_config), task=None)
     assert all(map(lambda sp: isinstance(sp, DeltaDistributionalSelfPlay), sp_schemes))
     assert all(map(lambda sp: sp.delta == 0. or sp.delta == 0.5, sp_schemes))
+
+
+def test_training_schemes_configuration_sets_the_unhooked_agent_cache_budget():
+    sp_config = '''
+    deltauniform-fullhistory:
+        delta: 0.
+        unhooked_agent_cache_byte_budget: 1e6
+    '''
+    byte_budget = AgentHook.unhooked_agent_cache.byte_budget
+    sp_schemes = initialize_training_schemes(yaml.load(sp_config), task=None)
+    assert sp_schemes[0].delta == 0.
+    assert AgentHook.unhooked_agent_cache.byte_budget == 1000000
+    AgentHook.unhooked_agent_cache.set_byte_budget(byte_budget)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from regym.util.wrappers import FrameStacker, LazyFrames
+
+
+def test_frame_stacker_hands_out_last_frames_oldest_first():
+    stacker = FrameStacker(stack=3)
+    frames = [np.full((2, 2, 1), fill_value=i, dtype=np.uint8) for i in range(5)]
+    stacker.reset(frames[0])
+    assert np.array(stacker.get())[0, 0].tolist() == [0, 0, 0]
+
+    for frame in frames[1:]: stacker.append(frame)
+    observation = stacker.get()
+    assert observation.shape == (2, 2, 3)
+    assert np.array(observation)[0, 0].tolist() == [2, 3, 4]
+
+
+def test_lazyframes_are_materialised_once():
+    frames = [np.random.rand(3, 3, 1) for _ in range(4)]
+    observation = LazyFrames(frames)
+    assert np.asarray(observation) is np.asarray(observation)
+
+    out = np.empty(observation.shape)
+    observation.copy_into(out)
+    assert np.array_equal(out, np.concatenate(frames, axis=-1))
+
+
+def test_materialised_lazyframes_are_read_only():
+    frames = [np.random.rand(3, 3, 1) for _ in range(2)]
+    observation = LazyFrames(frames)
+    assert not np.asarray(observation).flags.writeable
+    # Copies are writeable:
+    assert np.array(observation).flags.writeable
+
+    # The single frame of an unstacked observation is shared with the frame stacker, but cannot be modified through it:
+    frame = np.zeros((3, 3, 1))
+    observation = LazyFrames([frame])
+    out = np.asarray(observation)
+    assert np.shares_memory(out, frame)
+    with pytest.raises(ValueError):
+        out[0, 0, 0] = 1.0
+    assert frame.flags.writeable and frame[0, 0, 0] == 0.0
@@ -1,5 +1,6 @@
+import os
 import math
-from ..rl_algorithms import AgentHook
+from ..rl_algorithms import AgentHook, snapshot_policy, CheckpointStore
 
 '''
 Based on the paper: Emergent Complexity in Multi TODO
@@ -29,7 +30,7 @@ class DeltaDistributionalSelfPlay():
         :param distribution: Distribution to be used over the filtered set of agents.
         :returns: Agent, sampled from the menagerie, to be used as an opponent in the next episode
         '''
-        latest_training_agent_hook = AgentHook(training_agent.clone(training=False))
+        latest_training_agent_hook = AgentHook(snapshot_policy(training_agent))
         indices = range(len(menagerie) + 1) # +1 accounts for the training agent, not (yet) included in menagerie
         subset_of_considered_indices = slice(math.ceil(self.delta * len(menagerie)), len(indices))
         valid_agents_indices = indices[subset_of_considered_indices]
@@ -44,5 +45,6 @@ class DeltaDistributionalSelfPlay():
         :param training_agent: AgentHook of the Agent currently being trained
         :returns: menagerie to be used in the next training episode.
         '''
-
-        return menagerie + [AgentHook(training_agent.clone(training=False), save_path=candidate_save_path)]
+        # The checkpoints of the menagerie are deduplicated in the menagerie's directory:
+        return menagerie + [AgentHook(snapshot_policy(training_agent), save_path=candidate_save_path,
+                                  checkpoint_store=CheckpointStore(os.path.dirname(candidate_save_path)))]
@@ -1,3 +1,5 @@
+from ..rl_algorithms import snapshot_policy
+
 '''
 Classical notion of self-play. Where the opponent is ALWAYS the same as the agent that is being learnt.
 '''
@@ -9,7 +11,7 @@ def opponent_sampling_distribution(menagerie, training_agent):
     :param training_agent: AgentHook of the agent that is currently being trained
     :returns: Agent, sampled from the menagerie, to be used as an opponent in the next episode
     '''
-    return [training_agent.clone(training=False)]
+    return [snapshot_policy(training_agent)]
 
 
 def curator(menagerie, training_agent, episode_trajectory,
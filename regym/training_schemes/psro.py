@@ -12,7 +12,7 @@ from typing import Callable, List
 from itertools import product
 import numpy as np
 
-from regym.rl_algorithms import AgentHook
+from regym.rl_algorithms import AgentHook, snapshot_policy
 from regym.game_theory import compute_nash_averaging
 from regym.util import play_multiple_matches
 from regym.util import extract_winner
@@ -158,7 +158,7 @@ class PSRONashResponse():
     def add_agent_to_menagerie(self, training_agent, candidate_save_path=None):
         if candidate_save_path is not None:
             AgentHook(training_agent, save_path=candidate_save_path)
-        self.menagerie.append(training_agent.clone(training=False))
+        self.menagerie.append(snapshot_policy(training_agent))
 
     def create_new_iteration_statistics(self, last_iteration_statistics):
         return self.IterationStatistics(len(self.statistics), last_iteration_statistics.total_elapsed_episodes,
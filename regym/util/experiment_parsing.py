@@ -14,6 +14,7 @@ from regym.rl_algorithms import build_TabularQ_Agent
 from regym.rl_algorithms import build_PPO_Agent
 from regym.rl_algorithms import build_A2C_Agent
 from regym.rl_algorithms import rockAgent, paperAgent, scissorsAgent, randomAgent
+from regym.rl_algorithms import AgentHook
 
 
 def check_for_unknown_candidate_input(known, candidates, category_name):
@@ -31,7 +32,9 @@ def check_for_unknown_candidate_input(known, candidates, category_name):
 
 def initialize_training_schemes(training_schemes_configs, task):
     '''
-    Creates a list containing pointers to the relevant self_play training scheme functions
+    Creates a list containing pointers to the relevant self_play training scheme functions.
+    The 'unhooked_agent_cache_byte_budget' entry of a training scheme's configuration sets the byte budget
+    of the cache of the opponents loaded from disk (cf. `AgentHook.unhooked_agent_cache`), which all schemes share.
     :param candidate_training_schemes: requested training schemes
     :return: list containing pointers to the corresponding self_play training schemes functions
     '''
@@ -44,7 +47,12 @@ def initialize_training_schemes(training_schemes_configs, task):
         if self_play_name.startswith('deltauniform'):
             return DeltaDistributionalSelfPlay(delta=config['delta'], distribution=np.random.choice)
         else: raise ValueError(f'Unkown Self Play training scheme: {self_play_name}')
-    return [partial_match_build_function(t_s.lower(), config, task) for t_s, config in training_schemes_configs.items()]
+    def set_unhooked_agent_cache_byte_budget(config):
+        if not isinstance(config, dict) or 'unhooked_agent_cache_byte_budget' not in config: return config
+        config = dict(config)
+        AgentHook.unhooked_agent_cache.set_byte_budget(int(float(config.pop('unhooked_agent_cache_byte_budget'))))
+        return config
+    return [partial_match_build_function(t_s.lower(), set_unhooked_agent_cache_byte_budget(config), task) for t_s, config in training_schemes_configs.items()]
 
 
 def initialize_agents(task, agent_configurations):
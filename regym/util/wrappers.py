@@ -24,16 +24,82 @@ Adapted from:
 https://github.com/chainer/chainerrl/blob/master/chainerrl/wrappers/atari_wrappers.py
 '''
 class LazyFrames(object):
+    '''
+    Stack of frames, concatenated on the last axis, that is only materialised
+    when needed, and at most once: the materialised array is cached, since the
+    observation of a given step is often accessed several times.
+    Being shared by all its callers (and, with a single frame, with the frame stacker),
+    the materialised array is read-only: callers that modify it must copy it first.
+    '''
     def __init__(self, frames):
         self._frames = frames
-    
+        self._out = None
+
+    @property
+    def shape(self):
+        depth = sum([frame.shape[-1] for frame in self._frames])
+        return (*self._frames[0].shape[:-1], depth)
+
+    @property
+    def dtype(self):
+        return self._frames[0].dtype
+
+    def copy_into(self, out):
+        '''
+        Writes the stacked frames directly into :param out:,
+        without materialising the intermediate concatenated array.
+        :param out: numpy.ndarray of shape `self.shape`.
+        :returns: :param out:
+        '''
+        if self._out is not None:
+            out[...] = self._out
+            return out
+        offset = 0
+        for frame in self._frames:
+            depth = frame.shape[-1]
+            out[..., offset:offset+depth] = frame
+            offset += depth
+        return out
+
     def __array__(self, dtype=None):
-        out = np.concatenate(self._frames, axis=-1)
+        if self._out is None:
+            if len(self._frames) == 1:
+                # The single frame is handed out without copy, through a view
+                # so that the frame itself remains writeable:
+                self._out = self._frames[0].view()
+            else:
+                self._out = np.concatenate(self._frames, axis=-1)
+            self._out.flags.writeable = False
+        out = self._out
         if dtype is not None:
             out = out.astype(dtype)
         return out
 
 
+class FrameStacker(object):
+    '''
+    Ring buffer of the last `stack` frames, allocated once, that hands 
+    the stacked frames out as LazyFrames (oldest frame first).
+    The frames are only referenced, never copied, until the LazyFrames are materialised.
+    '''
+    def __init__(self, stack):
+        self.stack = stack
+        self.frames = [None]*self.stack
+        self.position = 0
+
+    def reset(self, frame):
+        for idx in range(self.stack):
+            self.frames[idx] = frame
+        self.position = 0
+
+    def append(self, frame):
+        self.frames[self.position] = frame
+        self.position = (self.position+1) % self.stack
+
+    def get(self):
+        return LazyFrames(self.frames[self.position:]+self.frames[:self.position])
+
+
 class RandNoOpStartWrapper(gym.Wrapper):
     def __init__(self, env, nbr_max_random_steps=30):
         gym.Wrapper.__init__(self,env)
@@ -166,7 +232,7 @@ class FrameSkipStackAtari(gym.Wrapper):
         self.act_rand_repeat = act_rand_repeat
         self.single_life_episode = single_life_episode
 
-        self.observations = deque([], maxlen=self.stack)
+        self.observations = FrameStacker(self.stack)
         
         assert(isinstance(self.env.observation_space, gym.spaces.Box))
         
@@ -190,8 +256,7 @@ class FrameSkipStackAtari(gym.Wrapper):
             self.lives = self.AtariEnv.ale.lives()
         
     def _get_obs(self):
-        assert(len(self.observations) == self.stack)
-        return LazyFrames(list(self.observations))
+        return self.observations.get()
         
     def reset(self, **args):
         obs = self.env.reset()
@@ -201,8 +266,7 @@ class FrameSkipStackAtari(gym.Wrapper):
         if self.single_life_episode:
             self.lives = self.AtariEnv.ale.lives()
         
-        for _ in range(self.stack):
-            self.observations.append(obs)
+        self.observations.reset(obs)
         return self._get_obs()
     
     def step(self, action):
@@ -362,7 +426,7 @@ class FrameStack(gym.Wrapper):
     def __init__(self, env, stack=4,):
         gym.Wrapper.__init__(self,env)
         self.stack = stack if stack is not None else 1
-        self.observations = deque([], maxlen=self.stack)
+        self.observations = FrameStacker(self.stack)
         
         assert(isinstance(self.env.observation_space, gym.spaces.Box))
         
@@ -371,13 +435,11 @@ class FrameStack(gym.Wrapper):
         self.observation_space = gym.spaces.Box(low=low_obs_space, high=high_obs_space, dtype=self.env.observation_space.dtype)
 
     def _get_obs(self):
-        assert(len(self.observations) == self.stack)
-        return LazyFrames(list(self.observations))
+        return self.observations.get()
         
     def reset(self, **args):
         obs = self.env.reset()
-        for _ in range(self.stack):
-            self.observations.append(obs)
+        self.observations.reset(obs)
         return self._get_obs()
     
     def step(self, action):
@@ -1345,7 +1407,7 @@ class FrameSkipStack(gym.Wrapper):
         self.skip = skip if skip is not None else 0
         self.stack = stack if stack is not None else 1
         
-        self.observations = deque([], maxlen=self.stack)
+        self.observations = FrameStacker(self.stack)
         
         assert(isinstance(self.env.observation_space, gym.spaces.Box))
         
@@ -1354,13 +1416,11 @@ class FrameSkipStack(gym.Wrapper):
         self.observation_space = gym.spaces.Box(low=low_obs_space, high=high_obs_space, dtype=self.env.observation_space.dtype)
     
     def _get_obs(self):
-        assert(len(self.observations) == self.stack)
-        return LazyFrames(list(self.observations))
+        return self.observations.get()
         
     def reset(self, **args):
         obs = self.env.reset()
-        for _ in range(self.stack):
-            self.observations.append(obs)
+        self.observations.reset(obs)
         return self._get_obs()
     
     def step(self, action):
@@ -1515,7 +1575,7 @@ class DictFrameStack(gym.Wrapper):
         self.keys = keys
         self.observations = {}
         for k in self.keys:
-            self.observations[k] = deque([], maxlen=self.stack)
+            self.observations[k] = FrameStacker(self.stack)
             assert(isinstance(self.env.observation_space.spaces[k], gym.spaces.Box))
         
             low_obs_space = np.repeat(self.env.observation_space.spaces[k].low, self.stack, axis=-1)
@@ -1524,14 +1584,13 @@ class DictFrameStack(gym.Wrapper):
 
     def _get_obs(self, observation):
         for k in self.keys:
-            observation[k] = LazyFrames(list(self.observations[k]))
+            observation[k] = self.observations[k].get()
         return observation
     
     def reset(self, **args):
         obs = self.env.reset()
         for k in self.keys:
-            for _ in range(self.stack):
-                self.observations[k].append(obs[k])
+            self.observations[k].reset(obs[k])
         return self._get_obs(obs)
     
     def step(self, action):